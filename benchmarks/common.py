@@ -0,0 +1,72 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+import django
+
+
+def setup_django() -> None:
+    """
+    Configures Django using the bot settings, providing placeholder values for
+    the secrets that aren't needed for benchmarking.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dangobot.core.settings")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+    django.setup()
+
+
+async def time_coroutine(
+    func: Callable[[], Awaitable[object]], iterations: int
+) -> float:
+    """
+    Awaits `func` `iterations` times in a row, and returns the average time
+    taken by a single call, in nanoseconds.
+    """
+    for _ in range(min(iterations, 1000)):  # warm-up
+        await func()
+
+    start = time.perf_counter_ns()
+
+    for _ in range(iterations):
+        await func()
+
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def run(coro) -> None:
+    """Runs a benchmark coroutine to completion."""
+    asyncio.run(coro)
+
+
+class FakeConnection:
+    """
+    Stands in for an :class:`asyncpg.Connection`, answering every query
+    instantly with an empty result, in order to measure the overhead of the
+    code issuing the queries.
+    """
+
+    async def fetch(self, query, *args):  # pylint: disable=unused-argument
+        return []
+
+    async def fetchrow(self, query, *args):  # pylint: disable=unused-argument
+        return None
+
+    async def execute(self, query, *args):  # pylint: disable=unused-argument
+        return "UPDATE 1"
+
+
+class FakePool:
+    """Stands in for an :class:`asyncpg.Pool` handing out fake connections."""
+
+    def __init__(self) -> None:
+        self.connection = FakeConnection()
+
+    async def acquire(self) -> FakeConnection:
+        """Returns the fake connection."""
+        return self.connection
+
+    async def release(self, conn) -> None:
+        """Does nothing, as there's only one connection."""
@@ -0,0 +1,91 @@
+"""
+Measures the per-message cost of running the custom command handlers in
+:meth:`DangoBot.execute_command_handlers`, compared to the previous
+implementation which looked up every handler by name on each message.
+
+Usage: python -m benchmarks.dispatch [--iterations N]
+"""
+
+import argparse
+import types
+
+from .common import run, setup_django, time_coroutine
+
+setup_django()
+
+# pylint: disable=wrong-import-position
+from discord.ext.commands import Cog  # noqa: E402
+
+from dangobot.core.bot import DangoBot, command_handler  # noqa: E402
+
+
+def make_cog(index: int, handled: bool) -> Cog:
+    """Creates a cog containing a single command handler."""
+
+    async def handle(self, ctx) -> bool:  # pylint: disable=unused-argument
+        return handled
+
+    cls = types.new_class(
+        f"Handler{index}",
+        (Cog,),
+        {"name": f"Handler{index}"},
+        lambda ns: ns.update(handle=command_handler(handle)),
+    )
+
+    return cls()
+
+
+async def legacy_execute(bot: DangoBot, names, ctx) -> bool:
+    """The handler dispatch loop as it was before the dispatch table."""
+    command_handled = False
+
+    for cog_name, method_name in names:
+        cog = bot.get_cog(cog_name)
+
+        if cog is None:
+            continue
+
+        method = getattr(cog, method_name, None)
+
+        if method is None:
+            continue
+
+        command_handled = await method(ctx)
+
+    return command_handled
+
+
+async def benchmark(iterations: int) -> None:
+    print(f"{'handlers':>8} {'legacy (ns)':>12} {'table (ns)':>12}")
+
+    for count in (1, 4, 16):
+        bot = DangoBot()
+
+        for i in range(count):
+            # only the last handler handles the message, so that both
+            # implementations go through every handler
+            await bot.add_cog(make_cog(i, handled=i == count - 1))
+
+        names = [(f"Handler{i}", "handle") for i in range(count)]
+        ctx = object()
+
+        legacy = await time_coroutine(
+            lambda: legacy_execute(bot, names, ctx), iterations
+        )
+        table = await time_coroutine(
+            lambda: bot.execute_command_handlers(ctx), iterations
+        )
+
+        print(f"{count:>8} {legacy:>12.0f} {table:>12.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    run(benchmark(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
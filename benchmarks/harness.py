@@ -0,0 +1,751 @@
+"""
+Measures the end-to-end throughput of the bot, by replaying synthetic
+gateway events through a :class:`DangoBot` that's not connected to Discord.
+
+Messages are delivered the same way the gateway would deliver them (to
+``on_message`` and all listeners), with :meth:`discord.abc.Messageable.send`
+and role updates stubbed out. The repositories are backed either by an
+in-memory stand-in of the database, or by the Postgres database configured
+in the settings (which needs to be migrated, the synthetic data is removed
+once the benchmark finishes).
+
+Events are delivered one at a time, and the results (messages per second,
+latency percentiles and memory allocated per event) are written as JSON.
+
+Usage: python -m benchmarks.harness [--mix NAME] [--events N]
+    [--database {memory,postgres}] [--output FILE]
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .common import run, setup_django
+
+setup_django()
+
+# pylint: disable=wrong-import-position
+import discord  # noqa: E402
+from discord.abc import Messageable  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from dangobot.commands.repository import CommandRepository  # noqa: E402
+from dangobot.core import database  # noqa: E402
+from dangobot.core.bot import DangoBot  # noqa: E402
+from dangobot.core.repository import (  # noqa: E402
+    GuildRepository,
+    Repository,
+    RepositoryABCSingleton,
+    get_repositories,
+)
+from dangobot.roles.repository import RoleForVCRepository  # noqa: E402
+
+# the relative frequencies of event kinds in each traffic mix
+TRAFFIC_MIXES: Dict[str, Dict[str, float]] = {
+    # a typical server, where most messages aren't meant for the bot
+    "chatter": {
+        "chatter": 90,
+        "builtin": 1,
+        "custom": 5,
+        "roll": 2,
+        "voice": 2,
+    },
+    # a server actively using the bot
+    "mixed": {
+        "chatter": 50,
+        "builtin": 5,
+        "custom": 25,
+        "roll": 10,
+        "voice": 10,
+    },
+    # only command invocations
+    "commands": {"builtin": 20, "custom": 50, "roll": 30},
+    "voice": {"voice": 100},
+}
+
+BUILTIN_COMMANDS = ("about", "commands list", "help roll")
+ROLLS = ("d20", "2d6+3", "4d8 + 2d4 + 1", "100d100")
+CHATTER = (
+    "hello",
+    "anyone up for a game tonight?",
+    "lol",
+    "I can't believe that actually worked, thanks everyone for the help",
+)
+
+# synthetic snowflakes, far from the ones used by Discord at the moment
+BASE_ID = 900_000_000_000_000_000
+
+Event = Tuple[str, str, Tuple[Any, ...]]
+
+
+class InMemoryConnection:
+    """
+    Stands in for an :class:`asyncpg.Connection`, answering the queries
+    registered in a given :class:`InMemoryDatabase`.
+    """
+
+    def __init__(self, db: "InMemoryDatabase") -> None:
+        self.db = db
+
+    async def fetch(self, query, *args):
+        """Returns all rows returned by a query."""
+        return self.db.execute(query, args)
+
+    async def fetchrow(self, query, *args):
+        """Returns the first row returned by a query."""
+        rows = self.db.execute(query, args)
+        return rows[0] if rows else None
+
+    async def execute(self, query, *args):
+        """Executes a query, and returns its command status."""
+        return f"SELECT {len(self.db.execute(query, args))}"
+
+
+class InMemoryDatabase:
+    """
+    Stands in for an :class:`asyncpg.Pool`, keeping rows of the tables in
+    memory, and answering the queries made by the repositories in the
+    benchmarked code paths.
+
+    Queries which weren't registered raise an error, so that the benchmark
+    doesn't silently measure a different code path than the real one.
+    """
+
+    def __init__(self) -> None:
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.handlers: Dict[str, Callable[[Sequence[Any]], List[Any]]] = {}
+        self.connection = InMemoryConnection(self)
+
+    async def acquire(self) -> InMemoryConnection:
+        """Returns the connection."""
+        return self.connection
+
+    async def release(self, conn) -> None:
+        """Does nothing, as there's only one connection."""
+
+    def execute(self, query: str, args: Sequence[Any]) -> List[Any]:
+        """Runs the handler registered for a query."""
+        try:
+            handler = self.handlers[query]
+        except KeyError:
+            raise NotImplementedError(
+                f"Query not supported by the in-memory database: {query}"
+            ) from None
+
+        return handler(args)
+
+    def insert(self, repository: Repository, rows: List[Dict[str, Any]]):
+        """Adds rows to the table of a given repository."""
+        self.tables.setdefault(repository.table_name, []).extend(rows)
+
+    def register_select(
+        self,
+        repository: Repository,
+        columns: Tuple[str, ...],
+        query: Optional[str] = None,
+    ) -> None:
+        """
+        Answers a query selecting the rows of a repository's table with
+        given values of `columns`, built by :meth:`Repository.get_query`
+        unless specified.
+        """
+        rows = self.tables.setdefault(repository.table_name, [])
+
+        def select(args: Sequence[Any]) -> List[Any]:
+            return [
+                row
+                for row in rows
+                if all(
+                    row[column] == arg for column, arg in zip(columns, args)
+                )
+            ]
+
+        self.handlers[query or repository.get_query("select", columns)] = (
+            select
+        )
+
+    def register_command_page(self, repository: CommandRepository) -> None:
+        """
+        Answers the query selecting the first page of a guild's command
+        triggers, made by the list command.
+        """
+        rows = self.tables.setdefault(repository.table_name, [])
+
+        def select_page(args: Sequence[Any]) -> List[Any]:
+            guild_id, limit = args
+            triggers = sorted(
+                row["trigger"] for row in rows if row["guild_id"] == guild_id
+            )
+            return [{"trigger": trigger} for trigger in triggers[:limit]]
+
+        self.handlers[repository.get_page_query()] = select_page
+
+    def register_select_any(self, repository: Repository, column: str):
+        """
+        Answers a query selecting the rows of a repository's table with
+        a value of `column` in a given array.
+        """
+        rows = self.tables.setdefault(repository.table_name, [])
+
+        def select_any(args: Sequence[Any]) -> List[Any]:
+            values = set(args[0])
+            return [row for row in rows if row[column] in values]
+
+        self.handlers[repository.get_query("select_any", (column,))] = (
+            select_any
+        )
+
+
+class SyntheticGuilds:
+    """
+    Builds guilds, along with their channels, roles, members and custom
+    commands, in the bot's connection state, as if they were received
+    from the gateway.
+    """
+
+    def __init__(
+        self,
+        bot: DangoBot,
+        guild_count: int,
+        member_count: int,
+        command_count: int,
+    ) -> None:
+        self.bot = bot
+        self.state = bot._connection  # pylint: disable=protected-access
+        self.guilds: List[discord.Guild] = []
+        self.members: Dict[int, List[discord.Member]] = {}
+        self.commands: List[Dict[str, Any]] = []
+        self.role_links: List[Dict[str, Any]] = []
+
+        self.state.user = discord.ClientUser(
+            state=self.state, data=self.user_payload(BASE_ID, bot=True)
+        )
+        bot.owner_id = BASE_ID + 1
+
+        for index in range(guild_count):
+            self.add_guild(index, member_count, command_count)
+
+    @staticmethod
+    def user_payload(user_id: int, bot: bool = False) -> Dict[str, Any]:
+        """Returns the payload of a synthetic user."""
+        return {
+            "id": str(user_id),
+            "username": f"user{user_id % 100_000}",
+            "discriminator": "0",
+            "avatar": None,
+            "bot": bot,
+        }
+
+    @staticmethod
+    def member_payload() -> Dict[str, Any]:
+        """Returns the payload of a synthetic guild member, without a user."""
+        return {
+            "roles": [],
+            "joined_at": "2020-01-01T00:00:00+00:00",
+            "deaf": False,
+            "mute": False,
+            "flags": 0,
+        }
+
+    @staticmethod
+    def channel_payload(
+        channel_id: int, channel_type: int, name: str
+    ) -> Dict[str, Any]:
+        """Returns the payload of a synthetic guild channel."""
+        return {
+            "id": str(channel_id),
+            "type": channel_type,
+            "name": name,
+            "position": channel_id % 100,
+            "permission_overwrites": [],
+            "bitrate": 64000,
+            "user_limit": 0,
+        }
+
+    def add_guild(self, index: int, member_count: int, command_count: int):
+        """Creates a single guild."""
+        guild_id = BASE_ID + (index + 1) * 1_000_000
+
+        guild = discord.Guild(
+            state=self.state,
+            data={
+                "id": str(guild_id),
+                "name": f"Benchmark {index}",
+                "owner_id": str(self.bot.owner_id),
+                "member_count": member_count,
+                "roles": [
+                    {"id": str(guild_id), "name": "@everyone"},
+                    {"id": str(guild_id + 1), "name": "voice"},
+                ],
+                "channels": [
+                    self.channel_payload(guild_id + 10, 0, "general"),
+                    self.channel_payload(guild_id + 20, 2, "Voice"),
+                    self.channel_payload(guild_id + 21, 2, "AFK"),
+                ],
+            },
+        )
+        self.state._add_guild(guild)  # pylint: disable=protected-access
+        self.guilds.append(guild)
+
+        # only the bot's own member is cached, like without the members
+        # intent
+        guild._add_member(  # pylint: disable=protected-access
+            discord.Member(
+                data=self.member_payload()
+                | {"user": self.user_payload(BASE_ID, bot=True)},
+                guild=guild,
+                state=self.state,
+            )
+        )
+        self.members[guild.id] = [
+            discord.Member(
+                data=self.member_payload()
+                | {"user": self.user_payload(guild_id + 100_000 + member)},
+                guild=guild,
+                state=self.state,
+            )
+            for member in range(member_count)
+        ]
+
+        self.commands.extend(
+            {
+                "id": guild_id + command,
+                "guild_id": guild_id,
+                "trigger": f"cmd{command}",
+                "response": f"response of command {command}",
+                "file": "",
+                "original_file_name": "",
+            }
+            for command in range(command_count)
+        )
+        # only one of the voice channels has a linked role
+        self.role_links.append(
+            {
+                "id": guild_id,
+                "guild_id": guild_id,
+                "role_id": guild_id + 1,
+                "voice_channel_id": guild_id + 20,
+            }
+        )
+
+    def message_payload(
+        self, guild: discord.Guild, author: discord.Member, content: str
+    ) -> Dict[str, Any]:
+        """
+        Returns the payload of a message sent by a member to the guild's
+        text channel.
+        """
+        return {
+            "id": str(random.getrandbits(62)),
+            "channel_id": str(guild.text_channels[0].id),
+            "guild_id": str(guild.id),
+            "author": self.user_payload(author.id),
+            "member": self.member_payload(),
+            "content": content,
+            "timestamp": "2024-01-01T00:00:00+00:00",
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+        }
+
+    def message(
+        self, guild: discord.Guild, author: discord.Member, content: str
+    ) -> discord.Message:
+        """Creates a message sent by a member to the guild's text channel."""
+        return discord.Message(
+            state=self.state,
+            channel=guild.text_channels[0],
+            data=self.message_payload(guild, author, content),  # type: ignore
+        )
+
+
+def generate_events(
+    guilds: SyntheticGuilds, mix: Dict[str, float], count: int
+) -> List[Event]:
+    """
+    Generates `count` events of kinds picked randomly from a traffic mix,
+    as tuples of the event kind, its name, and its arguments.
+    """
+    kinds = random.choices(list(mix), weights=list(mix.values()), k=count)
+    voice_channels: Dict[int, Optional[discord.VoiceChannel]] = {}
+    events: List[Event] = []
+
+    for kind in kinds:
+        guild = random.choice(guilds.guilds)
+        member = random.choice(guilds.members[guild.id])
+
+        if kind == "voice":
+            # members join, move between and leave the voice channels
+            before = voice_channels.get(member.id)
+            after = random.choice([None, *guild.voice_channels])
+            voice_channels[member.id] = after
+
+            events.append(
+                (
+                    kind,
+                    "voice_state_update",
+                    (
+                        member,
+                        discord.VoiceState(data={}, channel=before),
+                        discord.VoiceState(data={}, channel=after),
+                    ),
+                )
+            )
+            continue
+
+        prefix = settings.COMMAND_PREFIX
+
+        if kind == "chatter":
+            content = random.choice(CHATTER)
+        elif kind == "builtin":
+            content = prefix + random.choice(BUILTIN_COMMANDS)
+        elif kind == "roll":
+            content = f"{prefix}roll {random.choice(ROLLS)}"
+        else:
+            commands = [
+                command["trigger"]
+                for command in guilds.commands
+                if command["guild_id"] == guild.id
+            ]
+            content = prefix + random.choice(commands)
+
+        events.append(
+            (kind, "message", (guilds.message(guild, member, content),))
+        )
+
+    return events
+
+
+async def deliver(bot: DangoBot, event: str, args: Tuple[Any, ...]):
+    """
+    Delivers an event to the bot and all listeners, awaiting them in turn
+    instead of scheduling them as tasks like :meth:`discord.Client.dispatch`.
+    """
+    method = "on_" + event
+
+    if (handler := getattr(bot, method, None)) is not None:
+        await handler(*args)
+
+    for listener in bot.extra_events.get(method, ()):
+        await listener(*args)
+
+
+async def create_bot(backend: str, guilds: int, members: int, commands: int):
+    """
+    Creates a bot with the synthetic guilds, and its database backend.
+
+    Returns
+    --------
+    Tuple[:class:`DangoBot`, :class:`SyntheticGuilds`]
+        The bot, and the guilds it's in.
+    """
+    # every run gets fresh repositories, with empty caches
+    RepositoryABCSingleton._instances.clear()  # pylint: disable=W0212
+
+    if backend == "postgres":
+        database.db_pool = await database.create_pool()
+    else:
+        database.db_pool = InMemoryDatabase()  # type: ignore
+
+    bot = DangoBot()
+    await bot._async_setup_hook()  # pylint: disable=protected-access
+
+    for app in settings.INSTALLED_APPS:
+        try:
+            await bot.load_extension(f"{app}.plugin")
+        except discord.ext.commands.ExtensionNotFound:
+            pass
+
+    synthetic = SyntheticGuilds(bot, guilds, members, commands)
+
+    # load the guilds into the cache like on_ready would
+    if backend == "postgres":
+        await seed_postgres(synthetic)
+        await GuildRepository().sync_from_gateway(synthetic.guilds)
+    else:
+        seed_memory(database.db_pool, synthetic)  # type: ignore
+        await GuildRepository().warm_cache(synthetic.guilds)
+
+    return bot, synthetic
+
+
+def seed_memory(db: InMemoryDatabase, synthetic: SyntheticGuilds) -> None:
+    """Stores the synthetic data in the in-memory database."""
+    guilds, commands, roles = (
+        GuildRepository(),
+        CommandRepository(),
+        RoleForVCRepository(),
+    )
+
+    db.insert(
+        guilds,
+        [
+            {
+                "id": guild.id,
+                "name": guild.name,
+                "command_prefix": settings.COMMAND_PREFIX,
+            }
+            for guild in synthetic.guilds
+        ],
+    )
+    db.insert(commands, synthetic.commands)
+    db.insert(roles, synthetic.role_links)
+
+    db.register_select(guilds, (guilds.primary_key,))
+    db.register_select_any(guilds, guilds.primary_key)
+    db.register_select(commands, ("guild_id", "trigger"))
+    db.register_select(
+        commands,
+        ("guild_id",),
+        commands._find_all_from_guild_query,  # pylint: disable=W0212
+    )
+    db.register_command_page(commands)
+    db.register_select(roles, ("guild_id",))
+
+
+async def seed_postgres(synthetic: SyntheticGuilds) -> None:
+    """Stores the synthetic data in the database."""
+    await GuildRepository().insert_many(
+        [
+            {
+                "id": guild.id,
+                "name": guild.name,
+                "command_prefix": settings.COMMAND_PREFIX,
+            }
+            for guild in synthetic.guilds
+        ]
+    )
+    await CommandRepository().insert_many(
+        [
+            {key: value for key, value in command.items() if key != "id"}
+            for command in synthetic.commands
+        ]
+    )
+    await RoleForVCRepository().insert_many(
+        [
+            {key: value for key, value in link.items() if key != "id"}
+            for link in synthetic.role_links
+        ]
+    )
+
+
+async def cleanup_postgres(synthetic: SyntheticGuilds) -> None:
+    """Removes the synthetic data from the database."""
+    for guild in synthetic.guilds:
+        await CommandRepository().destroy_by({"guild_id": guild.id})
+        await RoleForVCRepository().destroy_by({"guild_id": guild.id})
+        await GuildRepository().destroy_by_id(guild.id)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Returns a percentile of sorted values, using the nearest rank."""
+    if not values:
+        return 0.0
+
+    index = min(int(len(values) * fraction), len(values) - 1)
+    return values[index]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """Returns statistics of event latencies, in milliseconds."""
+    latencies = sorted(latencies)
+
+    return {
+        "count": len(latencies),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+async def measure_allocations(
+    bot: DangoBot, events: List[Event]
+) -> Dict[str, float]:
+    """
+    Replays events with :mod:`tracemalloc` enabled, returning the mean
+    peak memory allocated while handling an event, and the mean amount of
+    memory blocks left allocated after handling it.
+    """
+    peaks = []
+    blocks_before = sys.getallocatedblocks()
+
+    tracemalloc.start()
+
+    try:
+        for _, event, args in events:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+
+            await deliver(bot, event, args)
+
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "events": len(events),
+        "peak_bytes_per_event": statistics.fmean(peaks) if peaks else 0.0,
+        "retained_blocks_per_event": (
+            (sys.getallocatedblocks() - blocks_before) / len(events)
+            if events
+            else 0.0
+        ),
+    }
+
+
+def get_revision() -> Optional[str]:
+    """Returns the git revision of the benchmarked code, if available."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    random.seed(args.seed)
+
+    sent = 0
+
+    async def send(*_args, **_kwargs):
+        nonlocal sent
+        sent += 1
+
+    async def edit_role(*_args, **_kwargs):
+        pass
+
+    original_send = Messageable.send
+    Messageable.send = send  # type: ignore
+
+    bot, synthetic = await create_bot(
+        args.database, args.guilds, args.members, args.commands
+    )
+    bot.http.add_role = edit_role  # type: ignore
+    bot.http.remove_role = edit_role  # type: ignore
+
+    try:
+        mix = TRAFFIC_MIXES[args.mix]
+        warmup = generate_events(synthetic, mix, args.warmup)
+        events = generate_events(synthetic, mix, args.events)
+
+        for _, event, event_args in warmup:
+            await deliver(bot, event, event_args)
+
+        sent = 0
+        latencies: Dict[str, List[float]] = {}
+        start = time.perf_counter()
+
+        for kind, event, event_args in events:
+            event_start = time.perf_counter()
+            await deliver(bot, event, event_args)
+            latencies.setdefault(kind, []).append(
+                time.perf_counter() - event_start
+            )
+
+        elapsed = time.perf_counter() - start
+        messages_sent = sent
+
+        allocations = await measure_allocations(
+            bot, events[: args.allocation_events]
+        )
+    finally:
+        Messageable.send = original_send  # type: ignore
+
+        if args.database == "postgres":
+            await cleanup_postgres(synthetic)
+            await database.db_pool.close()
+
+    return {
+        "benchmark": "harness",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": get_revision(),
+        "version": settings.BUILD_VERSION,
+        "python": platform.python_version(),
+        "discord.py": discord.__version__,
+        "parameters": {
+            "mix": args.mix,
+            "database": args.database,
+            "events": args.events,
+            "warmup": args.warmup,
+            "guilds": args.guilds,
+            "members": args.members,
+            "commands": args.commands,
+            "seed": args.seed,
+            "unit_of_work": settings.DATABASE_UNIT_OF_WORK,
+        },
+        "results": {
+            "elapsed_s": elapsed,
+            "events_per_s": len(events) / elapsed if elapsed else 0.0,
+            "messages_sent": messages_sent,
+            "latency": summarize(
+                [latency for kind in latencies.values() for latency in kind]
+            ),
+            "latency_by_kind": {
+                kind: summarize(values) for kind, values in latencies.items()
+            },
+            "allocations": allocations,
+            "caches": {
+                name: {"hits": cache.hits, "misses": cache.misses}
+                for repository in get_repositories()
+                for name, cache in repository.get_caches().items()
+            },
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--mix", choices=TRAFFIC_MIXES, default="mixed")
+    parser.add_argument(
+        "--database", choices=("memory", "postgres"), default="memory"
+    )
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--warmup", type=int, default=1_000)
+    parser.add_argument("--allocation-events", type=int, default=1_000)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--commands", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="write the results to a file instead of stdout"
+    )
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {}
+
+    async def main_coro() -> None:
+        results.update(await benchmark(args))
+
+    run(main_coro())
+
+    output = json.dumps(results, indent=2)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
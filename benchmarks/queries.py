@@ -0,0 +1,113 @@
+"""
+Measures the Python-side overhead of the generic :class:`Repository` query
+methods, comparing the memoized SQL generation against rebuilding the query
+string on every call, as was done previously.
+
+The queries are sent to a fake connection pool, so the results don't include
+any database or network time.
+
+Usage: python -m benchmarks.queries [--iterations N]
+"""
+
+import argparse
+
+from .common import FakePool, run, setup_django, time_coroutine
+
+setup_django()
+
+# pylint: disable=wrong-import-position
+from dangobot.commands.repository import CommandRepository  # noqa: E402
+
+
+def _legacy_query_string(args):
+    return " AND ".join(
+        [f"{field[0]} = ${i + 1}" for i, field in enumerate(args.items())]
+    )
+
+
+async def legacy_find_one_by(repository, args):
+    """:meth:`Repository.find_one_by` before the SQL was memoized."""
+    query_string = _legacy_query_string(args)
+
+    async with repository.acquire("legacy") as conn:
+        return await conn.fetchrow(
+            f"SELECT * FROM {repository.table_name} WHERE {query_string}",
+            *args.values(),
+        )
+
+
+async def legacy_destroy_by(repository, args):
+    """:meth:`Repository.destroy_by` before the SQL was memoized."""
+    query_string = _legacy_query_string(args)
+
+    async with repository.acquire("legacy") as conn:
+        result = await conn.execute(
+            f"DELETE FROM {repository.table_name} WHERE {query_string}",
+            *args.values(),
+        )
+
+        return int(result.split()[1])
+
+
+async def legacy_insert(repository, args):
+    """:meth:`Repository.insert` before the SQL was memoized."""
+    keys = ", ".join(args.keys())
+    values = ", ".join([f"${i + 1}" for i in range(len(args))])
+
+    async with repository.acquire("legacy") as conn:
+        await conn.execute(
+            f"INSERT INTO {repository.table_name} "
+            f"({keys}) VALUES ({values})",
+            *args.values(),
+        )
+
+
+async def benchmark(iterations: int) -> None:
+    repository = CommandRepository(db_pool=FakePool())
+
+    where = {"guild_id": 1, "trigger": "foo"}
+    row = {
+        "guild_id": 1,
+        "trigger": "foo",
+        "response": "bar",
+        "file": "",
+        "original_file_name": "",
+    }
+
+    cases = [
+        (
+            "find_one_by",
+            lambda: legacy_find_one_by(repository, where),
+            lambda: repository.find_one_by(where),
+        ),
+        (
+            "destroy_by",
+            lambda: legacy_destroy_by(repository, where),
+            lambda: repository.destroy_by(where),
+        ),
+        (
+            "insert",
+            lambda: legacy_insert(repository, row),
+            lambda: repository.insert(row),
+        ),
+    ]
+
+    print(f"{'method':<12} {'before (ns)':>12} {'after (ns)':>12}")
+
+    for name, legacy, current in cases:
+        before = await time_coroutine(legacy, iterations)
+        after = await time_coroutine(current, iterations)
+
+        print(f"{name:<12} {before:>12.0f} {after:>12.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    run(benchmark(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Compares the throughput of the bot running on the stock asyncio event loop
+with the standard library's json module, and on uvloop with orjson (see
+:mod:`dangobot.core.speedups`).
+
+Unlike the harness, which hands ready-made objects to the bot's handlers,
+events of a harness traffic mix are encoded as raw gateway payloads, which
+are decoded with discord.py's JSON decoder and parsed by its connection
+state, which dispatches them to the bot's handlers as tasks, just like
+events received from the gateway.
+
+Every configuration runs in a fresh event loop, with a fresh bot. The events
+per second, the CPU time per event and the time spent decoding a payload are
+written as JSON, taking the median of the repeated runs.
+
+Usage: python -m benchmarks.speedups [--mix NAME] [--events N]
+    [--repeat N] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Any, Dict, List
+
+from .common import setup_django
+
+setup_django()
+
+# pylint: disable=wrong-import-position
+import discord  # noqa: E402
+from discord.abc import Messageable  # noqa: E402
+
+from dangobot.core import speedups  # noqa: E402
+
+from .harness import (  # noqa: E402
+    TRAFFIC_MIXES,
+    SyntheticGuilds,
+    create_bot,
+    generate_events,
+    get_revision,
+)
+
+# how many payloads are parsed before waiting for the dispatched handlers
+BATCH_SIZE = 100
+
+
+def voice_state_payload(
+    synthetic: SyntheticGuilds,
+    member: discord.Member,
+    after: discord.VoiceState,
+) -> Dict[str, Any]:
+    """Returns the payload of a member joining, moving or leaving voice."""
+    return {
+        "guild_id": str(member.guild.id),
+        "channel_id": str(after.channel.id) if after.channel else None,
+        "user_id": str(member.id),
+        "member": synthetic.member_payload()
+        | {"user": synthetic.user_payload(member.id)},
+        "session_id": "benchmark",
+        "deaf": False,
+        "mute": False,
+        "self_deaf": False,
+        "self_mute": False,
+        "self_video": False,
+        "suppress": False,
+        "request_to_speak_timestamp": None,
+    }
+
+
+async def generate_payloads(args: argparse.Namespace) -> List[str]:
+    """
+    Generates the events of the benchmark (warm-up ones included), encoded
+    as gateway DISPATCH payloads.
+    """
+    random.seed(args.seed)
+
+    _, synthetic = await create_bot(
+        "memory", args.guilds, args.members, args.commands
+    )
+    events = generate_events(
+        synthetic, TRAFFIC_MIXES[args.mix], args.warmup + args.events
+    )
+    payloads = []
+
+    for sequence, (_, event, event_args) in enumerate(events, 1):
+        if event == "message":
+            message: discord.Message = event_args[0]
+            name = "MESSAGE_CREATE"
+            data = synthetic.message_payload(
+                message.guild,  # type: ignore
+                message.author,  # type: ignore
+                message.content,
+            )
+        else:
+            member, _, after = event_args
+            name = "VOICE_STATE_UPDATE"
+            data = voice_state_payload(synthetic, member, after)
+
+        payloads.append(
+            json.dumps({"op": 0, "t": name, "s": sequence, "d": data})
+        )
+
+    return payloads
+
+
+async def wait_for_handlers() -> None:
+    """Waits until the tasks of all dispatched event handlers finish."""
+    current = asyncio.current_task()
+
+    while tasks := [
+        task for task in asyncio.all_tasks() if task is not current
+    ]:
+        await asyncio.gather(*tasks)
+
+
+async def process(parsers: Dict[str, Any], payloads: List[str]) -> None:
+    """Decodes and parses payloads the way the gateway does."""
+    from_json = discord.utils._from_json  # pylint: disable=protected-access
+
+    for index, payload in enumerate(payloads, 1):
+        message = from_json(payload)
+        parsers[message["t"]](message["d"])
+
+        if index % BATCH_SIZE == 0:
+            await wait_for_handlers()
+
+    await wait_for_handlers()
+
+
+async def measure(
+    args: argparse.Namespace, payloads: List[str]
+) -> Dict[str, float]:
+    """Runs the benchmark once, in the current event loop."""
+    random.seed(args.seed)
+
+    async def send(*_args, **_kwargs):
+        pass
+
+    bot, _ = await create_bot(
+        "memory", args.guilds, args.members, args.commands
+    )
+    bot.http.add_role = send  # type: ignore
+    bot.http.remove_role = send  # type: ignore
+
+    parsers = bot._connection.parsers  # pylint: disable=protected-access
+    count = args.warmup
+    warmup, events = payloads[:count], payloads[count:]
+
+    original_send = Messageable.send
+    Messageable.send = send  # type: ignore
+
+    try:
+        await process(parsers, warmup)
+
+        start, cpu_start = time.perf_counter(), time.process_time()
+        await process(parsers, events)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+    finally:
+        Messageable.send = original_send  # type: ignore
+
+    from_json = discord.utils._from_json  # pylint: disable=protected-access
+    decode_start = time.perf_counter()
+
+    for payload in events:
+        from_json(payload)
+
+    decode = time.perf_counter() - decode_start
+
+    return {
+        "events_per_s": len(events) / elapsed,
+        "cpu_us_per_event": cpu / len(events) * 1e6,
+        "decode_us_per_event": decode / len(events) * 1e6,
+    }
+
+
+def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    speedups.install(False)
+    payloads = asyncio.run(generate_payloads(args))
+
+    configurations: Dict[str, Dict[str, Any]] = {}
+    runs: Dict[str, List[Dict[str, float]]] = {}
+
+    # the configurations take turns, so that they're equally affected by
+    # anything else running on the machine
+    for _ in range(args.repeat):
+        for name, enabled in (("stdlib", False), ("speedups", True)):
+            configurations[name] = speedups.install(enabled)
+            runs.setdefault(name, []).append(
+                asyncio.run(measure(args, payloads))
+            )
+
+    speedups.install(False)
+
+    results = {
+        name: configurations[name]
+        | {
+            metric: statistics.median(run[metric] for run in name_runs)
+            for metric in name_runs[0]
+        }
+        for name, name_runs in runs.items()
+    }
+
+    return {
+        "benchmark": "speedups",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": get_revision(),
+        "discord.py": discord.__version__,
+        "parameters": {
+            "mix": args.mix,
+            "events": args.events,
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+            "guilds": args.guilds,
+            "members": args.members,
+            "commands": args.commands,
+            "seed": args.seed,
+        },
+        "results": results,
+        "speedup": (
+            results["speedups"]["events_per_s"]
+            / results["stdlib"]["events_per_s"]
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--mix", choices=TRAFFIC_MIXES, default="mixed")
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--warmup", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--commands", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="write the results to a file instead of stdout"
+    )
+    args = parser.parse_args()
+
+    output = json.dumps(benchmark(args), indent=2)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_invalidation_triggers'),
+        ('commands', '0004_alter_command_id'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            CREATE TRIGGER commands_command_invalidation
+            AFTER INSERT OR UPDATE OR DELETE ON commands_command
+            FOR EACH ROW
+            EXECUTE FUNCTION dangobot_notify_invalidation('guild_id', 'trigger');
+            """,
+            'DROP TRIGGER commands_command_invalidation ON commands_command;',
+        ),
+    ]
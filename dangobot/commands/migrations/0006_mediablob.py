@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+# Keeps commands_mediablob.ref_count equal to the amount of commands whose
+# file column points at the blob, and records when a blob stops being used,
+# so that the garbage collector can remove it after a grace period.
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION commands_count_media_references() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.file <> '' THEN
+        UPDATE commands_mediablob
+        SET ref_count = ref_count - 1,
+            unreferenced_since = CASE
+                WHEN ref_count = 1 THEN now() ELSE NULL
+            END
+        WHERE path = OLD.file;
+    END IF;
+
+    IF TG_OP <> 'DELETE' AND NEW.file <> '' THEN
+        UPDATE commands_mediablob
+        SET ref_count = ref_count + 1, unreferenced_since = NULL
+        WHERE path = NEW.file;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def blob_path(sha256):
+    # a copy of dangobot.commands.models.blob_path at the time of writing,
+    # so that changing the layout later doesn't affect this migration
+    return f'blobs/{sha256[:2]}/{sha256}'
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+
+        # drops the directories of guilds left without any files
+        try:
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+
+
+def move_to_blobs(apps, schema_editor):
+    """
+    Moves the existing attachments into the blob store, storing a single
+    copy of identical files.
+
+    The blobs are hard links to (or copies of) the original files, which are
+    only removed once the migration commits.
+    """
+    Command = apps.get_model('commands', 'Command')
+    MediaBlob = apps.get_model('commands', 'MediaBlob')
+
+    moved = []
+
+    for command in Command.objects.exclude(file='').iterator():
+        source = os.path.join(settings.MEDIA_ROOT, command.file.name)
+
+        try:
+            sha256 = hash_file(source)
+        except FileNotFoundError:
+            logger.warning('Attachment %s is missing, skipping', source)
+            continue
+
+        blob, created = MediaBlob.objects.get_or_create(
+            sha256=sha256,
+            defaults={
+                'path': blob_path(sha256),
+                'size': os.path.getsize(source),
+            },
+        )
+        target = os.path.join(settings.MEDIA_ROOT, blob.path)
+
+        if created and not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+
+        command.file = blob.path
+        command.save(update_fields=['file'])
+
+        moved.append(source)
+
+    transaction.on_commit(
+        lambda: remove_files(moved), using=schema_editor.connection.alias
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commands', '0005_invalidation_trigger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('path', models.CharField(max_length=300, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('unreferenced_since', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(move_to_blobs, migrations.RunPython.noop),
+        migrations.RunSQL(
+            CREATE_FUNCTION,
+            'DROP FUNCTION commands_count_media_references();',
+        ),
+        migrations.RunSQL(
+            """
+            CREATE TRIGGER commands_command_media_references
+            AFTER INSERT OR UPDATE OF file OR DELETE ON commands_command
+            FOR EACH ROW
+            EXECUTE FUNCTION commands_count_media_references();
+
+            UPDATE commands_mediablob
+            SET ref_count = (
+                SELECT count(*) FROM commands_command
+                WHERE commands_command.file = commands_mediablob.path
+            );
+            UPDATE commands_mediablob
+            SET unreferenced_since = now()
+            WHERE ref_count = 0;
+            """,
+            """
+            DROP TRIGGER commands_command_media_references
+            ON commands_command;
+            """,
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commands', '0006_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='command',
+            index=models.Index(fields=['guild', 'trigger'], name='commands_trigger_prefix_idx', opclasses=['int8_ops', 'text_pattern_ops']),
+        ),
+    ]
@@ -6,11 +6,44 @@ from dangobot.core.models import Guild
 
 
 def file_path(instance, filename):
-    """Returns the path in which the command attachments should be stored."""
+    """
+    Returns the path in which the command attachments used to be stored,
+    before they were moved to the blob store (see :func:`blob_path`).
+    """
 
     return f"commands/{instance.guild.id}/{uuid.uuid4()}_{filename}"
 
 
+def blob_path(sha256):
+    """
+    Returns the path in which a command attachment with a given SHA-256
+    digest is stored, relative to the media directory.
+    """
+
+    return f"blobs/{sha256[:2]}/{sha256}"
+
+
+class MediaBlob(models.Model):
+    """
+    A command attachment, stored once no matter how many commands use it.
+
+    The amount of commands referencing a blob is kept up to date by
+    a database trigger, unreferenced blobs are eventually removed by the
+    garbage collector of the commands plugin.
+    """
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    path = models.CharField(max_length=300, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    # when the last command using the blob was deleted, or when it was
+    # uploaded, if no command uses it yet
+    unreferenced_since = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.path} ({self.ref_count} references)"
+
+
 class Command(models.Model):
     """Stores custom commmands configured by the users."""
 
@@ -23,6 +56,14 @@ class Command(models.Model):
     class Meta:  # pyright: ignore[reportIncompatibleVariableOverride]
         # see https://github.com/microsoft/pylance-release/issues/3814
         unique_together = ("guild", "trigger")
+        indexes = [
+            # used for filtering commands by the prefix of their trigger
+            models.Index(
+                fields=["guild", "trigger"],
+                name="commands_trigger_prefix_idx",
+                opclasses=["int8_ops", "text_pattern_ops"],
+            )
+        ]
 
     def __str__(self):
         return f"[{self.guild.name}] {self.trigger} -> {self.response}"
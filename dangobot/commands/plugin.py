@@ -1,9 +1,10 @@
+import asyncio
 import logging
-import os
+from typing import Optional
 
 from aiohttp import ClientError, ClientResponseError
 from asyncpg import exceptions
-from discord import File, Embed
+from discord import RawBulkMessageDeleteEvent, RawMessageDeleteEvent
 from discord.ext import commands
 from discord.ext.commands import (
     BadArgument,
@@ -15,13 +16,15 @@ from django.conf import settings
 
 import validators
 
+from dangobot.core import media, metrics
 from dangobot.core.bot import command_handler, DangoBot
 from dangobot.core.plugin import Cog
-from dangobot.core.helpers import download_file, FileTooLarge
+from dangobot.core.helpers import FileTooLarge
 
-from .models import file_path
+from . import storage
 from .data import ParsedCommand
 from .repository import CommandRepository
+from .views import CommandListView
 
 
 logger = logging.getLogger(__name__)
@@ -30,6 +33,22 @@ logger = logging.getLogger(__name__)
 class Commands(Cog):
     """A plugin for configuring custom user-made bot commands."""
 
+    def __init__(self, bot: DangoBot):
+        super().__init__(bot)
+
+        self._gc_task: Optional[asyncio.Task] = None
+
+    async def cog_load(self) -> None:
+        if settings.MEDIA_GC_INTERVAL:
+            self._gc_task = asyncio.create_task(
+                storage.collect_garbage_periodically(), name="media-gc"
+            )
+
+    async def cog_unload(self) -> None:
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            self._gc_task = None
+
     @command_handler
     async def handle_command(self, ctx: Context) -> bool:
         """
@@ -58,19 +77,69 @@ class Commands(Cog):
 
         return False
 
+    @Cog.listener()
+    async def on_raw_message_delete(self, payload: RawMessageDeleteEvent):
+        """Forgets the attachments uploaded with a deleted message."""
+        media.forget_uploads(payload.message_id)
+
+    @Cog.listener()
+    async def on_raw_bulk_message_delete(
+        self, payload: RawBulkMessageDeleteEvent
+    ):
+        """Forgets the attachments uploaded with deleted messages."""
+        for message_id in payload.message_ids:
+            media.forget_uploads(message_id)
+
     async def send_response(self, ctx: Context, command) -> None:
         """Sends a response for a given custom command database record."""
         params = {"content": command["response"]}
 
         if command["file"] == "":
             await ctx.send(**params)
-        else:
-            # TODO: actual asynchronous file read
-            with open(
-                os.path.join(settings.MEDIA_ROOT, command["file"]), "rb"
-            ) as file:
-                params["file"] = File(file, command["original_file_name"])
-                await ctx.send(**params)
+            return
+
+        if settings.REUSE_ATTACHMENT_URLS and await self.send_uploaded_file(
+            ctx, command
+        ):
+            return
+
+        params["file"] = await media.open_file(
+            command["file"], command["original_file_name"]
+        )
+        message = await ctx.send(**params)
+
+        metrics.attachment_sends_total.inc("upload")
+
+        if settings.REUSE_ATTACHMENT_URLS:
+            media.remember_upload(
+                command["file"], command["original_file_name"], message
+            )
+
+    async def send_uploaded_file(self, ctx: Context, command) -> bool:
+        """
+        Sends a response with the URL of the command's attachment, if it was
+        uploaded before, instead of uploading it again.
+
+        Returns `False` if the attachment has to be uploaded.
+        """
+        upload = await media.get_upload(
+            self.bot.http, command["file"], command["original_file_name"]
+        )
+
+        if upload is None:
+            return False
+
+        content = f"{command['response']}\n{upload.url}".strip()
+
+        if len(content) > 2000:
+            return False
+
+        await ctx.send(content)
+
+        metrics.attachment_sends_total.inc("reuse")
+        metrics.attachment_bytes_saved_total.inc(amount=upload.size)
+
+        return True
 
     async def parse_command(self, ctx: Context, args) -> ParsedCommand:
         """
@@ -123,16 +192,25 @@ class Commands(Cog):
             args = args[:-1]
 
         if len(ctx.message.attachments) > 0:
-            url = ctx.message.attachments[0].url
+            attachment = ctx.message.attachments[0]
+
+            # the size of files uploaded to Discord is known up front
+            if attachment.size > settings.MAX_ATTACHMENT_SIZE:
+                raise CommandError(
+                    "The provided attachment is larger than "
+                    f"{settings.MAX_ATTACHMENT_SIZE / 2**20:.0f} MiB!"
+                )
+
+            url = attachment.url
 
         if url != "":
             filename = url.split("/")[-1]
-            # relative path is being saved to the database
-            path_relative = file_path(ctx, filename)
-            path_absolute = f"{settings.MEDIA_ROOT}/{path_relative}"
 
             try:
-                await download_file(self.bot.http_session, url, path_absolute)
+                # relative path is being saved to the database
+                path_relative = await storage.store_from_url(
+                    self.bot.http_session, url
+                )
             except ClientError as exc:
                 if isinstance(exc, ClientResponseError) and exc.status == 404:
                     raise CommandError(
@@ -140,9 +218,8 @@ class Commands(Cog):
                     ) from exc
 
                 logger.error(
-                    "An error occured while downloading file %s to %s.",
+                    "An error occured while downloading file %s.",
                     url,
-                    path_absolute,
                     exc_info=True,
                 )
 
@@ -194,26 +271,19 @@ class Commands(Cog):
 
         await ctx.send(f"Command `{command.trigger}` added successfully!")
 
-    @cmds.command()
-    async def list(self, ctx: Context):
+    @cmds.command(usage="(<prefix>)")
+    async def list(self, ctx: Context, prefix: str = ""):
         """
-        List all commands defined in the server.
+        List the commands defined in the server, optionally only the ones
+        whose trigger starts with a given prefix.
+
+        The commands are listed in pages, which can be switched with the
+        buttons below the list.
         """
         if ctx.guild is None:
             raise NoPrivateMessage("This command cannot be used in a DM")
 
-        command_list = await CommandRepository().find_all_from_guild(ctx.guild)
-
-        embed = Embed()
-        embed.title = "Available custom commands:"
-        embed.description = "\n".join(
-            map(
-                lambda c: f"{ctx.prefix}{c['trigger']}",
-                command_list,
-            )
-        )
-
-        await ctx.send(embed=embed)
+        await CommandListView(ctx, prefix).send()
 
     @cmds.command()
     @commands.has_permissions(administrator=True)
@@ -1,45 +1,319 @@
-from typing import Any, List, Type
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
 
+from asyncpg import Record
 from asyncpg.connection import Connection
+from asyncpg.pool import Pool
 from discord import Guild
+from django.conf import settings
 from django.db.models.base import Model
 
+from dangobot.core import database
+from dangobot.core.cache import LRUCache
+from dangobot.core.invalidation import Invalidation
 from dangobot.core.repository import Repository
 
-from .models import Command as DBCommand
+from .models import Command as DBCommand, MediaBlob
 from .data import ParsedCommand
 
 
-class CommandRepository(Repository):  # pylint: disable=missing-class-docstring
+def _get_prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    Returns the smallest string greater than all strings starting with
+    `prefix` in code point order, or `None` if there is no such string.
+    """
+    while prefix:
+        code_point = ord(prefix[-1]) + 1
+
+        # surrogates can't be encoded
+        if 0xD800 <= code_point <= 0xDFFF:
+            code_point = 0xE000
+
+        if code_point <= 0x10FFFF:
+            return prefix[:-1] + chr(code_point)
+
+        prefix = prefix[:-1]
+
+    return None
+
+
+class CommandRepository(Repository):
+    """
+    Stores the custom commands, along with an in-memory index of command
+    triggers for every guild, so that messages not matching any command can be
+    answered without querying the database.
+    """
+
+    _triggers: LRUCache[int, Set[str]]
+    _generations: Dict[int, int]
+    _commands: LRUCache[Tuple[int, str], Record]
+
+    def __init__(self, db_pool: Optional[Pool] = None) -> None:
+        super().__init__(db_pool=db_pool)
+
+        self._triggers = LRUCache()
+        self._generations = {}
+        self._commands = LRUCache(maxsize=settings.COMMAND_CACHE_SIZE)
+
     @property
     def model(self) -> Type[Model]:
         return DBCommand
 
+    def get_caches(self) -> Dict[str, LRUCache]:
+        return {"command_triggers": self._triggers, "commands": self._commands}
+
+    def get_hot_queries(self) -> List[str]:
+        return [
+            self.get_query("select", ("guild_id", "trigger")),
+            self._find_all_from_guild_query,
+        ]
+
+    @property
+    def _find_all_from_guild_query(self) -> str:
+        return (
+            f"SELECT trigger FROM {self.table_name} "
+            "WHERE guild_id = $1 ORDER BY trigger ASC"
+        )
+
+    async def get_triggers(self, guild: Guild) -> Set[str]:
+        """
+        Returns the triggers of all commands defined for a given guild.
+
+        The triggers are loaded from the database on first use, and kept
+        up to date by :meth:`add_to_guild`, :meth:`update_in_guild` and
+        :meth:`delete_from_guild` afterwards, while the other writes drop
+        them.
+        """
+        if (triggers := self._triggers.get(guild.id)) is not None:
+            return triggers
+
+        generation = self._generations.get(guild.id, 0)
+        records = await self.find_all_from_guild(guild)
+        triggers = {record["trigger"] for record in records}
+
+        # don't store the index if a command was written while we were
+        # waiting for the query, as it might not contain that change
+        if self._generations.get(guild.id, 0) == generation:
+            self._triggers[guild.id] = triggers
+
+        return triggers
+
+    def invalidate(self, guild_id: int, trigger: Optional[str] = None):
+        """
+        Drops cached data for a given guild, or only for a single command
+        if its `trigger` is specified.
+        """
+        self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+
+        if trigger is None:
+            self._triggers.pop(guild_id, None)
+
+            for key in [key for key in self._commands if key[0] == guild_id]:
+                del self._commands[key]
+        else:
+            self._commands.pop((guild_id, trigger), None)
+
+    def invalidate_on_rollback(self, guild_id: int):
+        """
+        Drops the cached data of a given guild if the current database
+        transaction gets rolled back, as it may contain uncommitted changes.
+        """
+        database.call_on_rollback(lambda: self.invalidate(guild_id))
+
+    def invalidate_all(self):
+        """Drops the cached data of all guilds."""
+        guild_ids = {key[0] for key in self._commands}
+        guild_ids.update(self._triggers, self._generations)
+
+        for guild_id in guild_ids:
+            self._generations[guild_id] = (
+                self._generations.get(guild_id, 0) + 1
+            )
+
+        self._triggers.clear()
+        self._commands.clear()
+
+    def invalidate_guilds(self, guild_ids: Optional[Set[int]]):
+        if guild_ids is None:
+            self.invalidate_all()
+            database.call_on_rollback(self.invalidate_all)
+            return
+
+        for guild_id in guild_ids:
+            self.invalidate(guild_id)
+            self.invalidate_on_rollback(guild_id)
+
+    def restore_on_commit(
+        self,
+        guild_id: int,
+        generation: int,
+        triggers: Optional[Set[str]],
+        commands: Dict[str, Record],
+    ):
+        """
+        Puts back the cached data of a guild dropped by a single write made
+        through this repository (see :meth:`invalidate_guilds`), updated with
+        the written `triggers` and `commands`, once the current database
+        transaction gets committed.
+
+        Nothing is restored if the guild's data was invalidated again since
+        `generation`, read right before the write, as it might be stale then.
+        """
+
+        def callback() -> None:
+            if self._generations.get(guild_id, 0) != generation + 1:
+                return
+
+            if triggers is not None:
+                self._triggers[guild_id] = triggers
+
+            for trigger, command in commands.items():
+                self._commands[(guild_id, trigger)] = command
+
+        database.call_on_commit(callback)
+
+    def evict_guild(self, guild_id: int):
+        """Removes all data of a given guild from the cache."""
+        self.invalidate(guild_id)
+        self._generations.pop(guild_id, None)
+
+    def apply_invalidation(self, invalidation: Invalidation):
+        if invalidation.guild_id is None:
+            self.invalidate_all()
+        elif invalidation.operation == "UPDATE":
+            # the trigger stays the same, only the command's record changes
+            self.invalidate(invalidation.guild_id, invalidation.key)
+        else:
+            self.invalidate(invalidation.guild_id)
+
     async def find_by_trigger(self, trigger: str, guild: Guild) -> Any:
         """Finds a command from a given guild by its text trigger."""
-        conn: Connection
-        async with self.db_pool.acquire() as conn:
-            return await conn.fetchrow(
-                f"SELECT * FROM {self.table_name} "
-                "WHERE guild_id = $1 AND trigger = $2",
-                guild.id,
-                trigger,
-            )
+        if trigger not in await self.get_triggers(guild):
+            return None
+
+        key = (guild.id, trigger)
+
+        if (command := self._commands.get(key)) is not None:
+            return command
+
+        generation = self._generations.get(guild.id, 0)
+
+        command = await self.find_one_by(
+            {"guild_id": guild.id, "trigger": trigger}
+        )
+
+        if (
+            command is not None
+            and self._generations.get(guild.id, 0) == generation
+        ):
+            self._commands[key] = command
+
+        return command
 
     async def find_all_from_guild(self, guild: Guild) -> List[Any]:
         """Returns a list of all custom commands defined for a given guild."""
         conn: Connection
-        async with self.db_pool.acquire() as conn:
-            return await conn.fetch(
-                f"SELECT trigger FROM {self.table_name} "
-                "WHERE guild_id = $1 ORDER BY trigger ASC",
-                guild.id,
-            )
+        async with self.acquire("find_all_from_guild") as conn:
+            return await conn.fetch(self._find_all_from_guild_query, guild.id)
+
+    def get_page_query(self, *operators: str, backwards: bool = False) -> str:
+        """
+        Returns the query used by :meth:`find_page`, selecting the triggers of
+        a guild's commands, ordered by the trigger (descending if `backwards`
+        is set), and compared to the parameters following the guild ID and
+        the limit using `operators`.
+        """
+        conditions = ["guild_id = $1"] + [
+            f"trigger {operator} ${index}"
+            for index, operator in enumerate(operators, 3)
+        ]
+
+        return (
+            f"SELECT trigger FROM {self.table_name} "
+            f"WHERE {' AND '.join(conditions)} "
+            f"ORDER BY trigger {'DESC' if backwards else 'ASC'} LIMIT $2"
+        )
+
+    async def find_page(
+        self,
+        guild: Guild,
+        limit: int,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        prefix: str = "",
+    ) -> List[str]:
+        """
+        Returns a page of the triggers of the commands defined for a given
+        guild, in alphabetical order.
+
+        The pages are found with keyset pagination, so every page takes
+        the same time to fetch, no matter how many commands the guild has.
+
+        Parameters
+        -----------
+        guild: :class:`discord.Guild`
+            The guild whose commands are listed.
+        limit: `int`
+            The maximum amount of returned triggers.
+        after: Optional[`str`]
+            Only return triggers following this one, usually the last one of
+            the previous page.
+        before: Optional[`str`]
+            Only return the triggers directly preceding this one, usually the
+            first one of the next page.
+        prefix: `str`
+            Only return triggers starting with this string.
+        """
+        args: List[Any] = [guild.id, limit]
+        operators: List[str] = []
+
+        if prefix:
+            # compared using the operators of the text_pattern_ops index,
+            # which (unlike LIKE) can use it in generic query plans
+            args.append(prefix)
+            operators.append("~>=~")
+
+            if (upper_bound := _get_prefix_upper_bound(prefix)) is not None:
+                args.append(upper_bound)
+                operators.append("~<~")
+
+        backwards = after is None and before is not None
+
+        if after is not None:
+            args.append(after)
+            operators.append(">")
+        elif before is not None:
+            args.append(before)
+            operators.append("<")
+
+        query = self.get_page_query(*operators, backwards=backwards)
+
+        conn: Connection
+        async with self.acquire("find_page") as conn:
+            records = await conn.fetch(query, *args)
+
+        triggers = [record["trigger"] for record in records]
+
+        if backwards:
+            triggers.reverse()
+
+        return triggers
 
     async def add_to_guild(self, guild: Guild, command: ParsedCommand) -> None:
         """Inserts a command for a given guild into the database."""
+        generation = self._generations.get(guild.id, 0)
+        triggers = self._triggers.get(guild.id)
 
-        await self.insert(
+        record = await self.insert_returning(
             {
                 "guild_id": guild.id,
                 "trigger": command.trigger,
@@ -52,6 +326,13 @@ class CommandRepository(Repository):  # pylint: disable=missing-class-docstring
             }
         )
 
+        self.restore_on_commit(
+            guild.id,
+            generation,
+            triggers | {command.trigger} if triggers is not None else None,
+            {command.trigger: record},
+        )
+
     async def update_in_guild(
         self, guild: Guild, command: ParsedCommand
     ) -> bool:
@@ -60,16 +341,26 @@ class CommandRepository(Repository):  # pylint: disable=missing-class-docstring
 
         Returns `true` if the update was successful, or `false` when it wasn't.
         """
-        async with self.db_pool.acquire() as conn:
-            result: str = await conn.execute(
-                f"UPDATE {self.table_name} "
-                "SET response = $3, file = $4, original_file_name = $5 "
-                "WHERE guild_id = $1 AND trigger = $2",
-                guild.id,
-                *command,
-            )
+        generation = self._generations.get(guild.id, 0)
+        triggers = self._triggers.get(guild.id)
+
+        record = await self.update_returning(
+            {"guild_id": guild.id, "trigger": command.trigger},
+            {
+                "response": command.response,
+                "file": command.path_relative,
+                "original_file_name": command.filename,
+            },
+        )
+
+        self.restore_on_commit(
+            guild.id,
+            generation,
+            triggers,
+            {command.trigger: record} if record is not None else {},
+        )
 
-            return int(result.split()[1]) == 1
+        return record is not None
 
     async def delete_from_guild(self, trigger: str, guild: Guild) -> bool:
         """
@@ -77,12 +368,96 @@ class CommandRepository(Repository):  # pylint: disable=missing-class-docstring
 
         Returns `true` if the delete was successful, or `false` when it wasn't.
         """
-        async with self.db_pool.acquire() as conn:
-            result: str = await conn.execute(
-                f"DELETE FROM {self.table_name} "
-                "WHERE guild_id = $1 AND trigger = $2",
-                guild.id,
-                trigger,
-            )
+        generation = self._generations.get(guild.id, 0)
+        triggers = self._triggers.get(guild.id)
+
+        deleted = await self.destroy_by(
+            {"guild_id": guild.id, "trigger": trigger}
+        )
+
+        self.restore_on_commit(
+            guild.id,
+            generation,
+            triggers - {trigger} if triggers is not None else None,
+            {},
+        )
+
+        return deleted == 1
+
+
+class MediaBlobRepository(Repository):
+    """
+    Stores the records of command attachments kept in the content-addressed
+    blob store, along with the amount of commands referencing each of them.
+    """
+
+    @property
+    def model(self) -> Type[Model]:
+        return MediaBlob
+
+    async def register(self, sha256: str, path: str, size: int) -> None:
+        """
+        Records a blob, before its file is moved into place.
+
+        The record is committed right away, regardless of the transaction of
+        the current task, so that a blob is never stored without a record.
+        Blobs registered again have their garbage collection grace period
+        restarted, so that they're not collected before a command uses them.
+        """
+        conn: Connection
+        with database.outside_scope():
+            async with self.acquire("register") as conn:
+                await conn.execute(
+                    f"INSERT INTO {self.table_name} "
+                    "(sha256, path, size, ref_count, unreferenced_since) "
+                    "VALUES ($1, $2, $3, 0, now()) "
+                    "ON CONFLICT (sha256) DO UPDATE SET unreferenced_since = "
+                    f"CASE WHEN {self.table_name}.ref_count = 0 "
+                    "THEN now() ELSE NULL END",
+                    sha256,
+                    path,
+                    size,
+                )
+
+    async def collect_garbage(
+        self,
+        grace_period: float,
+        remove: Callable[[List[str]], Awaitable[None]],
+        limit: int = 100,
+    ) -> List[str]:
+        """
+        Deletes the records of blobs that haven't been used by any command
+        for at least `grace_period` seconds, calling `remove` with the paths
+        of their files before the deletion is committed.
+
+        The records stay locked while the files are being removed, so that
+        a blob being registered again concurrently waits until it's gone,
+        and is then stored anew.
+
+        Returns the paths of the removed blobs, at most `limit` of them.
+        """
+        conn: Connection
+        with database.outside_scope():
+            async with self.acquire("collect_garbage") as conn:
+                async with conn.transaction():
+                    records = await conn.fetch(
+                        f"SELECT sha256, path FROM {self.table_name} "
+                        "WHERE ref_count = 0 AND unreferenced_since < "
+                        "now() - make_interval(secs => $1) "
+                        "LIMIT $2 FOR UPDATE SKIP LOCKED",
+                        grace_period,
+                        limit,
+                    )
+
+                    if not records:
+                        return []
+
+                    paths = [record["path"] for record in records]
+                    await remove(paths)
+
+                    await conn.execute(
+                        self.get_query("delete_any", (self.primary_key,)),
+                        [record["sha256"] for record in records],
+                    )
 
-            return int(result.split()[1]) == 1
+                    return paths
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from typing import List
+
+import aiohttp
+from django.conf import settings
+
+from dangobot.core import database, media
+from dangobot.core.helpers import download_file
+
+from .models import blob_path
+from .repository import MediaBlobRepository
+
+logger = logging.getLogger(__name__)
+
+# where attachments are downloaded to, before they're moved to the blob store
+INCOMING_DIRECTORY = os.path.join("blobs", "incoming")
+
+
+def _move(source: str, target: str) -> None:
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(source, target)
+
+
+def _remove(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(os.path.join(settings.MEDIA_ROOT, path))
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_downloads(max_age: float) -> int:
+    directory = os.path.join(settings.MEDIA_ROOT, INCOMING_DIRECTORY)
+    removed = 0
+
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < time.time() - max_age:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+
+    return removed
+
+
+async def store_from_url(http_session: aiohttp.ClientSession, url: str) -> str:
+    """
+    Downloads an attachment into the blob store, returning its path relative
+    to ``MEDIA_ROOT``.
+
+    Attachments are stored under their SHA-256 digest, computed while they're
+    downloaded, so identical files are only stored once, no matter how many
+    commands use them.
+    """
+    # the connection of the invocation isn't held during the download
+    await database.release_scope()
+
+    incoming = os.path.join(
+        settings.MEDIA_ROOT, INCOMING_DIRECTORY, uuid.uuid4().hex
+    )
+    digest = hashlib.sha256()
+
+    try:
+        size = await download_file(http_session, url, incoming, digest=digest)
+
+        sha256 = digest.hexdigest()
+        path = blob_path(sha256)
+
+        await MediaBlobRepository().register(sha256, path, size)
+        await asyncio.to_thread(
+            _move, incoming, os.path.join(settings.MEDIA_ROOT, path)
+        )
+    except BaseException:
+        if os.path.exists(incoming):
+            os.remove(incoming)
+
+        raise
+
+    return path
+
+
+async def collect_garbage() -> int:
+    """
+    Removes the blobs which haven't been used by any command for
+    ``MEDIA_GC_GRACE_PERIOD`` seconds, along with downloads left behind by
+    a crash. Returns the amount of removed blobs.
+    """
+
+    async def remove(paths: List[str]) -> None:
+        await asyncio.to_thread(_remove, paths)
+
+        for path in paths:
+            media.cache.pop(path, None)
+
+    removed = 0
+
+    while paths := await MediaBlobRepository().collect_garbage(
+        settings.MEDIA_GC_GRACE_PERIOD, remove
+    ):
+        removed += len(paths)
+
+    await asyncio.to_thread(
+        _remove_stale_downloads, settings.MEDIA_GC_GRACE_PERIOD
+    )
+
+    return removed
+
+
+async def collect_garbage_periodically() -> None:
+    """Runs :func:`collect_garbage` every ``MEDIA_GC_INTERVAL`` seconds."""
+    while True:
+        await asyncio.sleep(settings.MEDIA_GC_INTERVAL)
+
+        try:
+            if removed := await collect_garbage():
+                logger.info("Removed %d unused command attachments", removed)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to remove unused command attachments")
@@ -0,0 +1,149 @@
+from typing import List, Optional
+
+from discord import ButtonStyle, Embed, HTTPException, Interaction, Message, ui
+from discord.ext.commands import Context
+
+from .repository import CommandRepository
+
+# triggers longer than this are shortened, so that a full page always fits
+# in the embed description
+MAX_TRIGGER_LENGTH = 100
+
+
+class CommandListView(ui.View):
+    """
+    A paginated list of the custom commands of a guild, fetching the pages
+    from the database as the buttons are pressed.
+
+    Parameters
+    -----------
+    ctx: :class:`discord.ext.commands.Context`
+        The context of the invocation of the list command. Only its author
+        can change the pages.
+    prefix: `str`
+        Only commands whose triggers start with it are listed.
+    page_size: `int`
+        The amount of commands on each page.
+    """
+
+    message: Optional[Message]
+
+    def __init__(self, ctx: Context, prefix: str = "", page_size: int = 25):
+        super().__init__(timeout=180)
+
+        self.ctx = ctx
+        self.prefix = prefix
+        self.page_size = page_size
+        self.page = 1
+        self.triggers: List[str] = []
+        self.message = None
+
+    async def fetch(
+        self, after: Optional[str] = None, before: Optional[str] = None
+    ) -> None:
+        """
+        Fetches the page following the trigger `after`, or preceding the
+        trigger `before`, or the first page if neither is given.
+        """
+        assert self.ctx.guild is not None
+
+        # one more trigger is fetched to tell if there's another page
+        triggers = await CommandRepository().find_page(
+            self.ctx.guild,
+            self.page_size + 1,
+            after=after,
+            before=before,
+            prefix=self.prefix,
+        )
+        more = len(triggers) > self.page_size
+
+        if before is not None:
+            # the extra trigger is the first one, as the pages are fetched
+            # backwards
+            self.triggers = triggers[1:] if more else triggers
+            self.previous_page.disabled = not more
+            self.next_page.disabled = False
+        else:
+            self.triggers = triggers[:-1] if more else triggers
+            self.previous_page.disabled = after is None
+            self.next_page.disabled = not more
+
+    def get_embed(self) -> Embed:
+        """Returns the embed listing the commands of the current page."""
+        embed = Embed()
+        embed.title = (
+            f"Available custom commands starting with `{self.prefix}`:"
+            if self.prefix
+            else "Available custom commands:"
+        )
+
+        lines = []
+
+        for trigger in self.triggers:
+            if len(trigger) > MAX_TRIGGER_LENGTH:
+                trigger = trigger[:MAX_TRIGGER_LENGTH] + "…"
+
+            lines.append(f"{self.ctx.prefix}{trigger}")
+
+        embed.description = "\n".join(lines) or "No commands found."
+        embed.set_footer(text=f"Page {self.page}")
+
+        return embed
+
+    async def send(self) -> None:
+        """Sends the first page of the list."""
+        await self.fetch()
+
+        if self.previous_page.disabled and self.next_page.disabled:
+            await self.ctx.send(embed=self.get_embed())
+            return
+
+        self.message = await self.ctx.send(embed=self.get_embed(), view=self)
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        if interaction.user.id == self.ctx.author.id:
+            return True
+
+        await interaction.response.send_message(
+            f"Only {self.ctx.author.mention} can change the pages of this "
+            "list.",
+            ephemeral=True,
+        )
+
+        return False
+
+    async def on_timeout(self) -> None:
+        if self.message is None:
+            return
+
+        try:
+            await self.message.edit(view=None)
+        except HTTPException:
+            pass  # the message or its channel is gone
+
+    @ui.button(label="Previous", style=ButtonStyle.secondary)
+    async def previous_page(
+        self, interaction: Interaction, _button: ui.Button
+    ):
+        """Shows the previous page."""
+        # starts over if all commands of the current page were deleted
+        await self.fetch(before=self.triggers[0] if self.triggers else None)
+        self.page = self.page - 1 if not self.previous_page.disabled else 1
+
+        await interaction.response.edit_message(
+            embed=self.get_embed(), view=self
+        )
+
+    @ui.button(label="Next", style=ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, _button: ui.Button):
+        """Shows the next page."""
+        if self.triggers:
+            await self.fetch(after=self.triggers[-1])
+            self.page += 1
+        else:
+            await self.fetch()
+            self.page = 1
+
+        await interaction.response.edit_message(
+            embed=self.get_embed(), view=self
+        )
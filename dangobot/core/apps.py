@@ -0,0 +1,21 @@
+from discord import Intents
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    """
+    The core app, handling commands sent in guild channels and DMs.
+
+    Apps declare the gateway intents their plugins need in the ``intents``
+    attribute of their config, the bot subscribes to the union of the intents
+    of all installed apps. They're declared here rather than in the plugins,
+    as they have to be known before the plugins get loaded.
+    """
+
+    name = "dangobot.core"
+    intents = Intents(
+        guilds=True,
+        guild_messages=True,
+        dm_messages=True,
+        message_content=True,
+    )
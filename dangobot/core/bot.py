@@ -1,31 +1,55 @@
+import asyncio
 import importlib.util
 import inspect
 import logging
-import traceback
-from typing import Callable, Coroutine, List, Optional, Tuple, TypeVar
-
-from discord import Intents, Guild
+import time
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from discord import Intents, Guild, MemberCacheFlags
+from discord.abc import Snowflake
 from discord.ext import commands
 from discord.ext.commands import Cog, Context, errors
+from discord.utils import MISSING
+from django.apps import apps
 from django.conf import settings
-from django.db import connection
+from django.core.exceptions import ImproperlyConfigured
 
 import aiohttp
-import asyncpg
 
-from . import database
+from . import database, log, memory, metrics, startup, tracing
+from .cache import LRUCache
+from .cluster import WorkerChannel
+from .commands.context import DangoContext
 from .commands.embeds import ErrorEmbedFormatter
 from .commands.help import DangoHelpCommand
-from .repository import GuildRepository
+from .invalidation import InvalidationBus
+from .reporting import ErrorReporter, create_paste_backend
+from .repository import GuildRepository, get_caches, get_repositories
 
 _CogT = TypeVar("_CogT", bound=Cog)
+_HandlerT = Callable[[_CogT, Context], Coroutine[None, None, bool]]
+
+CommandHandler = Callable[[Context], Coroutine[None, None, bool]]
 
 logger = logging.getLogger(__name__)
+# logs every handled command, can be sampled with LOG_SAMPLE_RATES
+command_logger = logging.getLogger("dangobot.commands")
 
 
 def command_handler(
-    meth: Callable[[_CogT, Context], Coroutine[None, None, bool]]
-) -> Callable[[_CogT, Context], Coroutine[None, None, bool]]:
+    meth: Optional[_HandlerT] = None, /, *, priority: int = 0
+) -> Any:
     """
     Registers this coroutine as a command handler for the bot.
 
@@ -34,75 +58,479 @@ def command_handler(
 
     It should have only one argument, the :class:`discord.ext.commands.Context`
     for the invoked command, and return a `bool`, signalling whether it has
-    handled this invocation, or ignored it.
+    handled this invocation, or ignored it. Once a handler returns `True`,
+    the remaining ones are skipped.
+
+    Can be used either bare, or called with a `priority` argument. Handlers
+    with a higher priority are executed first.
     """
-    if inspect.iscoroutinefunction(meth) is False:
-        raise TypeError(f"{meth.__qualname__} is not a coroutine")
 
-    annotations = getattr(meth, "__annotations__", None)
+    def decorator(meth: _HandlerT) -> _HandlerT:
+        if inspect.iscoroutinefunction(meth) is False:
+            raise TypeError(f"{meth.__qualname__} is not a coroutine")
 
-    if isinstance(annotations, dict):
-        annotations["command_handler"] = True
+        annotations = getattr(meth, "__annotations__", None)
 
-    return meth
+        if isinstance(annotations, dict):
+            annotations["command_handler"] = True
+            annotations["command_handler_priority"] = priority
 
+        return meth
 
-class DangoBot(commands.Bot):
-    """The core bot class."""
+    if meth is None:
+        return decorator
 
-    _command_handlers: List[Tuple[str, str]] = []
+    return decorator(meth)
 
-    http_session: aiohttp.ClientSession  # initialized in `setup_hook`
 
-    def __init__(self):
-        intents = Intents.default()
-        intents.message_content = True  # pylint: disable=assigning-non-slot
+class DangoBot(commands.AutoShardedBot):
+    """
+    The core bot class.
+
+    Parameters
+    -----------
+    metrics_port: Optional[`int`]
+        The port to serve Prometheus metrics on, if any.
+    shard_count: Optional[`int`]
+        The total amount of shards, or `None` to use the amount recommended
+        by Discord.
+    shard_ids: Optional[Sequence[`int`]]
+        The IDs of the shards to connect, or `None` to connect all of them.
+        Requires `shard_count` to be set.
+    cluster: Optional[:class:`~dangobot.core.cluster.WorkerChannel`]
+        The connection to the cluster launcher, if the bot is running as one
+        of its workers.
+    startup_report: `bool`
+        Whether to log how long each phase of the startup took once the bot
+        is ready.
+    """
+
+    _command_handlers: Tuple[CommandHandler, ...]
+
+    http_session: aiohttp.ClientSession  # initialized in `setup_hook`
+    error_reporter: ErrorReporter  # initialized in `setup_hook`
+
+    metrics_port: Optional[int]
+    metrics_server: Optional[metrics.MetricsServer]
+    ready_shards: Set[int]
+    invalidation_bus: Optional[InvalidationBus]
+    cluster: Optional[WorkerChannel]
+    startup_report: bool
+
+    def __init__(
+        self,
+        metrics_port: Optional[int] = None,
+        shard_count: Optional[int] = None,
+        shard_ids: Optional[Sequence[int]] = None,
+        cluster: Optional[WorkerChannel] = None,
+        startup_report: bool = False,
+    ):
+        intents = self.get_intents()
 
         super().__init__(
             intents=intents,
             command_prefix=self.get_command_prefix,
             description=settings.DESCRIPTION,
             help_command=DangoHelpCommand(),
+            shard_count=shard_count,
+            shard_ids=list(shard_ids) if shard_ids is not None else None,
+            member_cache_flags=self.get_member_cache_flags(intents),
+            max_messages=settings.MAX_MESSAGES,
+            chunk_guilds_at_startup=settings.CHUNK_GUILDS_AT_STARTUP,
         )
 
-    async def setup_hook(self) -> None:
-        database.db_pool = await asyncpg.create_pool(
-            database=connection.settings_dict["NAME"],
-            user=connection.settings_dict["USER"],
-            password=connection.settings_dict["PASSWORD"],
-            host=connection.settings_dict["HOST"],
-            port=connection.settings_dict["PORT"],
+        self._command_handlers = ()
+
+        self.ready_shards = set()
+        self.invalidation_bus = None
+        self.cluster = cluster
+        self.startup_report = startup_report
+
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self._event_loop_lag_task: Optional[asyncio.Task] = None
+        self._cache_usage_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def get_intents() -> Intents:
+        """
+        Returns the union of the gateway intents declared by the configs of
+        the installed apps, along with the ones enabled by the
+        ``EXTRA_INTENTS`` setting.
+        """
+        intents = Intents.none()
+
+        for config in apps.get_app_configs():
+            intents |= getattr(config, "intents", Intents.none())
+
+        for name in settings.EXTRA_INTENTS:
+            if name not in Intents.VALID_FLAGS:
+                raise ImproperlyConfigured(f"Unknown intent {name!r}")
+
+            setattr(intents, name, True)
+
+        logger.info(
+            "Subscribing to gateway intents: %s",
+            ", ".join(name for name, enabled in intents if enabled),
         )
 
-        self.http_session = aiohttp.ClientSession()
+        return intents
+
+    @staticmethod
+    def get_member_cache_flags(intents: Intents) -> MemberCacheFlags:
+        """
+        Returns the member cache flags enabled by the ``MEMBER_CACHE_FLAGS``
+        setting, making sure that the gateway `intents` they depend on are
+        enabled.
+        """
+        flags = MemberCacheFlags.none()
+
+        for name in settings.MEMBER_CACHE_FLAGS:
+            if name not in MemberCacheFlags.VALID_FLAGS:
+                raise ImproperlyConfigured(
+                    f"Unknown member cache flag {name!r}, expected one of "
+                    f"{', '.join(MemberCacheFlags.VALID_FLAGS)}"
+                )
+
+            setattr(flags, name, True)
+
+        # discord.py can only keep track of these members with the intents
+        # delivering their events, and refuses to start otherwise
+        for name, intent in (("voice", "voice_states"), ("joined", "members")):
+            if getattr(flags, name) and not getattr(intents, intent):
+                raise ImproperlyConfigured(
+                    f"The {name!r} member cache flag requires the "
+                    f"{intent!r} intent, enable an app that needs it or add "
+                    "it to EXTRA_INTENTS"
+                )
+
+        return flags
+
+    async def setup_hook(self) -> None:
+        timer = startup.timer
+
+        with timer.phase("setup_hook"):
+            if self.cluster is not None:
+                await self.cluster.start(self)
+
+            plugins = self.get_plugins()
+
+            # importing the plugins (and everything they depend on) doesn't
+            # need the database, so it's done while the pool connects
+            database.db_pool, _ = await asyncio.gather(
+                timer.measure("create pool", database.create_pool()),
+                asyncio.to_thread(self.import_plugins, plugins),
+            )
+
+            self.http_session = aiohttp.ClientSession()
+
+            self.error_reporter = ErrorReporter(
+                self,
+                paste_backend=create_paste_backend(self.http_session),
+                digest_interval=settings.ERROR_DIGEST_INTERVAL,
+                report_limit=settings.ERROR_REPORT_LIMIT,
+            )
+            self.error_reporter.start()
+
+            if settings.TRACE_EXPORT_FILE is not None:
+                tracing.exporter = tracing.FileSpanExporter(
+                    settings.TRACE_EXPORT_FILE
+                )
+
+            if self.metrics_port is not None:
+                await timer.measure(
+                    "start metrics server",
+                    self.start_metrics_server(self.metrics_port),
+                )
+
+            for plugin in plugins:
+                try:
+                    logger.info("Loading extension %s", plugin)
+
+                    with timer.phase(f"load {plugin}"):
+                        await self.load_extension(plugin)
+
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to load extension %s", plugin)
+
+            if settings.CACHE_INVALIDATION:
+                await timer.measure(
+                    "start invalidation bus", self.start_invalidation_bus()
+                )
+
+            await timer.measure(
+                "prepare hot queries",
+                database.prepare_hot_queries(
+                    database.db_pool,
+                    [
+                        query
+                        for repository in get_repositories()
+                        for query in repository.get_hot_queries()
+                    ],
+                ),
+            )
+
+    @staticmethod
+    def get_plugins() -> List[str]:
+        """
+        Returns the names of the plugin modules of all installed apps which
+        have one.
+        """
+        plugins = []
 
         for app in settings.INSTALLED_APPS:
             try:
-                spec = importlib.util.find_spec(f"{app}.plugin")
+                if importlib.util.find_spec(f"{app}.plugin"):
+                    plugins.append(f"{app}.plugin")
+            except ImportError:
+                logger.exception("Failed to find the plugin of %s", app)
 
-                if spec:
-                    logger.info("Loading extension %s", app)
-                    await self.load_extension(f"{app}.plugin")
+        return plugins
 
+    @staticmethod
+    def import_plugins(plugins: Iterable[str]) -> None:
+        """
+        Imports the given plugin modules, along with their dependencies,
+        so that loading them as extensions afterwards is quicker.
+
+        Meant to be run in a separate thread, as imports block.
+        """
+        for plugin in plugins:
+            try:
+                with startup.timer.phase(f"import {plugin}"):
+                    importlib.import_module(plugin)
             except Exception:  # pylint: disable=broad-except
-                logger.exception("Failed to load extension %s", app)
+                # reported once the plugin gets loaded as an extension
+                pass
+
+    async def before_identify_hook(
+        self, shard_id: Optional[int], *, initial: bool = False
+    ) -> None:
+        if self.cluster is None or shard_id is None:
+            await super().before_identify_hook(shard_id, initial=initial)
+            return
+
+        # the launcher spaces out IDENTIFY calls of all worker processes
+        await self.cluster.wait_for_identify(shard_id)
+
+    async def close(self) -> None:
+        if self.cluster is not None:
+            self.cluster.close()
+
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+
+        if self.invalidation_bus is not None:
+            await self.invalidation_bus.close()
+
+        if self._event_loop_lag_task is not None:
+            self._event_loop_lag_task.cancel()
+
+        if self._cache_usage_task is not None:
+            self._cache_usage_task.cancel()
+
+        if hasattr(self, "error_reporter"):
+            await self.error_reporter.close()
+
+        if hasattr(self, "http_session"):
+            await self.http_session.close()
+
+        if tracing.exporter is not None:
+            await asyncio.to_thread(tracing.exporter.close)
+            tracing.exporter = None
+
+        await super().close()
+
+    async def start_invalidation_bus(self) -> None:
+        """
+        Starts receiving changes made to the database by other processes,
+        dropping the cached data of the repositories they affect.
+        """
+        self.invalidation_bus = InvalidationBus(
+            database.connect, on_resync=self.warm_caches
+        )
+
+        for repository in get_repositories():
+            self.invalidation_bus.subscribe(
+                repository.table_name, repository.apply_invalidation
+            )
+
+        await self.invalidation_bus.start()
+
+    async def warm_caches(self) -> None:
+        """Loads the prefixes of all guilds the bot is in into the cache."""
+        loaded = await GuildRepository().warm_cache(self.guilds)
 
-        for name, cog in self.cogs.items():
-            self.register_command_handlers(name, cog)
+        logger.info("Loaded the prefixes of %d guilds", loaded)
 
-    def register_command_handlers(self, cog_name: str, cog: Cog):
+    async def start_metrics_server(self, port: int) -> None:
+        """
+        Registers the metrics tracked by the bot, and starts serving them
+        to Prometheus on a given port.
+        """
+        self.register_metrics()
+
+        self._event_loop_lag_task = asyncio.create_task(
+            metrics.monitor_event_loop_lag(), name="event-loop-lag"
+        )
+        self._cache_usage_task = asyncio.create_task(
+            memory.monitor_cache_usage(
+                self, settings.MEMORY_ESTIMATE_INTERVAL
+            ),
+            name="cache-usage",
+        )
+
+        self.metrics_server = metrics.MetricsServer(
+            settings.METRICS_HOST, port
+        )
+        await self.metrics_server.start()
+
+    def register_metrics(self) -> None:
+        """
+        Registers metrics whose values are read from the bot's state whenever
+        they are scraped.
+        """
+
+        def collect_caches(
+            value: Callable[[LRUCache], float]
+        ) -> Callable[[], Iterable[metrics.Sample]]:
+            def collect() -> Iterable[metrics.Sample]:
+                return [
+                    ((name,), value(cache))
+                    for name, cache in get_caches().items()
+                ]
+
+            return collect
+
+        def collect_cache_memory() -> Iterable[metrics.Sample]:
+            # measuring the caches takes too long to do on every scrape
+            return [
+                ((usage.name,), usage.size) for usage in memory.cache_usage
+            ]
+
+        def collect_pool_connections() -> Iterable[metrics.Sample]:
+            stats = database.get_pool_stats(database.db_pool)
+            return [(("idle",), stats.idle), (("in_use",), stats.in_use)]
+
+        for metric in (
+            metrics.CallbackMetric(
+                "dangobot_gateway_latency_seconds",
+                "Latency between a gateway HEARTBEAT and its ACK.",
+                ("shard",),
+                lambda: [
+                    ((str(shard_id),), latency)
+                    for shard_id, latency in self.latencies
+                ],
+            ),
+            metrics.CallbackMetric(
+                "dangobot_shard_ready",
+                "Whether a shard is connected and ready.",
+                ("shard",),
+                lambda: [
+                    ((str(shard_id),), float(shard_id in self.ready_shards))
+                    for shard_id in self.shards
+                ],
+            ),
+            metrics.CallbackMetric(
+                "dangobot_cache_hits_total",
+                "Lookups of entries present in a cache.",
+                ("cache",),
+                collect_caches(lambda cache: cache.hits),
+                type="counter",
+            ),
+            metrics.CallbackMetric(
+                "dangobot_cache_misses_total",
+                "Lookups of entries missing from a cache.",
+                ("cache",),
+                collect_caches(lambda cache: cache.misses),
+                type="counter",
+            ),
+            metrics.CallbackMetric(
+                "dangobot_cache_entries",
+                "Entries held in a cache.",
+                ("cache",),
+                collect_caches(len),
+            ),
+            metrics.CallbackMetric(
+                "dangobot_cache_memory_bytes",
+                "Approximate memory used by a cache, estimated from a sample "
+                "of its entries.",
+                ("cache",),
+                collect_cache_memory,
+            ),
+            metrics.CallbackMetric(
+                "process_resident_memory_bytes",
+                "Resident memory size of the process.",
+                (),
+                lambda: (
+                    [((), rss)]
+                    if (rss := memory.get_rss()) is not None
+                    else []
+                ),
+            ),
+            metrics.CallbackMetric(
+                "dangobot_db_pool_connections",
+                "Open database connections in the pool.",
+                ("state",),
+                collect_pool_connections,
+            ),
+            metrics.CallbackMetric(
+                "dangobot_db_pool_acquire_wait_seconds_total",
+                "Time spent waiting for a connection from the pool.",
+                (),
+                lambda: [((), database.acquire_stats.wait_time_total)],
+                type="counter",
+            ),
+        ):
+            metrics.registry.register(metric)
+
+    async def add_cog(
+        self,
+        cog: Cog,
+        /,
+        *,
+        override: bool = False,
+        guild: Optional[Snowflake] = MISSING,
+        guilds: Sequence[Snowflake] = MISSING,
+    ) -> None:
+        await super().add_cog(
+            cog, override=override, guild=guild, guilds=guilds
+        )
+
+        self.build_command_handlers()
+
+    async def remove_cog(
+        self,
+        name: str,
+        /,
+        *,
+        guild: Optional[Snowflake] = MISSING,
+        guilds: Sequence[Snowflake] = MISSING,
+    ) -> Optional[Cog]:
+        cog = await super().remove_cog(name, guild=guild, guilds=guilds)
+
+        self.build_command_handlers()
+
+        return cog
+
+    @staticmethod
+    def find_command_handlers(cog: Cog) -> List[Tuple[int, CommandHandler]]:
         """
         Finds all methods decorated with :func:`command_handler` in the
-        specified `cog`, and registers them with the bot as command handlers.
+        specified `cog`.
 
         Parameters
         ----------
-        cog_name: `str`
-            Name of the cog.
-
         cog: :class:`discord.ext.commands.Cog`
-            The actual cog class.
+            The cog to search.
+
+        Returns
+        --------
+        List[Tuple[`int`, `CommandHandler`]]
+            A list of the handler priorities and bound handler methods.
         """
+        handlers = []
+
         for _, method in inspect.getmembers(cog, inspect.iscoroutinefunction):
             annotations: Optional[dict]
             annotations = getattr(method, "__annotations__", None)
@@ -111,7 +539,26 @@ class DangoBot(commands.Bot):
                 continue
 
             if annotations.get("command_handler", False) is True:
-                self._command_handlers.append((cog_name, method.__name__))
+                priority = annotations.get("command_handler_priority", 0)
+                handlers.append((priority, method))
+
+        return handlers
+
+    def build_command_handlers(self):
+        """
+        Rebuilds the list of command handlers from all currently loaded cogs,
+        ordered by their priority.
+
+        This is called automatically whenever a cog is added or removed.
+        """
+        handlers: List[Tuple[int, CommandHandler]] = []
+
+        for cog in self.cogs.values():
+            handlers.extend(self.find_command_handlers(cog))
+
+        handlers.sort(key=lambda handler: handler[0], reverse=True)
+
+        self._command_handlers = tuple(handler for _, handler in handlers)
 
     # async def post_what_can_i_say_except_delete_this_when_rafal_posts_cringe(
     #     self, ctx: Context
@@ -120,51 +567,134 @@ class DangoBot(commands.Bot):
 
     async def execute_command_handlers(self, ctx: Context) -> bool:
         """
-        Executes all registered command handlers for a given context.
+        Executes the registered command handlers for a given context, until
+        one of them handles the invocation.
 
         Parameters
         ----------
         ctx: :class:`discord.ext.commands.Context`
             The command invocation context.
-        """
-        command_handled = False
 
-        for cog_name, method_name in self._command_handlers:
-            cog = self.get_cog(cog_name)
+        Returns
+        --------
+        `bool`
+            Whether any of the handlers has handled the invocation.
+        """
+        with tracing.span("command_handlers"):
+            for handler in self._command_handlers:
+                with tracing.span(handler.__qualname__):
+                    if await handler(ctx):
+                        return True
+
+        return False
+
+    async def process_commands(self, message, /):
+        if message.author.bot:
+            return
+
+        with log.bind(
+            guild_id=message.guild.id if message.guild is not None else None,
+            channel_id=message.channel.id,
+            user_id=message.author.id,
+            started=time.perf_counter(),
+        ), tracing.trace("message", settings.SLOW_COMMAND_THRESHOLD):
+            # the prefix lookup, the command handlers and the command share
+            # a single unit of work, which ends once they send a response
+            # (see DangoContext.send), or when the invocation is done
+            async with database.unit_of_work(database.db_pool) as scope:
+                ctx = await self.get_context(message)
+                await self.invoke(ctx)
+
+                if scope is not None:
+                    scope.failed = scope.failed or ctx.command_failed
+
+    async def get_context(self, origin, /, *, cls=MISSING):
+        if cls is MISSING:
+            cls = DangoContext
+
+        return await super().get_context(origin, cls=cls)
+
+    async def can_run(self, ctx, /, *, call_once=False):
+        with tracing.span("can_run"):
+            return await super().can_run(ctx, call_once=call_once)
 
-            if cog is None:
-                continue
+    async def invoke(self, ctx, /):
+        start = time.perf_counter()
+        handled_by_custom_handler = False
 
-            method = getattr(cog, method_name, None)
+        name = (
+            ctx.command.qualified_name
+            if ctx.command is not None
+            else ctx.invoked_with
+        )
 
-            if method is None:
-                continue
+        with log.bind(command=name):
+            try:
+                handled_by_custom_handler = (
+                    await self.execute_command_handlers(ctx)
+                )
 
-            command_handled = await method(ctx)
+                if ctx.command is not None:
+                    self.dispatch("command", ctx)
+                    try:
+                        if await self.can_run(ctx, call_once=True):
+                            with tracing.span("invoke"):
+                                await ctx.command.invoke(ctx)
+                        else:
+                            raise errors.CheckFailure(
+                                "The global check once functions failed."
+                            )
+                    except errors.CommandError as exc:
+                        await ctx.command.dispatch_error(ctx, exc)
+                    else:
+                        self.dispatch("command_completion", ctx)
+                elif ctx.invoked_with and handled_by_custom_handler is False:
+                    error = errors.CommandNotFound(
+                        f'Command "{ctx.invoked_with}" is not found'
+                    )
+                    self.dispatch("command_error", ctx, error)
+            finally:
+                labels = self.get_metric_labels(ctx, handled_by_custom_handler)
+
+                if labels is not None:
+                    tracing.record_trace(
+                        name,
+                        cog=labels[0],
+                        command=labels[1],
+                        guild_id=ctx.guild.id if ctx.guild is not None else 0,
+                    )
+                    metrics.command_duration.observe(
+                        time.perf_counter() - start, *labels
+                    )
+                    metrics.commands_total.inc(*labels)
 
-        return command_handled
+                    command_logger.info(
+                        "Handled %s in %.1f ms",
+                        name,
+                        (time.perf_counter() - start) * 1000,
+                    )
 
-    async def invoke(self, ctx, /):
-        handled_by_custom_handler = await self.execute_command_handlers(ctx)
+    @staticmethod
+    def get_metric_labels(
+        ctx: Context, handled_by_custom_handler: bool
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Returns the cog and command labels under which an invocation is
+        recorded in the metrics, or `None` if no command was invoked.
 
+        Invocations handled by command handlers are grouped under a single
+        label, as their triggers aren't known in advance.
+        """
         if ctx.command is not None:
-            self.dispatch("command", ctx)
-            try:
-                if await self.can_run(ctx, call_once=True):
-                    await ctx.command.invoke(ctx)
-                else:
-                    raise errors.CheckFailure(
-                        "The global check once functions failed."
-                    )
-            except errors.CommandError as exc:
-                await ctx.command.dispatch_error(ctx, exc)
-            else:
-                self.dispatch("command_completion", ctx)
-        elif ctx.invoked_with and handled_by_custom_handler is False:
-            error = errors.CommandNotFound(
-                f'Command "{ctx.invoked_with}" is not found'
+            return (
+                ctx.cog.qualified_name if ctx.cog is not None else "",
+                ctx.command.qualified_name,
             )
-            self.dispatch("command_error", ctx, error)
+
+        if handled_by_custom_handler:
+            return ("custom", "custom")
+
+        return None
 
     async def get_command_prefix(
         self, bot, message
@@ -176,15 +706,59 @@ class DangoBot(commands.Bot):
         if message.guild is None:
             return settings.COMMAND_PREFIX
 
-        return await GuildRepository().get_command_prefix(guild=message.guild)
+        with tracing.span("get_prefix"):
+            return await GuildRepository().get_command_prefix(
+                guild=message.guild
+            )
 
     async def on_ready(self):  # pylint: disable=missing-function-docstring
-        logger.info("Logged in as %s", self.user)
+        logger.info(
+            "Logged in as %s, %d shards are ready",
+            self.user,
+            len(self.shards),
+        )
+
+        # on_ready is dispatched again after reconnecting, only the first one
+        # concludes the startup
+        if self.startup_report:
+            startup.timer.mark("ready")
+            logger.info("Startup report:\n%s", startup.timer.format_report())
+            self.startup_report = False
+
+    async def on_shard_ready(
+        self, shard_id: int
+    ):  # pylint: disable=missing-function-docstring
+        self.ready_shards.add(shard_id)
+
+        guilds = [guild for guild in self.guilds if guild.shard_id == shard_id]
+        cached = await GuildRepository().sync_from_gateway(guilds)
+
+        logger.info(
+            "Shard %d is ready, loaded settings of %d guilds into the cache",
+            shard_id,
+            cached,
+        )
+
+    async def on_shard_resumed(
+        self, shard_id: int
+    ):  # pylint: disable=missing-function-docstring
+        self.ready_shards.add(shard_id)
+
+    async def on_shard_disconnect(
+        self, shard_id: int
+    ):  # pylint: disable=missing-function-docstring
+        self.ready_shards.discard(shard_id)
 
     async def on_guild_join(
         self, guild
     ):  # pylint: disable=missing-function-docstring
-        await GuildRepository().create_from_gateway_response(guild)
+        await GuildRepository().upsert_from_gateway_response(guild)
+
+    async def on_guild_remove(
+        self, guild: Guild
+    ):  # pylint: disable=missing-function-docstring
+        for repository in get_repositories():
+            repository.evict_guild(guild.id)
 
     async def on_guild_update(
         self, before: Guild, after: Guild
@@ -192,14 +766,15 @@ class DangoBot(commands.Bot):
         if before.name == after.name:
             return  # we're only tracking guild names for now
 
-        guild = await GuildRepository().find_by_id(after.id)
-
-        if guild:
-            await GuildRepository().update_from_gateway_response(after)
-        else:
-            await GuildRepository().create_from_gateway_response(after)
+        await GuildRepository().upsert_from_gateway_response(after)
 
     async def on_command_error(self, context, exception, /):
+        cog, command = self.get_metric_labels(context, False) or ("", "")
+        original = getattr(exception, "original", exception)
+        metrics.command_errors_total.inc(
+            cog, command, original.__class__.__name__
+        )
+
         if isinstance(exception, errors.CommandInvokeError):
             await context.send(
                 embed=ErrorEmbedFormatter().format(
@@ -219,12 +794,7 @@ class DangoBot(commands.Bot):
                     )
                     return
 
-                owner = await self.fetch_user(settings.OWNER_ID)
-                dm_channel = owner.dm_channel or await owner.create_dm()
-
-                embed = await self.format_traceback(exc)
-
-                await dm_channel.send(embed=embed)
+                self.error_reporter.report(exc)
         elif isinstance(exception, errors.MissingPermissions):
             await context.send(
                 content="You don't have the permissions to do this!"
@@ -241,48 +811,3 @@ class DangoBot(commands.Bot):
             await context.send(
                 embed=ErrorEmbedFormatter().format(description=exception)
             )
-
-    async def format_traceback(self, exception):
-        """
-        Format a traceback ready to be posted as a
-        Discord embed given an exception.
-        """
-        trace = traceback.format_exception(
-            exception.__class__, exception, exception.__traceback__
-        )
-        trace_orig = "".join(trace)
-
-        length = len(trace_orig)
-
-        # remove oldest traces until we're under the embed length cap,
-        # which is 1000, minus 6 characters for codeblock start and end,
-        # 4 for a 3 character ellipsis (...) and a newline character
-        while length > 990:
-            element_length = len(trace[1])
-            del trace[1]
-            length -= element_length
-
-        if len(trace_orig) > 990:
-            trace.insert(1, "...\n")
-
-        trace = "".join(trace)
-
-        # upload full, unedited traceback to a pastebin
-        async with self.http_session.post(
-            "http://dpaste.com/api/v2/",
-            data={"expiry_days": 21, "syntax": "pytb", "content": trace_orig},
-        ) as resp:
-            trace_url = await resp.text()
-
-        return (
-            ErrorEmbedFormatter()
-            .format(title="An error has occured!")
-            .add_field(
-                name=exception.__class__.__module__
-                + "."
-                + exception.__class__.__qualname__,
-                value=f"```{trace}```",
-                inline=False,
-            )
-            .add_field(name="Full traceback:", value=trace_url)
-        )
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple, TypeVar
+
+_KT = TypeVar("_KT", bound=Hashable)
+_VT = TypeVar("_VT")
+_T = TypeVar("_T")
+
+
+class LRUCache(OrderedDict[_KT, _VT]):
+    """
+    A dictionary that optionally holds at most `maxsize` entries, evicting
+    the least recently used ones once that limit is reached.
+
+    Lookups done with ``[]`` and :meth:`get` count as a use of the entry,
+    and are tracked in the :attr:`hits` and :attr:`misses` counters.
+
+    Attributes
+    ----------
+    maxsize: Optional[`int`]
+        The maximum amount of entries, or `None` if the cache is unbounded.
+    """
+
+    maxsize: Optional[int]
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: Optional[int] = None) -> None:
+        super().__init__()
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    def __getitem__(self, key: _KT) -> _VT:
+        try:
+            value = super().__getitem__(key)
+        except KeyError:
+            self.misses += 1
+            raise
+
+        self.hits += 1
+        self.move_to_end(key)
+
+        return value
+
+    def __setitem__(self, key: _KT, value: _VT) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+
+        if self.maxsize is not None and len(self) > self.maxsize:
+            self.popitem(last=False)
+
+    def get(
+        self, key: _KT, default: Optional[_T] = None
+    ) -> Optional[_VT | _T]:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class SizedLRUCache(LRUCache[_KT, bytes]):
+    """
+    An :class:`LRUCache` of byte strings, holding at most `maxsize` bytes
+    in total, rather than `maxsize` entries.
+
+    Attributes
+    ----------
+    maxsize: Optional[`int`]
+        The maximum total length of the cached values, or `None` if the cache
+        is unbounded.
+    currsize: `int`
+        The total length of the cached values.
+    """
+
+    currsize: int
+
+    def __init__(self, maxsize: Optional[int] = None) -> None:
+        super().__init__(maxsize)
+
+        self.currsize = 0
+
+    def __setitem__(self, key: _KT, value: bytes) -> None:
+        if key in self:
+            del self[key]
+
+        # bypasses LRUCache, which limits the amount of entries
+        OrderedDict.__setitem__(self, key, value)
+        self.currsize += len(value)
+
+        while self.maxsize is not None and self.currsize > self.maxsize:
+            self.popitem(last=False)
+
+    def __delitem__(self, key: _KT) -> None:
+        self.currsize -= len(OrderedDict.__getitem__(self, key))
+        super().__delitem__(key)
+
+    def pop(self, key, *args):
+        if key in self:
+            self.currsize -= len(OrderedDict.__getitem__(self, key))
+
+        return super().pop(key, *args)
+
+    def popitem(self, last: bool = True) -> Tuple[_KT, bytes]:
+        key, value = super().popitem(last)
+        self.currsize -= len(value)
+
+        return key, value
+
+    def clear(self) -> None:
+        super().clear()
+        self.currsize = 0
@@ -0,0 +1,607 @@
+import asyncio
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+
+if TYPE_CHECKING:
+    from .bot import DangoBot
+
+logger = logging.getLogger(__name__)
+
+# the minimum delay between IDENTIFY calls in a single rate limit bucket
+IDENTIFY_INTERVAL = 5.0
+
+# workers running shorter than this are considered to have crashed on
+# startup, and are restarted with an increasing delay
+MIN_UPTIME = 60.0
+MAX_RESTART_DELAY = 60.0
+
+HEALTH_INTERVAL = 15.0
+SUMMARY_INTERVAL = 60.0
+
+# how long the workers are given to close their connections on shutdown
+SHUTDOWN_TIMEOUT = 30.0
+
+# the longest line read from the pipes between the launcher and the workers,
+# such as a log record with a long traceback, longer ones are skipped
+MAX_LINE_LENGTH = 16 * 1024 * 1024
+
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    """
+    Splits shards into contiguous ranges of (nearly) the same size, one for
+    each of at most `processes` processes.
+    """
+    processes = max(min(processes, shard_count), 1)
+    size, remainder = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+
+    for index in range(processes):
+        end = start + size + (1 if index < remainder else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return ranges
+
+
+def format_shard_ids(shard_ids: Sequence[int]) -> str:
+    """
+    Formats a contiguous range of shard IDs, as accepted by
+    :func:`~dangobot.core.helpers.parse_shard_ids`.
+    """
+    if len(shard_ids) == 1:
+        return str(shard_ids[0])
+
+    return f"{shard_ids[0]}-{shard_ids[-1]}"
+
+
+async def fetch_gateway_info(token: str) -> Tuple[int, int]:
+    """
+    Fetches the amount of shards recommended by Discord, along with the
+    amount of shards which can IDENTIFY at the same time.
+    """
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {token}"},
+            raise_for_status=True,
+        ) as resp:
+            data = await resp.json()
+
+    return data["shards"], data["session_start_limit"]["max_concurrency"]
+
+
+async def read_line(stream: asyncio.StreamReader) -> Optional[bytes]:
+    """
+    Reads a line from a stream, returning an empty bytes object once the
+    stream ends, or `None` if the line was longer than the stream's limit,
+    in which case it's skipped.
+    """
+    try:
+        return await stream.readuntil(b"\n")
+    except asyncio.IncompleteReadError as exc:
+        return exc.partial
+    except asyncio.LimitOverrunError as exc:
+        consumed = exc.consumed
+
+    # drops the line in parts no longer than the limit, until its end
+    while True:
+        await stream.readexactly(consumed)
+
+        try:
+            await stream.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as exc:
+            consumed = exc.consumed
+
+
+class WorkerChannel:
+    """
+    The worker process side of the connection to the cluster launcher.
+
+    Messages are exchanged as JSON objects, one per line, which the worker
+    writes to its standard output, and reads from its standard input.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._identify_grants: Dict[int, asyncio.Future] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """Sends a message to the launcher. Can be called from any thread."""
+        line = json.dumps(message, separators=(",", ":")) + "\n"
+
+        with self._lock:
+            try:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            except (BrokenPipeError, ValueError):
+                pass  # the launcher is gone, we'll shut down shortly
+
+    async def start(self, bot: "DangoBot") -> None:
+        """
+        Starts reading messages from the launcher, and reporting the health
+        of the bot's shards to it.
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_LINE_LENGTH)
+
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+        )
+
+        self._tasks = [
+            asyncio.create_task(self._read(reader, bot), name="cluster-read"),
+            asyncio.create_task(
+                self._report_health(bot), name="cluster-health"
+            ),
+        ]
+
+    def close(self) -> None:
+        """Stops communicating with the launcher."""
+        for task in self._tasks:
+            # the reader closes the bot itself once the launcher is gone
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    async def wait_for_identify(self, shard_id: int) -> None:
+        """Waits until the launcher allows a given shard to IDENTIFY."""
+        future = asyncio.get_running_loop().create_future()
+        self._identify_grants[shard_id] = future
+
+        self.send({"type": "identify", "shard_id": shard_id})
+
+        try:
+            await future
+        finally:
+            self._identify_grants.pop(shard_id, None)
+
+    async def _read(self, reader: asyncio.StreamReader, bot: "DangoBot"):
+        while (line := await read_line(reader)) != b"":
+            if line is None:
+                logger.warning("Skipped a too long message from the launcher")
+                continue
+
+            try:
+                self._handle_message(json.loads(line))
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(
+                    "Invalid message from the launcher: %r",
+                    line,
+                    exc_info=True,
+                )
+
+        logger.error("Lost the connection to the cluster launcher")
+        await bot.close()
+
+    def _handle_message(self, message: Dict[str, Any]) -> None:
+        if message.get("type") == "identify":
+            future = self._identify_grants.get(message["shard_id"])
+
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    async def _report_health(self, bot: "DangoBot") -> None:
+        while True:
+            latencies = dict(bot.latencies)
+
+            self.send(
+                {
+                    "type": "health",
+                    "shards": {
+                        str(shard_id): {
+                            "ready": shard_id in bot.ready_shards,
+                            "latency": latencies.get(shard_id),
+                        }
+                        for shard_id in bot.shard_ids or ()
+                    },
+                    "guilds": len(bot.guilds),
+                }
+            )
+
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+
+class ClusterLogHandler(logging.Handler):
+    """Forwards log records of a worker process to the cluster launcher."""
+
+    def __init__(self, channel: WorkerChannel) -> None:
+        super().__init__()
+        self.channel = channel
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            exc_text = record.exc_text
+
+            if record.exc_info and not exc_text:
+                exc_text = logging.Formatter().formatException(record.exc_info)
+
+            self.channel.send(
+                {
+                    "type": "log",
+                    "name": record.name,
+                    "levelno": record.levelno,
+                    "msg": record.getMessage(),
+                    "exc_text": exc_text,
+                    "created": record.created,
+                    "context": getattr(record, "context", None),
+                }
+            )
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+
+@dataclass
+class Worker:  # pylint: disable=too-many-instance-attributes
+    """A worker process of the cluster, connecting a range of shards."""
+
+    index: int
+    shard_ids: List[int]
+    command: List[str]
+    process: Optional[asyncio.subprocess.Process] = None
+    started: float = 0.0
+    restarts: int = 0
+    failures: int = 0
+    health: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        """The name of the worker used in logs."""
+        return f"shards {format_shard_ids(self.shard_ids)}"
+
+    @property
+    def running(self) -> bool:
+        """Whether the worker's process is running."""
+        return self.process is not None and self.process.returncode is None
+
+
+class ClusterLauncher:
+    """
+    Runs the bot in multiple worker processes, each connecting a contiguous
+    range of shards.
+
+    The launcher restarts workers which exit, coordinates their IDENTIFY
+    calls so that they stay within the gateway's rate limits, and collects
+    their logs and health reports.
+
+    Parameters
+    -----------
+    command: List[`str`]
+        The command starting a worker process, to which the shard options
+        are appended.
+    shard_count: `int`
+        The total amount of shards.
+    processes: `int`
+        The amount of worker processes.
+    max_concurrency: `int`
+        The amount of shards allowed to IDENTIFY at the same time.
+    metrics_port: Optional[`int`]
+        The metrics port of the first worker, incremented for every next one.
+    """
+
+    def __init__(
+        self,
+        command: List[str],
+        shard_count: int,
+        processes: int,
+        max_concurrency: int = 1,
+        metrics_port: Optional[int] = None,
+    ) -> None:
+        self.shard_count = shard_count
+        self.max_concurrency = max(max_concurrency, 1)
+        self.workers: List[Worker] = []
+
+        for index, shard_ids in enumerate(
+            split_shards(shard_count, processes)
+        ):
+            worker_command = command + [
+                "--cluster-worker",
+                "--shard-count",
+                str(shard_count),
+                "--shard-ids",
+                format_shard_ids(shard_ids),
+            ]
+
+            if metrics_port is not None:
+                worker_command += ["--metrics-port", str(metrics_port + index)]
+
+            self.workers.append(Worker(index, shard_ids, worker_command))
+
+        self._next_identify: Dict[int, float] = {}
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        """Runs the workers until the launcher receives a stop signal."""
+        loop = asyncio.get_running_loop()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        logger.info(
+            "Starting %d workers for %d shards",
+            len(self.workers),
+            self.shard_count,
+        )
+
+        tasks = [
+            asyncio.create_task(self._supervise(worker))
+            for worker in self.workers
+        ]
+        summary = asyncio.create_task(self._log_summaries())
+
+        await self._stopping.wait()
+
+        logger.info("Stopping the workers")
+        summary.cancel()
+
+        await self._stop_workers()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _supervise(self, worker: Worker) -> None:
+        while not self._stopping.is_set():
+            try:
+                returncode = await self._run_worker(worker)
+            except Exception:  # pylint: disable=broad-except
+                # the worker can't be left running, as nothing would read
+                # its output anymore, and it would block on a full pipe
+                logger.exception(
+                    "Failed to supervise worker %d (%s)",
+                    worker.index,
+                    worker.label,
+                )
+                returncode = await self._kill_worker(worker)
+
+            if self._stopping.is_set():
+                break
+
+            if time.monotonic() - worker.started < MIN_UPTIME:
+                worker.failures += 1
+            else:
+                worker.failures = 0
+
+            worker.restarts += 1
+            delay = min(2 ** (worker.failures - 1), MAX_RESTART_DELAY)
+
+            logger.error(
+                "Worker %d (%s) exited with code %s, restarting in %.0fs",
+                worker.index,
+                worker.label,
+                returncode,
+                delay if worker.failures else 0,
+            )
+
+            if worker.failures:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _run_worker(self, worker: Worker) -> int:
+        """Starts a worker process, returning its exit code once it exits."""
+        worker.started = time.monotonic()
+        worker.health = {}
+        worker.process = await asyncio.create_subprocess_exec(
+            *worker.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=MAX_LINE_LENGTH,
+        )
+
+        logger.info(
+            "Started worker %d (%s), pid %d",
+            worker.index,
+            worker.label,
+            worker.process.pid,
+        )
+
+        await asyncio.gather(
+            self._read_messages(worker, worker.process),
+            self._read_output(worker, worker.process),
+        )
+
+        return await worker.process.wait()
+
+    @staticmethod
+    async def _kill_worker(worker: Worker) -> Optional[int]:
+        """Kills a worker process, if it's running."""
+        if worker.process is None:
+            return None
+
+        if worker.running:
+            worker.process.kill()
+
+        return await worker.process.wait()
+
+    async def _read_messages(
+        self, worker: Worker, process: asyncio.subprocess.Process
+    ) -> None:
+        assert process.stdout is not None
+
+        while (line := await read_line(process.stdout)) != b"":
+            if line is None:
+                logger.warning(
+                    "[%s] Skipped a message longer than %d bytes",
+                    worker.label,
+                    MAX_LINE_LENGTH,
+                )
+                continue
+
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                message = None
+
+            if not isinstance(message, dict):
+                # something has written to stdout directly
+                logger.info(
+                    "[%s] %s",
+                    worker.label,
+                    line.decode(errors="replace").rstrip(),
+                )
+                continue
+
+            try:
+                self._handle_message(worker, process, message)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception(
+                    "[%s] Failed to handle message %r", worker.label, message
+                )
+
+    def _handle_message(
+        self,
+        worker: Worker,
+        process: asyncio.subprocess.Process,
+        message: Dict[str, Any],
+    ) -> None:
+        kind = message.get("type")
+
+        if kind == "log":
+            self._log_record(worker, message)
+        elif kind == "health":
+            worker.health = message
+            worker.health["updated"] = time.monotonic()
+        elif kind == "identify":
+            asyncio.create_task(
+                self._grant_identify(process, message["shard_id"])
+            )
+
+    async def _read_output(
+        self, worker: Worker, process: asyncio.subprocess.Process
+    ) -> None:
+        assert process.stderr is not None
+
+        # anything written to stderr, such as a crash before logging is set up
+        while (line := await read_line(process.stderr)) != b"":
+            if line is None:
+                logger.warning(
+                    "[%s] Skipped an output line longer than %d bytes",
+                    worker.label,
+                    MAX_LINE_LENGTH,
+                )
+                continue
+
+            logger.warning(
+                "[%s] %s", worker.label, line.decode(errors="replace").rstrip()
+            )
+
+    @staticmethod
+    def _log_record(worker: Worker, message: Dict[str, Any]) -> None:
+        record = logging.makeLogRecord(
+            {
+                "name": message["name"],
+                "levelno": message["levelno"],
+                "levelname": logging.getLevelName(message["levelno"]),
+                "msg": f"[{worker.label}] {message['msg']}",
+                "exc_text": message.get("exc_text"),
+                "created": message["created"],
+                "context": {
+                    **(message.get("context") or {}),
+                    "worker": worker.index,
+                },
+                # the worker has applied LOG_SAMPLE_RATES already
+                "sampled": True,
+            }
+        )
+
+        logging.getLogger(record.name).handle(record)
+
+    async def _grant_identify(
+        self, process: asyncio.subprocess.Process, shard_id: int
+    ) -> None:
+        # shards share a rate limit bucket with the shards whose IDs give the
+        # same remainder when divided by max_concurrency
+        bucket = shard_id % self.max_concurrency
+        now = time.monotonic()
+        allowed_at = max(now, self._next_identify.get(bucket, now))
+        self._next_identify[bucket] = allowed_at + IDENTIFY_INTERVAL
+
+        await asyncio.sleep(allowed_at - now)
+
+        if process.returncode is not None or process.stdin is None:
+            return
+
+        try:
+            process.stdin.write(
+                json.dumps({"type": "identify", "shard_id": shard_id}).encode()
+                + b"\n"
+            )
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    async def _log_summaries(self) -> None:
+        while True:
+            await asyncio.sleep(SUMMARY_INTERVAL)
+            self.log_summary()
+
+    def log_summary(self) -> None:
+        """Logs the aggregated health of all workers."""
+        running = ready = guilds = 0
+        latencies = []
+        stale = []
+
+        for worker in self.workers:
+            if not worker.running:
+                continue
+
+            running += 1
+
+            updated = worker.health.get("updated", worker.started)
+            if time.monotonic() - updated > HEALTH_INTERVAL * 3:
+                stale.append(worker.label)
+
+            for shard in worker.health.get("shards", {}).values():
+                ready += shard["ready"]
+
+                if shard["latency"] is not None:
+                    latencies.append(shard["latency"])
+
+            guilds += worker.health.get("guilds", 0)
+
+        logger.info(
+            "%d/%d workers running, %d/%d shards ready, %d guilds, "
+            "max latency %.0f ms, %d restarts",
+            running,
+            len(self.workers),
+            ready,
+            self.shard_count,
+            guilds,
+            max(latencies, default=0.0) * 1000,
+            sum(worker.restarts for worker in self.workers),
+        )
+
+        if stale:
+            logger.warning(
+                "No health reports received recently from: %s",
+                ", ".join(stale),
+            )
+
+    async def _stop_workers(self) -> None:
+        running = [worker.process for worker in self.workers if worker.running]
+
+        for process in running:
+            assert process is not None
+            # lets the bot close its connections, like Ctrl+C would
+            process.send_signal(signal.SIGINT)
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(process.wait() for process in running)),
+                SHUTDOWN_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            for process in running:
+                if process.returncode is None:
+                    process.kill()
@@ -0,0 +1,15 @@
+from discord.ext import commands
+
+from .. import database, tracing
+
+
+class DangoContext(commands.Context):
+    """The context in which commands are invoked by the bot."""
+
+    async def send(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        # the database work of the invocation is done by the time it
+        # responds, so the connection isn't held while waiting on Discord
+        await database.release_scope(failed=self.command_failed)
+
+        with tracing.span("send"):
+            return await super().send(*args, **kwargs)
@@ -1,3 +1,517 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from django.conf import settings
+from django.db import connection
+
 import asyncpg
+from asyncpg.connection import Connection
+from asyncpg.transaction import Transaction
+
+from . import metrics, tracing
+
+logger = logging.getLogger(__name__)
 
 db_pool: asyncpg.Pool
+
+# queries prepared on every new connection, registered through
+# :func:`prepare_hot_queries`
+hot_queries: Set[str] = set()
+
+
+@dataclass
+class AcquireStats:
+    """Statistics of connection acquisitions from the pool."""
+
+    acquired: int = 0
+    waiting: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+
+
+@dataclass
+class PoolStats:  # pylint: disable=too-many-instance-attributes
+    """A snapshot of the connection pool state."""
+
+    min_size: int
+    max_size: int
+    size: int
+    idle: int
+    in_use: int
+    acquired: int
+    waiting: int
+    wait_time_avg: float
+    wait_time_max: float
+
+
+acquire_stats = AcquireStats()
+
+
+def _get_connect_kwargs() -> Dict[str, Any]:
+    server_settings = {"application_name": settings.DATABASE_APPLICATION_NAME}
+
+    if settings.DATABASE_STATEMENT_TIMEOUT is not None:
+        server_settings["statement_timeout"] = str(
+            settings.DATABASE_STATEMENT_TIMEOUT
+        )
+
+    return {
+        "database": connection.settings_dict["NAME"],
+        "user": connection.settings_dict["USER"],
+        "password": connection.settings_dict["PASSWORD"],
+        "host": connection.settings_dict["HOST"],
+        "port": connection.settings_dict["PORT"],
+        "statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+        "command_timeout": settings.DATABASE_COMMAND_TIMEOUT,
+        "server_settings": server_settings,
+    }
+
+
+async def create_pool() -> asyncpg.Pool:
+    """
+    Creates a connection pool configured by the ``DATABASE_*`` settings.
+
+    The pool opens ``DATABASE_POOL_MIN_SIZE`` connections before returning.
+    """
+    pool = await asyncpg.create_pool(
+        min_size=settings.DATABASE_POOL_MIN_SIZE,
+        max_size=settings.DATABASE_POOL_MAX_SIZE,
+        max_queries=settings.DATABASE_POOL_MAX_QUERIES,
+        max_inactive_connection_lifetime=(
+            settings.DATABASE_POOL_MAX_INACTIVE_CONNECTION_LIFETIME
+        ),
+        init=_init_connection,
+        **_get_connect_kwargs(),
+    )
+
+    assert pool is not None
+
+    return pool
+
+
+async def connect() -> Connection:
+    """
+    Opens a single connection outside of the pool, configured the same way
+    as the pooled ones, for uses that hold it for a long time.
+    """
+    return await asyncpg.connect(**_get_connect_kwargs())
+
+
+async def _init_connection(conn: Connection) -> None:
+    for query in hot_queries:
+        await _prepare(conn, query)
+
+
+async def _prepare(conn: Connection, query: str) -> None:
+    """Puts a query into the statement cache of a given connection."""
+    try:
+        # asyncpg has no public API for populating the statement cache,
+        # :meth:`Connection.prepare` bypasses it
+        await conn._get_statement(  # pylint: disable=protected-access
+            query, None
+        )
+    except asyncpg.PostgresError:
+        logger.warning("Failed to prepare query %s", query, exc_info=True)
+
+
+async def prepare_hot_queries(pool: asyncpg.Pool, queries: Iterable[str]):
+    """
+    Registers queries that will be prepared on every new connection, and
+    prepares them on the connections already opened by the pool.
+    """
+    hot_queries.update(queries)
+
+    async def prepare_connection(conn: Connection) -> None:
+        for query in hot_queries:
+            await _prepare(conn, query)
+
+    connections = [await pool.acquire() for _ in range(pool.get_idle_size())]
+
+    try:
+        await asyncio.gather(*map(prepare_connection, connections))
+    finally:
+        for conn in connections:
+            await pool.release(conn)
+
+
+async def _acquire_from_pool(pool: asyncpg.Pool) -> Connection:
+    """
+    Acquires a connection from a given pool, recording the time spent waiting
+    for it in :data:`acquire_stats`.
+    """
+    stats = acquire_stats
+    stats.waiting += 1
+    start = time.perf_counter()
+
+    try:
+        conn = await pool.acquire()
+    finally:
+        stats.waiting -= 1
+
+    wait_time = time.perf_counter() - start
+
+    stats.acquired += 1
+    stats.wait_time_total += wait_time
+    stats.wait_time_max = max(stats.wait_time_max, wait_time)
+
+    return conn
+
+
+class ConnectionScope:
+    """
+    A single connection shared by all repository queries made by the task
+    which opened the scope, optionally wrapped in a transaction.
+
+    The connection is only acquired once the first query is made, and is
+    released when the scope is closed, or earlier with :meth:`release`,
+    in which case the following queries acquire a new one.
+
+    The scope is marked as failed when any of its queries raises, as the
+    transaction can't be committed anymore then.
+    """
+
+    __slots__ = (
+        "pool",
+        "use_transaction",
+        "task",
+        "connection",
+        "transaction",
+        "failed",
+        "closed",
+        "commit_callbacks",
+        "rollback_callbacks",
+    )
+
+    pool: asyncpg.Pool
+    use_transaction: bool
+    task: Optional[asyncio.Task]
+    connection: Optional[Connection]
+    transaction: Optional[Transaction]
+    failed: bool
+    closed: bool
+    commit_callbacks: List[Callable[[], None]]
+    rollback_callbacks: List[Callable[[], None]]
+
+    def __init__(self, pool: asyncpg.Pool, use_transaction: bool) -> None:
+        self.pool = pool
+        self.use_transaction = use_transaction
+        self.task = asyncio.current_task()
+        self.connection = None
+        self.transaction = None
+        self.failed = False
+        self.closed = False
+        self.commit_callbacks = []
+        self.rollback_callbacks = []
+
+    def is_usable(self) -> bool:
+        """
+        Checks whether the scope's connection can be used by the current task.
+
+        Other tasks (such as event listeners dispatched from within the
+        scope, which inherit its context) get their own connections, as
+        a connection can't run multiple queries concurrently.
+        """
+        return not self.closed and self.task is asyncio.current_task()
+
+    async def get_connection(self) -> Connection:
+        """Returns the scope's connection, acquiring it on first use."""
+        if self.connection is None:
+            self.connection = await _acquire_from_pool(self.pool)
+
+            if self.use_transaction:
+                self.transaction = self.connection.transaction()
+                await self.transaction.start()
+
+        return self.connection
+
+    async def release(self) -> None:
+        """
+        Releases the scope's connection, if it has acquired one, committing
+        the transaction, or rolling it back if the scope was marked as
+        failed.
+        """
+        commit_callbacks, self.commit_callbacks = self.commit_callbacks, []
+        rollback_callbacks, self.rollback_callbacks = (
+            self.rollback_callbacks,
+            [],
+        )
+
+        if self.connection is None:
+            # there's no transaction to end, but the callbacks registered
+            # for it still expect to learn its outcome
+            callbacks = rollback_callbacks if self.failed else commit_callbacks
+
+            for callback in callbacks:
+                callback()
+
+            self.failed = False
+            return
+
+        try:
+            if self.transaction is not None:
+                if self.failed:
+                    await self.transaction.rollback()
+
+                    for callback in rollback_callbacks:
+                        callback()
+                else:
+                    await self.transaction.commit()
+
+                    for callback in commit_callbacks:
+                        callback()
+        finally:
+            await self.pool.release(self.connection)
+            self.connection = None
+            self.transaction = None
+            self.failed = False
+
+    async def close(self) -> None:
+        """Releases the scope's connection, see :meth:`release`."""
+        self.closed = True
+
+        await self.release()
+
+
+current_scope: ContextVar[Optional[ConnectionScope]] = ContextVar(
+    "current_scope", default=None
+)
+
+
+@asynccontextmanager
+async def connection_scope(
+    pool: asyncpg.Pool, use_transaction: bool = False
+) -> AsyncIterator[ConnectionScope]:
+    """
+    Opens a :class:`ConnectionScope`, which will be used by all repository
+    queries made by the current task until the ``async with`` block exits.
+
+    The scope is marked as failed (rolling back the transaction, if any)
+    when the block raises an exception. If a scope is already open in the
+    current task, it is reused instead.
+    """
+    scope = current_scope.get()
+
+    if scope is not None and scope.is_usable():
+        yield scope
+        return
+
+    scope = ConnectionScope(pool, use_transaction)
+    token = current_scope.set(scope)
+
+    try:
+        yield scope
+    except BaseException:
+        scope.failed = True
+        raise
+    finally:
+        current_scope.reset(token)
+        await scope.close()
+
+
+def unit_of_work(
+    pool: asyncpg.Pool,
+) -> AsyncContextManager[Optional[ConnectionScope]]:
+    """
+    Opens a :class:`ConnectionScope` on a given pool, configured by the
+    ``DATABASE_UNIT_OF_WORK`` setting, or does nothing if it's set to
+    ``"none"``.
+
+    The scope holds a pooled connection (and, possibly, a transaction)
+    until the block exits, or until :func:`release_scope` is called before
+    waiting on anything other than the database.
+    """
+    if settings.DATABASE_UNIT_OF_WORK == "none":
+        return nullcontext()
+
+    return connection_scope(
+        pool,
+        use_transaction=settings.DATABASE_UNIT_OF_WORK == "transaction",
+    )
+
+
+async def release_scope(failed: bool = False) -> None:
+    """
+    Ends the unit of work of the current task's :class:`ConnectionScope`,
+    if any, committing it (or rolling it back if `failed` is set, or any of
+    its queries raised) and returning its connection to the pool, before
+    waiting on Discord or other network I/O.
+
+    The repository queries made afterwards acquire a new connection.
+    """
+    scope = current_scope.get()
+
+    if scope is not None and scope.is_usable():
+        scope.failed = scope.failed or failed
+        await scope.release()
+
+
+@contextmanager
+def outside_scope() -> Iterator[None]:
+    """
+    Makes the repository queries made in the ``with`` block acquire their
+    own connections, instead of using the current task's
+    :class:`ConnectionScope`, so that they're committed regardless of
+    the outcome of its transaction.
+    """
+    token = current_scope.set(None)
+
+    try:
+        yield
+    finally:
+        current_scope.reset(token)
+
+
+def call_on_commit(callback: Callable[[], None]) -> None:
+    """
+    Registers a callback to be called once the transaction of the current
+    task's :class:`ConnectionScope` gets committed, for instance in order
+    to cache data written in it, which other tasks mustn't see before that.
+
+    The callback is called right away if there is no such transaction.
+    """
+    scope = current_scope.get()
+
+    if scope is not None and scope.is_usable() and scope.use_transaction:
+        scope.commit_callbacks.append(callback)
+    else:
+        callback()
+
+
+def call_on_rollback(callback: Callable[[], None]) -> None:
+    """
+    Registers a callback to be called if the transaction of the current
+    task's :class:`ConnectionScope` gets rolled back, for instance in order
+    to invalidate cached data written in it.
+
+    Does nothing if there is no such transaction.
+    """
+    scope = current_scope.get()
+
+    if scope is not None and scope.is_usable() and scope.use_transaction:
+        scope.rollback_callbacks.append(callback)
+
+
+class PoolConnectionContext:
+    """
+    Acquires a connection for the duration of an ``async with`` block,
+    recording the time spent waiting for it in :data:`acquire_stats`.
+
+    If the current task has opened a :class:`ConnectionScope`, its connection
+    is used instead.
+
+    When `labels` are given, the time spent in the block is recorded in the
+    query duration metrics. The block, along with waiting for the connection,
+    is also timed as a span of the current trace.
+    """
+
+    __slots__ = ("pool", "labels", "connection", "scope", "start", "span")
+
+    pool: asyncpg.Pool
+    labels: Optional[Tuple[str, str]]
+    connection: Optional[Connection]
+    scope: Optional[ConnectionScope]
+    start: float
+    span: Optional[tracing.Span]
+
+    def __init__(
+        self, pool: asyncpg.Pool, labels: Optional[Tuple[str, str]] = None
+    ) -> None:
+        self.pool = pool
+        self.labels = labels
+        self.connection = None
+        self.scope = None
+        self.start = 0.0
+        self.span = None
+
+    async def __aenter__(self) -> Connection:
+        self.span = tracing.start_span(
+            "db " + ".".join(self.labels) if self.labels else "db"
+        )
+        scope = current_scope.get()
+
+        try:
+            if scope is not None and scope.is_usable():
+                conn = await scope.get_connection()
+                self.scope = scope
+            else:
+                conn = self.connection = await _acquire_from_pool(self.pool)
+        except BaseException:
+            tracing.end_span(self.span)
+            raise
+
+        self.start = time.perf_counter()
+
+        if self.span is not None:
+            self.span.attributes["wait_ms"] = round(
+                self.span.duration * 1000, 2
+            )
+
+        return conn
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        if self.scope is not None:
+            # a failed statement aborts the scope's transaction
+            if exc_type is not None:
+                self.scope.failed = True
+
+            self.scope = None
+
+        if self.labels is not None:
+            metrics.query_duration.observe(
+                time.perf_counter() - self.start, *self.labels
+            )
+
+        tracing.end_span(self.span)
+        self.span = None
+
+        if self.connection is not None:
+            await self.pool.release(self.connection)
+            self.connection = None
+
+
+def acquire(
+    pool: asyncpg.Pool, labels: Optional[Tuple[str, str]] = None
+) -> PoolConnectionContext:
+    """
+    Returns an async context manager acquiring a connection from a given
+    pool, to be used instead of :meth:`asyncpg.Pool.acquire`.
+
+    See :class:`PoolConnectionContext` for details.
+    """
+    return PoolConnectionContext(pool, labels)
+
+
+def get_pool_stats(pool: asyncpg.Pool) -> PoolStats:
+    """Returns a snapshot of the state of a given pool."""
+    stats = acquire_stats
+
+    return PoolStats(
+        min_size=pool.get_min_size(),
+        max_size=pool.get_max_size(),
+        size=pool.get_size(),
+        idle=pool.get_idle_size(),
+        in_use=pool.get_size() - pool.get_idle_size(),
+        acquired=stats.acquired,
+        waiting=stats.waiting,
+        wait_time_avg=(
+            stats.wait_time_total / stats.acquired if stats.acquired else 0.0
+        ),
+        wait_time_max=stats.wait_time_max,
+    )
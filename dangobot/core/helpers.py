@@ -1,37 +1,170 @@
+import asyncio
+import hashlib
 import os
+import tempfile
+from typing import IO, List, Optional
+
+import aiohttp
+from django.conf import settings
+
+# downloaded data is written to the disk once this many bytes are received
+WRITE_BUFFER_SIZE = 256 * 1024
+
+_download_semaphore: Optional[asyncio.Semaphore] = None
 
 
 class FileTooLarge(RuntimeError):
     """
-    Exception raised when the downloaded file exceeds the Discord file size
-    limit (currently 25 MiB).
+    Exception raised when the downloaded file exceeds the maximum attachment
+    size (``MAX_ATTACHMENT_SIZE``, 25 MiB by default).
     """
 
 
-async def download_file(http_session, url, path):
+def parse_shard_ids(value: str) -> List[int]:
     """
-    Downloads a file to a given location.
+    Parses a comma separated list of shard IDs and inclusive ranges of them,
+    such as ``0-3,8``.
     """
+    shard_ids: List[int] = []
+
+    for part in value.split(","):
+        if not (part := part.strip()):
+            continue
+
+        first, _, last = part.partition("-")
+        shard_ids.extend(range(int(first), int(last or first) + 1))
+
+    return sorted(set(shard_ids))
+
+
+def get_download_semaphore() -> asyncio.Semaphore:
+    """Returns the semaphore limiting the amount of concurrent downloads."""
+    global _download_semaphore  # pylint: disable=global-statement
+
+    if _download_semaphore is None:
+        _download_semaphore = asyncio.Semaphore(settings.DOWNLOAD_CONCURRENCY)
+
+    return _download_semaphore
+
+
+def _check_size(size: Optional[int], max_size: int) -> None:
+    if size is not None and size > max_size:
+        raise FileTooLarge(
+            "The provided attachment is larger than "
+            f"{max_size / 2**20:.0f} MiB!"
+        )
+
+
+async def _get_content_length(
+    http_session: aiohttp.ClientSession, url: str
+) -> Optional[int]:
+    try:
+        async with http_session.head(url, allow_redirects=True) as resp:
+            if resp.status != 200:
+                return None
+
+            return resp.content_length
+    except aiohttp.ClientError:
+        # the size is checked again while downloading, so servers that don't
+        # support HEAD requests are fine
+        return None
+
+
+async def download_file(
+    http_session: aiohttp.ClientSession,
+    url: str,
+    path: str,
+    max_size: Optional[int] = None,
+    digest: Optional["hashlib._Hash"] = None,
+) -> int:
+    """
+    Downloads a file to a given location, returning its size.
+
+    Files larger than `max_size` are rejected by raising
+    :exc:`FileTooLarge`, if possible before they're downloaded, based on the
+    ``Content-Length`` of a HEAD request. The file is written to a temporary
+    file in a worker thread, which is moved to `path` once it's complete,
+    so that a failed download never leaves a partial file behind.
+
+    At most ``DOWNLOAD_CONCURRENCY`` files are downloaded at once.
+
+    Parameters
+    -----------
+    http_session: :class:`aiohttp.ClientSession`
+        The session used to make the requests.
+    url: `str`
+        The URL of the file.
+    path: `str`
+        Where to save the file.
+    max_size: Optional[`int`]
+        The maximum size of the file in bytes, ``MAX_ATTACHMENT_SIZE`` by
+        default.
+    digest: Optional[:class:`hashlib._Hash`]
+        A :mod:`hashlib` object updated with the downloaded data, such as
+        ``hashlib.sha256()``.
+    """
+    if max_size is None:
+        max_size = settings.MAX_ATTACHMENT_SIZE
+
+    async with get_download_semaphore():
+        _check_size(await _get_content_length(http_session, url), max_size)
+
+        async with http_session.get(url, raise_for_status=True) as resp:
+            _check_size(resp.content_length, max_size)
+
+            return await _write_response(resp, path, max_size, digest)
+
+
+def _write(
+    file: IO[bytes], digest: Optional["hashlib._Hash"], data: bytearray
+) -> None:
+    file.write(data)
+
+    if digest is not None:
+        digest.update(data)
+
+
+async def _write_response(
+    resp: aiohttp.ClientResponse,
+    path: str,
+    max_size: int,
+    digest: Optional["hashlib._Hash"],
+) -> int:
+    directory = os.path.dirname(path)
+
+    await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+    file = await asyncio.to_thread(
+        tempfile.NamedTemporaryFile,
+        dir=directory,
+        prefix=".",
+        suffix=".part",
+        delete=False,
+    )
 
-    file_size = 0
-    chunk_size = 1024
+    try:
+        size = 0
+        buffer = bytearray()
 
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+        # chunks are as large as what has been received so far, and are
+        # written (and hashed) in batches, to limit the amount of thread
+        # hand-offs
+        async for chunk in resp.content.iter_any():
+            size += len(chunk)
+            _check_size(size, max_size)
 
-    async with http_session.get(url, raise_for_status=True) as resp:
-        with open(path, "wb") as file:
-            while True:
-                chunk = await resp.content.read(1024)
-                if not chunk:
-                    break
+            buffer += chunk
+            if len(buffer) >= WRITE_BUFFER_SIZE:
+                await asyncio.to_thread(_write, file, digest, buffer)
+                buffer = bytearray()
 
-                file_size = file_size + chunk_size
-                if file_size > 25 * 2**20:  # 8 MiB
-                    file.close()
-                    os.remove(path)
+        if buffer:
+            await asyncio.to_thread(_write, file, digest, buffer)
 
-                    raise FileTooLarge(
-                        "The provided attachment is larger than 25MB!"
-                    )
+        await asyncio.to_thread(file.close)
+        await asyncio.to_thread(os.replace, file.name, path)
+    except BaseException:
+        file.close()
+        os.remove(file.name)
+        raise
 
-                file.write(chunk)
+    return size
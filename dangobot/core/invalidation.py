@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import asyncpg
+from asyncpg.connection import Connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# the channel notified by the dangobot_notify_invalidation() trigger function
+CHANNEL = "dangobot_invalidation"
+
+# how often the listening connection is checked, in seconds
+KEEPALIVE_INTERVAL = 30.0
+MAX_RECONNECT_DELAY = 60.0
+
+
+@dataclass(frozen=True)
+class Invalidation:
+    """
+    A change of cached data, made by any process using the database.
+
+    Attributes
+    ----------
+    table: `str`
+        The name of the changed table.
+    operation: `str`
+        ``INSERT``, ``UPDATE``, ``DELETE``, or ``RESYNC`` if the changes
+        are unknown, and everything cached from the table has to be dropped.
+    guild_id: Optional[`int`]
+        The ID of the guild the changed row belongs to, or `None` for all
+        guilds.
+    key: Optional[`str`]
+        The value identifying the changed row within the guild, if the table
+        has one (such as a custom command trigger).
+    """
+
+    table: str
+    operation: str
+    guild_id: Optional[int] = None
+    key: Optional[str] = None
+
+    @classmethod
+    def from_payload(cls, payload: str) -> "Invalidation":
+        """Parses the payload of a notification sent by the trigger."""
+        data = json.loads(payload)
+
+        return cls(
+            table=data["table"],
+            operation=data["operation"],
+            guild_id=data["guild_id"],
+            key=data["key"],
+        )
+
+
+InvalidationHandler = Callable[[Invalidation], None]
+
+
+class InvalidationBus:
+    """
+    Listens for notifications about changed rows on a dedicated database
+    connection, passing them to the handlers subscribed to their tables.
+
+    The notifications are sent by database triggers, so that changes made by
+    other bot processes (or anything else writing to the database) are seen
+    by this process' caches.
+
+    Notifications sent while the connection was down are lost, so once it's
+    reestablished, every handler receives a ``RESYNC`` invalidation, and
+    `on_resync` is awaited.
+
+    Parameters
+    -----------
+    connect: Callable[[], Awaitable[:class:`asyncpg.Connection`]]
+        Opens a new database connection.
+    on_resync: Optional[Callable[[], Awaitable[None]]]
+        Called after a reconnect, for instance to warm up the dropped caches.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[Connection]],
+        on_resync: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> None:
+        self._connect = connect
+        self._on_resync = on_resync
+        self._handlers: Dict[str, List[InvalidationHandler]] = {}
+        self._connection: Optional[Connection] = None
+        self._lost = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, table: str, handler: InvalidationHandler) -> None:
+        """Calls `handler` with every invalidation of a given table."""
+        self._handlers.setdefault(table, []).append(handler)
+
+    async def start(self) -> None:
+        """
+        Starts listening for notifications. Raises if the connection can't be
+        established.
+        """
+        await self._listen()
+
+        self._task = asyncio.create_task(
+            self._maintain(), name="invalidation-bus"
+        )
+
+    async def close(self) -> None:
+        """Stops listening for notifications."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    def dispatch(self, invalidation: Invalidation) -> None:
+        """Passes an invalidation to the handlers of its table."""
+        for handler in self._handlers.get(invalidation.table, ()):
+            try:
+                handler(invalidation)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to handle %s", invalidation)
+
+    def resync(self) -> None:
+        """Drops everything cached by all handlers."""
+        for table in self._handlers:
+            self.dispatch(Invalidation(table, "RESYNC"))
+
+    async def _listen(self) -> None:
+        connection = await self._connect()
+
+        connection.add_termination_listener(self._on_termination)
+        await connection.add_listener(CHANNEL, self._on_notification)
+
+        self._lost.clear()
+        self._connection = connection
+
+    def _on_termination(self, connection: Connection) -> None:
+        if connection is self._connection:
+            self._lost.set()
+
+    def _on_notification(
+        self, _connection: Connection, _pid: int, _channel: str, payload: str
+    ) -> None:
+        try:
+            invalidation = Invalidation.from_payload(payload)
+        except (ValueError, KeyError):
+            logger.warning("Invalid invalidation payload: %r", payload)
+            return
+
+        metrics.cache_invalidations_total.inc(invalidation.table)
+        self.dispatch(invalidation)
+
+    async def _maintain(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                if await self._is_alive():
+                    continue
+
+            logger.warning("Lost the cache invalidation connection")
+            await self._reconnect()
+
+            metrics.cache_resyncs_total.inc()
+            self.resync()
+
+            if self._on_resync is not None:
+                try:
+                    await self._on_resync()
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to warm up the caches")
+
+    async def _is_alive(self) -> bool:
+        assert self._connection is not None
+
+        try:
+            await self._connection.execute("SELECT 1", timeout=10)
+        except (
+            OSError,
+            asyncio.TimeoutError,
+            asyncpg.PostgresError,
+            asyncpg.InterfaceError,
+        ):
+            return False
+
+        return True
+
+    async def _reconnect(self) -> None:
+        if self._connection is not None:
+            self._connection.terminate()
+            self._connection = None
+
+        delay = 1.0
+
+        while True:
+            try:
+                await self._listen()
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError):
+                logger.warning(
+                    "Failed to reconnect the cache invalidation connection, "
+                    "retrying in %.0fs",
+                    delay,
+                    exc_info=True,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            else:
+                logger.info("Reconnected the cache invalidation connection")
+                return
@@ -0,0 +1,201 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from . import tracing
+
+# fields describing what the current task is doing (such as the guild and the
+# command being handled), added to every record logged by it
+log_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "log_context", default=None
+)
+
+
+@contextmanager
+def bind(**fields: Any) -> Iterator[None]:
+    """
+    Adds `fields` to the context of records logged in the ``with`` block,
+    on top of the ones bound by any enclosing blocks.
+
+    A ``started`` field, set to a :func:`time.perf_counter` value, is logged
+    as ``latency_ms``, the time elapsed since then.
+    """
+    current = log_context.get()
+    token = log_context.set({**current, **fields} if current else fields)
+
+    try:
+        yield
+    finally:
+        log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Attaches the fields bound with :func:`bind` to records, as their
+    ``context`` attribute, along with the ID of the current trace.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+
+        if context is None:
+            return True
+
+        fields = dict(context)
+        started = fields.pop("started", None)
+
+        if started is not None:
+            fields["latency_ms"] = round(
+                (time.perf_counter() - started) * 1000, 3
+            )
+
+        if (trace := tracing.current_trace.get()) is not None:
+            fields["trace_id"] = trace.trace_id
+
+        record.context = fields
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a random fraction of the records of INFO level and below, logged
+    by the given loggers or their children. Warnings and errors are always
+    kept, along with records marked as ``sampled``, such as the ones
+    forwarded by cluster workers, which have been sampled by them already.
+
+    Parameters
+    -----------
+    rates: Dict[`str`, `float`]
+        The fraction of records kept for each logger name, between 0 and 1.
+    """
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def get_rate(self, name: str) -> float:
+        """Returns the fraction of records of a given logger that are kept."""
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+
+        rate = 1.0
+        prefix = name
+
+        while prefix:
+            if prefix in self.rates:
+                rate = self.rates[prefix]
+                break
+
+            prefix = prefix.rpartition(".")[0]
+
+        self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or getattr(record, "sampled", False):
+            return True
+
+        rate = self.get_rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as single line JSON objects, including their context
+    (see :func:`bind`).
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+
+        return json.dumps(entry, default=str)
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on a queue, for a :class:`logging.handlers.QueueListener`
+    running in another thread of the same process.
+
+    Unlike :class:`logging.handlers.QueueHandler`, exceptions are formatted
+    by the listener's handlers, as reading the source lines of a traceback
+    can block on disk I/O.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the arguments are merged right away, as they can change once the
+        # logging call returns
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        return record
+
+
+def setup(
+    handlers: List[logging.Handler],
+    level: int = logging.INFO,
+    sample_rates: Optional[Dict[str, float]] = None,
+) -> logging.handlers.QueueListener:
+    """
+    Makes the root logger pass records to `handlers` in a background thread,
+    so that logging calls never block the event loop on I/O.
+
+    The thread is stopped at exit, once all queued records are handled.
+
+    Parameters
+    -----------
+    handlers: List[:class:`logging.Handler`]
+        The handlers writing the records.
+    level: `int`
+        The level of the root logger.
+    sample_rates: Optional[Dict[`str`, `float`]]
+        The fractions of INFO and lower level records kept for given loggers,
+        see :class:`SamplingFilter`.
+    """
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+    queue_handler = LogQueueHandler(log_queue)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
+    return listener
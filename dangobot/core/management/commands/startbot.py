@@ -1,43 +1,56 @@
-from django.core.management.base import BaseCommand
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
 
 from discord.utils import _ColourFormatter, stream_supports_colour
 
+import argparse
+import asyncio
 import os
+import sys
 import logging
 import logging.handlers
 
+import aiohttp
+
+from dangobot.core import log, speedups, startup
 from dangobot.core.bot import DangoBot
+from dangobot.core.cluster import (
+    ClusterLauncher,
+    ClusterLogHandler,
+    WorkerChannel,
+    fetch_gateway_info,
+)
+from dangobot.core.helpers import parse_shard_ids
+
+logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
     help = "Starts the bot"
 
-    def __init__(self):
-        super().__init__()
+    def get_formatter(self):
+        if settings.LOG_FORMAT == "json":
+            return log.JsonFormatter()
 
-        self.setup_logging()
-        self.bot = DangoBot()
+        return logging.Formatter(
+            "{asctime} {levelname:<8} {name} {message}",
+            "%Y-%m-%d %H:%M:%S",
+            style="{",
+        )
 
     def setup_logging(self):
         os.makedirs("logs/", exist_ok=True)
 
-        logger = logging.getLogger()
-
-        logger.setLevel(logging.INFO)
-
         consoleHandler = logging.StreamHandler()
-        if stream_supports_colour(consoleHandler.stream):
+        if settings.LOG_FORMAT == "text" and stream_supports_colour(
+            consoleHandler.stream
+        ):
             consoleHandler.setFormatter(_ColourFormatter())
         else:
-            consoleHandler.setFormatter(
-                logging.Formatter(
-                    "{asctime} {levelname:<8} {name} {message}",
-                    "%Y-%m-%d %H:%M:%S",
-                    style="{",
-                )
-            )
-        logger.addHandler(consoleHandler)
+            consoleHandler.setFormatter(self.get_formatter())
 
         fileHandler = logging.handlers.RotatingFileHandler(
             filename="logs/dangobot.log",
@@ -45,14 +58,191 @@ class Command(BaseCommand):
             maxBytes=32 * 1024 * 1024,
             backupCount=5,
         )
-        fileHandler.setFormatter(
-            logging.Formatter(
-                "{asctime} {levelname:<8} {name} {message}",
-                "%Y-%m-%d %H:%M:%S",
-                style="{",
-            )
+        fileHandler.setFormatter(self.get_formatter())
+
+        # the handlers run in a background thread, so that writing to the
+        # console or the file (and rotating it) never blocks the event loop
+        log.setup(
+            [consoleHandler, fileHandler],
+            sample_rates=settings.LOG_SAMPLE_RATES,
+        )
+
+    def setup_worker_logging(self, channel):
+        # the launcher writes the logs of all workers to its own handlers
+        log.setup(
+            [ClusterLogHandler(channel)],
+            sample_rates=settings.LOG_SAMPLE_RATES,
+        )
+
+    def get_worker_command(self):
+        if os.path.basename(sys.argv[0]) == "manage.py":
+            return [sys.executable, os.path.abspath(sys.argv[0]), "startbot"]
+
+        return [sys.executable, "-m", "django", "startbot"]
+
+    def migrate(self):
+        # checking the migration plan takes a single query, while running
+        # migrate with nothing to apply still goes through all apps
+        with startup.timer.phase("check migrations"):
+            executor = MigrationExecutor(connection)
+            plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+        if plan:
+            logger.info("Applying %d migrations", len(plan))
+
+            with startup.timer.phase("migrate"):
+                call_command("migrate", interactive=False)
+        else:
+            logger.info("The database schema is up to date")
+
+        # the bot doesn't use Django's connection
+        connection.close()
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            default=settings.METRICS_PORT,
+            help="Serve Prometheus metrics on this port.",
+        )
+        parser.add_argument(
+            "--shard-count",
+            type=int,
+            default=settings.SHARD_COUNT,
+            help="The total amount of gateway shards.",
+        )
+        parser.add_argument(
+            "--shard-ids",
+            type=parse_shard_ids,
+            default=settings.SHARD_IDS,
+            help=(
+                "The shards connected by this process, such as 0-3,8. "
+                "Requires --shard-count."
+            ),
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.CLUSTER_PROCESSES,
+            help=(
+                "Run the bot in this many worker processes, each connecting "
+                "a range of shards."
+            ),
+        )
+        parser.add_argument(
+            "--cluster",
+            action="store_true",
+            help="Run the bot in one worker process per CPU.",
+        )
+        parser.add_argument(
+            "--migrate",
+            action="store_true",
+            help="Apply pending database migrations before starting.",
+        )
+        parser.add_argument(
+            "--startup-report",
+            action="store_true",
+            help="Log how long each phase of the startup took.",
+        )
+        parser.add_argument(
+            "--speedups",
+            action=argparse.BooleanOptionalAction,
+            default=settings.SPEEDUPS,
+            help="Use uvloop and orjson, if they're installed.",
+        )
+        parser.add_argument(
+            "--cluster-worker",
+            action="store_true",
+            help=argparse.SUPPRESS,
         )
-        logger.addHandler(fileHandler)
 
     def handle(self, *args, **options):
-        self.bot.run(settings.BOT_TOKEN, log_handler=None)
+        if options["shard_ids"] and options["shard_count"] is None:
+            raise CommandError("--shard-ids requires --shard-count to be set")
+
+        processes = options["processes"]
+        if options["cluster"]:
+            processes = len(os.sched_getaffinity(0))
+
+        cluster = None
+
+        if options["cluster_worker"]:
+            cluster = WorkerChannel()
+            self.setup_worker_logging(cluster)
+        else:
+            self.setup_logging()
+
+        speedups.install(options["speedups"])
+
+        if options["migrate"] and not options["cluster_worker"]:
+            self.migrate()
+
+        if processes and not options["cluster_worker"]:
+            if options["shard_ids"]:
+                raise CommandError(
+                    "--shard-ids can't be used when running multiple "
+                    "processes"
+                )
+
+            asyncio.run(
+                self.run_cluster(
+                    processes,
+                    options["shard_count"],
+                    options["metrics_port"],
+                    options["startup_report"],
+                    options["speedups"],
+                )
+            )
+            return
+
+        bot = DangoBot(
+            metrics_port=options["metrics_port"],
+            shard_count=options["shard_count"],
+            shard_ids=options["shard_ids"],
+            cluster=cluster,
+            startup_report=options["startup_report"],
+        )
+        bot.run(settings.BOT_TOKEN, log_handler=None)
+
+    async def run_cluster(
+        self,
+        processes,
+        shard_count,
+        metrics_port,
+        startup_report,
+        use_speedups,
+    ):
+        max_concurrency = 1
+
+        try:
+            recommended, max_concurrency = await fetch_gateway_info(
+                settings.BOT_TOKEN
+            )
+        except (aiohttp.ClientError, KeyError) as exc:
+            if shard_count is None:
+                raise CommandError(
+                    f"Couldn't fetch the recommended shard count: {exc}"
+                ) from exc
+
+            logger.warning(
+                "Couldn't fetch the gateway rate limits, "
+                "allowing one IDENTIFY at a time: %s",
+                exc,
+            )
+        else:
+            if shard_count is None:
+                shard_count = recommended
+
+        command = self.get_worker_command()
+        command.append("--speedups" if use_speedups else "--no-speedups")
+        if startup_report:
+            command.append("--startup-report")
+
+        launcher = ClusterLauncher(
+            command,
+            shard_count,
+            processes,
+            max_concurrency=max_concurrency,
+            metrics_port=metrics_port,
+        )
+        await launcher.run()
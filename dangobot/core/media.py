@@ -0,0 +1,160 @@
+import asyncio
+import io
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from discord import File, HTTPException, Message
+from discord.http import HTTPClient, Route
+from django.conf import settings
+
+from .cache import LRUCache, SizedLRUCache
+
+# links expiring sooner than this many seconds are refreshed before reuse
+EXPIRY_MARGIN = 300.0
+
+
+@dataclass
+class UploadedAttachment:
+    """
+    A file previously uploaded to Discord, which can be sent again by
+    posting its URL.
+
+    Attributes
+    ----------
+    url: `str`
+        The (signed) CDN URL of the attachment.
+    size: `int`
+        The size of the file in bytes.
+    message_id: `int`
+        The ID of the message the file was uploaded with, whose deletion
+        makes the URL invalid.
+    """
+
+    url: str
+    size: int
+    message_id: int
+
+
+# the contents of recently sent files, by their path relative to MEDIA_ROOT
+cache: SizedLRUCache[str] = SizedLRUCache(maxsize=settings.MEDIA_CACHE_SIZE)
+
+# files uploaded to Discord, by their path and the name they were sent under
+uploads: LRUCache[Tuple[str, str], UploadedAttachment] = LRUCache(
+    maxsize=settings.ATTACHMENT_URL_CACHE_SIZE
+)
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+async def read_file(name: str) -> bytes:
+    """
+    Returns the contents of a file stored in ``MEDIA_ROOT``.
+
+    Files are read in a worker thread, so that the event loop isn't blocked
+    on disk I/O, and the recently used ones are kept in memory, as long as
+    they're no larger than ``MEDIA_CACHE_MAX_FILE_SIZE``.
+
+    Parameters
+    -----------
+    name: `str`
+        The path of the file, relative to ``MEDIA_ROOT``.
+    """
+    if (data := cache.get(name)) is not None:
+        return data
+
+    data = await asyncio.to_thread(
+        _read, os.path.join(settings.MEDIA_ROOT, name)
+    )
+
+    if len(data) <= settings.MEDIA_CACHE_MAX_FILE_SIZE:
+        cache[name] = data
+
+    return data
+
+
+async def open_file(name: str, filename: str) -> File:
+    """
+    Returns a :class:`discord.File` sending a file stored in ``MEDIA_ROOT``
+    (see :func:`read_file`) under a given file name.
+    """
+    # BytesIO shares the buffer of the bytes object until it's written to,
+    # so cached files aren't copied
+    return File(io.BytesIO(await read_file(name)), filename)
+
+
+def get_expiry(url: str) -> Optional[float]:
+    """
+    Returns the Unix time at which a signed Discord CDN URL expires, or
+    `None` if it's not signed.
+    """
+    try:
+        return float(int(parse_qs(urlsplit(url).query)["ex"][0], 16))
+    except (KeyError, ValueError):
+        return None
+
+
+async def refresh_url(http: HTTPClient, url: str) -> str:
+    """Returns a newly signed version of an expired Discord CDN URL."""
+    data = await http.request(
+        Route("POST", "/attachments/refresh-urls"),
+        json={"attachment_urls": [url]},
+    )
+
+    return data["refreshed_urls"][0]["refreshed"]
+
+
+def remember_upload(name: str, filename: str, message: Message) -> None:
+    """
+    Remembers the attachment of a message sending a file stored in
+    ``MEDIA_ROOT`` (see :func:`open_file`), so that it can be reused.
+    """
+    if message.attachments:
+        attachment = message.attachments[0]
+        uploads[(name, filename)] = UploadedAttachment(
+            attachment.url, attachment.size, message.id
+        )
+
+
+async def get_upload(
+    http: HTTPClient, name: str, filename: str
+) -> Optional[UploadedAttachment]:
+    """
+    Returns the attachment with which a file stored in ``MEDIA_ROOT`` was
+    previously uploaded under a given name, with a URL valid for at least
+    :data:`EXPIRY_MARGIN` seconds, or `None` if it has to be uploaded.
+    """
+    if (upload := uploads.get((name, filename))) is None:
+        return None
+
+    expires = get_expiry(upload.url)
+
+    if expires is not None and expires - time.time() < EXPIRY_MARGIN:
+        try:
+            upload.url = await refresh_url(http, upload.url)
+        except (HTTPException, KeyError, IndexError):
+            # most likely the message with the attachment was deleted
+            uploads.pop((name, filename), None)
+            return None
+
+    return upload
+
+
+def forget_uploads(message_id: int) -> None:
+    """Forgets the attachments uploaded with a deleted message."""
+    for key in [
+        key
+        for key, upload in uploads.items()
+        if upload.message_id == message_id
+    ]:
+        del uploads[key]
+
+
+def get_caches() -> Dict[str, LRUCache]:
+    """Returns the caches of this module, by their metric names."""
+    return {"media": cache, "attachment_urls": uploads}
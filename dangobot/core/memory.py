@@ -0,0 +1,285 @@
+import asyncio
+import os
+import random
+import sys
+import types
+from collections import deque
+from dataclasses import dataclass
+from itertools import islice
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Collection,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+)
+
+import discord
+from asyncpg import Record
+from discord.abc import GuildChannel
+from discord.state import ConnectionState
+
+from .cache import LRUCache
+from .repository import get_caches
+
+if TYPE_CHECKING:
+    from .bot import DangoBot
+
+# the amount of entries of each cache whose size is measured, the size of
+# the rest is extrapolated from them
+SAMPLE_SIZE = 200
+
+# objects referenced by many cached ones, which aren't a part of any cache
+_STATE_TYPES: Tuple[Type, ...] = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.MethodType,
+    ConnectionState,
+    discord.Client,
+)
+# guilds along with their channels, roles and emojis, each counted as
+# a part of their guild
+_GUILD_TYPES: Tuple[Type, ...] = (discord.Guild, GuildChannel, discord.Thread)
+_USER_TYPES: Tuple[Type, ...] = (discord.Member, discord.User)
+
+
+@dataclass
+class CacheUsage:
+    """The approximate memory used by a single cache."""
+
+    name: str
+    entries: int
+    size: int
+
+
+# the latest estimates made by :func:`monitor_cache_usage`, read by the
+# metrics scrapes, which mustn't measure the caches themselves
+cache_usage: List[CacheUsage] = []
+
+
+def deep_sizeof(
+    obj: Any,
+    seen: Optional[Set[int]] = None,
+    shared: Tuple[Type, ...] = _STATE_TYPES,
+) -> int:
+    """
+    Returns the approximate amount of memory used by an object, along with
+    all objects reachable from it, except for the ones of `shared` types.
+
+    Objects whose IDs are in `seen` aren't counted again, which lets shared
+    objects be counted once when measuring multiple objects.
+    """
+    if seen is None:
+        seen = set()
+
+    size = 0
+    stack = [obj]
+
+    while stack:
+        current = stack.pop()
+
+        if id(current) in seen or isinstance(current, shared):
+            continue
+
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, (str, bytes, int, float, bool)):
+            continue
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        elif isinstance(current, Record):
+            stack.extend(current.values())
+
+        if hasattr(current, "__dict__"):
+            stack.append(vars(current))
+
+        for slot in getattr(type(current), "__slots__", ()):
+            if (value := getattr(current, slot, None)) is not None:
+                stack.append(value)
+
+    return size
+
+
+def sample_entries(
+    collections: Sequence[Collection[Any]], sample_size: int
+) -> List[Any]:
+    """
+    Returns a random sample of at most `sample_size` entries of all given
+    collections, without copying them.
+
+    Collections none of whose entries were picked aren't iterated at all,
+    so that sampling, for instance, the members of every guild only goes
+    through the guilds the sample falls into.
+    """
+    sizes = [len(collection) for collection in collections]
+    total = sum(sizes)
+    indices = sorted(random.sample(range(total), min(sample_size, total)))
+
+    sample = []
+    start = 0
+    picked = iter(indices)
+    index = next(picked, None)
+
+    for collection, size in zip(collections, sizes):
+        end = start + size
+        entries = iter(collection)
+        position = start
+
+        while index is not None and index < end:
+            sample.append(next(islice(entries, index - position, None)))
+            position = index + 1
+            index = next(picked, None)
+
+        start = end
+
+    return sample
+
+
+def estimate_size(
+    collections: Sequence[Collection[Any]],
+    shared: Tuple[Type, ...] = _STATE_TYPES,
+    sample_size: int = SAMPLE_SIZE,
+) -> int:
+    """
+    Estimates the memory used by all entries of a cache, given as one or
+    more collections, by measuring a random sample of them.
+    """
+    total = sum(len(collection) for collection in collections)
+
+    if not total:
+        return 0
+
+    sample = sample_entries(collections, sample_size)
+
+    seen: Set[int] = set()
+    size = sum(deep_sizeof(entry, seen, shared) for entry in sample)
+
+    return size * total // len(sample)
+
+
+def _iter_cache_usage(
+    bot: "DangoBot",
+) -> Iterator[Callable[[], CacheUsage]]:
+    # pylint: disable=protected-access
+    def discord_guilds() -> CacheUsage:
+        guilds = bot.guilds
+
+        return CacheUsage(
+            "discord_guilds",
+            len(guilds),
+            estimate_size([guilds], _STATE_TYPES + _USER_TYPES),
+        )
+
+    def discord_members() -> CacheUsage:
+        # the members are sampled guild by guild, rather than gathered into
+        # a single list first
+        members = [guild._members.values() for guild in bot.guilds]
+
+        return CacheUsage(
+            "discord_members",
+            sum(len(guild_members) for guild_members in members),
+            # the users are counted separately, as they're shared by all
+            # guilds of a given member
+            estimate_size(
+                members, _STATE_TYPES + _GUILD_TYPES + (discord.User,)
+            ),
+        )
+
+    def discord_users() -> CacheUsage:
+        users = bot._connection._users.values()
+
+        return CacheUsage(
+            "discord_users",
+            len(users),
+            estimate_size([users], _STATE_TYPES + _GUILD_TYPES),
+        )
+
+    def discord_messages() -> CacheUsage:
+        messages = bot.cached_messages
+
+        return CacheUsage(
+            "discord_messages",
+            len(messages),
+            estimate_size(
+                [messages], _STATE_TYPES + _GUILD_TYPES + _USER_TYPES
+            ),
+        )
+
+    def bot_cache(name: str, cache: LRUCache) -> Callable[[], CacheUsage]:
+        return lambda: CacheUsage(
+            name, len(cache), estimate_size([cache.items()])
+        )
+
+    yield from (
+        discord_guilds,
+        discord_members,
+        discord_users,
+        discord_messages,
+    )
+
+    for name, cache in get_caches().items():
+        yield bot_cache(name, cache)
+
+
+async def get_cache_usage(bot: "DangoBot") -> List[CacheUsage]:
+    """
+    Returns the approximate memory used by discord.py's caches of guilds,
+    members, users and messages, and by the bot's own caches.
+
+    The caches are measured one at a time, letting other tasks run in
+    between, so that the event loop isn't blocked for too long.
+    """
+    usage = []
+
+    for measure in _iter_cache_usage(bot):
+        usage.append(measure())
+        await asyncio.sleep(0)
+
+    return usage
+
+
+async def monitor_cache_usage(bot: "DangoBot", interval: float) -> None:
+    """
+    Updates :data:`cache_usage` with the estimates of :func:`get_cache_usage`
+    every `interval` seconds.
+    """
+    while True:
+        cache_usage[:] = await get_cache_usage(bot)
+        await asyncio.sleep(interval)
+
+
+def format_size(size: float) -> str:
+    """Formats an amount of bytes using binary units, such as 1.5 MiB."""
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size:.0f} B"
+
+        size /= 1024
+
+    return f"{size:.1f} GiB"
+
+
+def get_rss() -> Optional[int]:
+    """
+    Returns the resident set size of the current process in bytes, or
+    `None` if it's not available on this platform.
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        return None
+
+    return pages * os.sysconf("SC_PAGE_SIZE")
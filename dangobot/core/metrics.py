@@ -0,0 +1,386 @@
+import asyncio
+import bisect
+import logging
+import math
+import time
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+_MetricT = TypeVar("_MetricT", bound="Metric")
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[LabelValues, float]
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+
+    pairs = []
+
+    for name, value in zip(names, values):
+        escaped = (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\n", "\\n")
+            .replace('"', '\\"')
+        )
+        pairs.append(f'{name}="{escaped}"')
+
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """
+    The base class for metrics exported in the Prometheus text format.
+
+    Attributes
+    ----------
+    name: `str`
+        The metric name.
+    documentation: `str`
+        The help text shown alongside the metric.
+    labelnames: Tuple[`str`, ...]
+        The names of the labels distinguishing the metric's time series.
+    """
+
+    type: str = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        """Returns the lines of the text exposition format for this metric."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+        for labels, value in self.collect():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+
+        return lines
+
+    def collect(self) -> Iterable[Sample]:
+        """Returns the current values of all time series of this metric."""
+        return []
+
+
+class Counter(Metric):
+    """A monotonically increasing value."""
+
+    type = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Increments the value of the time series with given labels."""
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> Iterable[Sample]:
+        return self._values.items()
+
+
+class Gauge(Counter):
+    """A value that can arbitrarily go up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        """Sets the value of the time series with given labels."""
+        self._values[labels] = value
+
+
+class CallbackMetric(Metric):
+    """
+    A metric whose values are read from a callback whenever the metrics are
+    collected, useful for exporting values tracked elsewhere.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[Sample]],
+        type: str = "gauge",  # pylint: disable=redefined-builtin
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.type = type
+
+    def collect(self) -> Iterable[Sample]:
+        try:
+            return list(self.callback())
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to collect metric %s", self.name)
+            return []
+
+
+class Histogram(Metric):
+    """Tracks the distribution of observed values in buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: bucket counts, sum, count
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Records a value in the time series with given labels."""
+        try:
+            counts, totals = self._values[labels]
+        except KeyError:
+            counts = [0] * (len(self.buckets) + 1)
+            totals = [0.0]
+            self._values[labels] = (counts, totals)
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        totals[0] += value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        names = self.labelnames + ("le",)
+
+        for labels, (counts, totals) in self._values.items():
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    names, labels + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+
+            series = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{series} {_format_value(totals[0])}")
+            lines.append(f"{self.name}_count{series} {cumulative}")
+
+        return lines
+
+    def time(self, *labels: str) -> "_HistogramTimer":
+        """
+        Returns a context manager observing the time spent in its block.
+        """
+        return _HistogramTimer(self, labels)
+
+
+class _HistogramTimer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: LabelValues) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    """A collection of metrics exported together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: _MetricT) -> _MetricT:
+        """Adds a metric to the registry, replacing one with the same name."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+command_duration = registry.register(
+    Histogram(
+        "dangobot_command_duration_seconds",
+        "Time spent handling a command invocation.",
+        ("cog", "command"),
+    )
+)
+commands_total = registry.register(
+    Counter(
+        "dangobot_commands_total",
+        "Handled command invocations.",
+        ("cog", "command"),
+    )
+)
+command_errors_total = registry.register(
+    Counter(
+        "dangobot_command_errors_total",
+        "Command invocations which resulted in an error.",
+        ("cog", "command", "error"),
+    )
+)
+query_duration = registry.register(
+    Histogram(
+        "dangobot_db_query_duration_seconds",
+        "Time spent executing repository queries.",
+        ("table", "operation"),
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+    )
+)
+cache_invalidations_total = registry.register(
+    Counter(
+        "dangobot_cache_invalidations_total",
+        "Cache invalidations received from the database.",
+        ("table",),
+    )
+)
+cache_resyncs_total = registry.register(
+    Counter(
+        "dangobot_cache_resyncs_total",
+        "Caches dropped after reconnecting to the invalidation channel.",
+    )
+)
+attachment_sends_total = registry.register(
+    Counter(
+        "dangobot_attachment_sends_total",
+        "Command attachments sent, by whether they were uploaded, or reused "
+        "by posting the URL of a previous upload.",
+        ("mode",),
+    )
+)
+attachment_bytes_saved_total = registry.register(
+    Counter(
+        "dangobot_attachment_bytes_saved_total",
+        "Bytes of command attachments not uploaded thanks to reusing "
+        "the URLs of previous uploads.",
+    )
+)
+event_loop_lag = registry.register(
+    Gauge(
+        "dangobot_event_loop_lag_seconds",
+        "Delay of the last scheduled event loop wake-up.",
+    )
+)
+
+
+async def monitor_event_loop_lag(interval: float = 1.0) -> None:
+    """
+    Periodically measures how late the event loop wakes up a sleeping task,
+    which indicates how long it's been blocked by other code.
+    """
+    loop = asyncio.get_running_loop()
+
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag.set(max(loop.time() - start - interval, 0.0))
+
+
+class MetricsServer:
+    """
+    An HTTP server exposing the metrics of a registry under ``/metrics``,
+    to be scraped by Prometheus.
+    """
+
+    def __init__(
+        self, host: str, port: int, metrics: Optional[Registry] = None
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.registry = metrics or registry
+
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle_metrics(
+        self, request: web.Request  # pylint: disable=unused-argument
+    ) -> web.Response:
+        """Renders the metrics."""
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={
+                "Content-Type": "text/plain; version=0.0.4; charset=utf-8"
+            },
+        )
+
+    async def start(self) -> None:
+        """Starts listening for requests."""
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+        logger.info(
+            "Serving metrics on http://%s:%d/metrics", self.host, self.port
+        )
+
+    async def close(self) -> None:
+        """Stops the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
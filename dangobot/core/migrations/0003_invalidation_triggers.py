@@ -0,0 +1,76 @@
+from django.db import migrations
+
+# Sends a notification on the dangobot_invalidation channel for every changed
+# row, read by the bots' cache invalidation bus. The trigger arguments are the
+# names of the guild ID column, and optionally of the column identifying the
+# cached entry within the guild. Notifications are only delivered once the
+# transaction commits, and identical ones sent in a single transaction are
+# merged.
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION dangobot_notify_invalidation() RETURNS trigger AS $$
+DECLARE
+    old_row jsonb;
+    new_row jsonb;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_row := to_jsonb(OLD);
+        PERFORM pg_notify('dangobot_invalidation', json_build_object(
+            'table', TG_TABLE_NAME,
+            'operation', TG_OP,
+            'guild_id', old_row -> TG_ARGV[0],
+            'key', old_row ->> TG_ARGV[1]
+        )::text);
+    END IF;
+
+    IF TG_OP <> 'DELETE' THEN
+        new_row := to_jsonb(NEW);
+
+        IF old_row IS NULL
+            OR old_row -> TG_ARGV[0] IS DISTINCT FROM new_row -> TG_ARGV[0]
+            OR old_row ->> TG_ARGV[1] IS DISTINCT FROM new_row ->> TG_ARGV[1]
+        THEN
+            PERFORM pg_notify('dangobot_invalidation', json_build_object(
+                'table', TG_TABLE_NAME,
+                'operation', TG_OP,
+                'guild_id', new_row -> TG_ARGV[0],
+                'key', new_row ->> TG_ARGV[1]
+            )::text);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_guild_command_prefix'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CREATE_FUNCTION,
+            'DROP FUNCTION dangobot_notify_invalidation();',
+        ),
+        migrations.RunSQL(
+            """
+            CREATE TRIGGER core_guild_invalidation_update
+            AFTER UPDATE OF command_prefix ON core_guild
+            FOR EACH ROW
+            WHEN (OLD.command_prefix IS DISTINCT FROM NEW.command_prefix)
+            EXECUTE FUNCTION dangobot_notify_invalidation('id');
+
+            CREATE TRIGGER core_guild_invalidation_delete
+            AFTER DELETE ON core_guild
+            FOR EACH ROW
+            EXECUTE FUNCTION dangobot_notify_invalidation('id');
+            """,
+            """
+            DROP TRIGGER core_guild_invalidation_update ON core_guild;
+            DROP TRIGGER core_guild_invalidation_delete ON core_guild;
+            """,
+        ),
+    ]
@@ -1,3 +1,5 @@
+from collections import Counter
+
 from discord import Embed
 from discord.ext import commands
 from discord.ext.commands import Context, Cog as BaseCog
@@ -6,6 +8,7 @@ from dateutil.parser import isoparse
 
 from django.conf import settings
 
+from . import database, memory
 from .bot import DangoBot
 
 
@@ -56,6 +59,99 @@ class Core(Cog):
 
         await ctx.send(embed=embed)
 
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def dbstats(self, ctx: Context) -> None:
+        """
+        Shows the state of the database connection pool, useful for telling
+        whether commands are slowed down by waiting for a free connection.
+        """
+        stats = database.get_pool_stats(database.db_pool)
+
+        embed = Embed()
+        embed.title = "Database connection pool"
+        embed.add_field(
+            name="Connections",
+            value=(
+                f"{stats.in_use} in use, {stats.idle} idle "
+                f"(size {stats.size}, min {stats.min_size}, "
+                f"max {stats.max_size})"
+            ),
+            inline=False,
+        )
+        embed.add_field(
+            name="Acquisitions",
+            value=(
+                f"{stats.acquired} total, {stats.waiting} waiting right now"
+            ),
+            inline=False,
+        )
+        embed.add_field(
+            name="Acquire wait time",
+            value=(
+                f"{stats.wait_time_avg * 1000:.2f} ms average, "
+                f"{stats.wait_time_max * 1000:.2f} ms max"
+            ),
+            inline=False,
+        )
+
+        await ctx.send(embed=embed)
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def shards(self, ctx: Context) -> None:
+        """Shows the state and latency of the gateway shards."""
+        guild_counts = Counter(guild.shard_id for guild in self.bot.guilds)
+        lines = []
+
+        for shard_id, latency in sorted(self.bot.latencies):
+            state = (
+                "ready" if shard_id in self.bot.ready_shards else "not ready"
+            )
+            lines.append(
+                f"**{shard_id}**: {state}, {latency * 1000:.0f} ms, "
+                f"{guild_counts[shard_id]} guilds"
+            )
+
+        embed = Embed()
+        embed.title = "Shards"
+        embed.description = "\n".join(lines)
+        embed.set_footer(
+            text=f"{len(self.bot.shards)} of {self.bot.shard_count} shards "
+            "are handled by this process"
+        )
+
+        await ctx.send(embed=embed)
+
+    @commands.command(name="memory", hidden=True)
+    @commands.is_owner()
+    async def memory_usage(self, ctx: Context) -> None:
+        """
+        Shows the approximate memory used by each of the bot's caches,
+        estimated by measuring a sample of their entries.
+        """
+        usage = await memory.get_cache_usage(self.bot)
+
+        embed = Embed()
+        embed.title = "Memory usage"
+        embed.description = "\n".join(
+            f"**{cache.name}**: {memory.format_size(cache.size)} "
+            f"({cache.entries} entries)"
+            for cache in sorted(usage, key=lambda cache: -cache.size)
+        )
+
+        footer = (
+            f"{memory.format_size(sum(cache.size for cache in usage))} "
+            "in caches"
+        )
+
+        if (rss := memory.get_rss()) is not None:
+            footer += f", {memory.format_size(rss)} resident"
+
+        embed.set_footer(text=footer)
+
+        await ctx.send(embed=embed)
+
 
 async def setup(bot: DangoBot):  # pylint: disable=missing-function-docstring
     await bot.add_cog(Core(bot))
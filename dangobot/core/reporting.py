@@ -0,0 +1,371 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import traceback
+from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import aiohttp
+from discord import DMChannel, Embed
+from django.conf import settings
+
+from .commands.embeds import ErrorEmbedFormatter
+
+if TYPE_CHECKING:
+    from .bot import DangoBot
+
+logger = logging.getLogger(__name__)
+
+
+class PasteBackend(metaclass=ABCMeta):
+    """A service storing full tracebacks linked in error reports."""
+
+    @abstractmethod
+    async def upload(self, content: str) -> str:
+        """Stores a traceback, and returns a link to it."""
+
+
+class HTTPPasteBackend(PasteBackend):
+    """
+    Uploads tracebacks to a pastebin accepting form-encoded ``POST``
+    requests with a ``content`` field, and responding with the paste URL.
+    """
+
+    def __init__(
+        self,
+        http_session: aiohttp.ClientSession,
+        url: str,
+        fields: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.http_session = http_session
+        self.url = url
+        self.fields = fields or {}
+
+    async def upload(self, content: str) -> str:
+        async with self.http_session.post(
+            self.url, data=self.fields | {"content": content}
+        ) as resp:
+            return (await resp.text()).strip()
+
+
+class DpasteBackend(HTTPPasteBackend):
+    """Uploads tracebacks to dpaste.com."""
+
+    def __init__(
+        self,
+        http_session: aiohttp.ClientSession,
+        url: str = "http://dpaste.com/api/v2/",
+    ) -> None:
+        super().__init__(
+            http_session, url, {"expiry_days": "21", "syntax": "pytb"}
+        )
+
+
+class FileBackend(PasteBackend):
+    """Stores tracebacks as files in a local directory."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    async def upload(self, content: str) -> str:
+        digest = hashlib.sha1(content.encode()).hexdigest()[:12]
+        path = os.path.join(
+            self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{digest}.txt"
+        )
+
+        def write() -> None:
+            os.makedirs(self.directory, exist_ok=True)
+
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(content)
+
+        await asyncio.to_thread(write)
+
+        return os.path.abspath(path)
+
+
+def create_paste_backend(
+    http_session: aiohttp.ClientSession,
+) -> Optional[PasteBackend]:
+    """Creates the paste backend configured by ``ERROR_PASTE_BACKEND``."""
+    backend = settings.ERROR_PASTE_BACKEND
+
+    if backend == "dpaste":
+        return DpasteBackend(http_session)
+
+    if backend == "http":
+        return HTTPPasteBackend(http_session, settings.ERROR_PASTE_URL)
+
+    if backend == "file":
+        return FileBackend(settings.ERROR_PASTE_DIRECTORY)
+
+    return None
+
+
+def get_fingerprint(exception: BaseException) -> str:
+    """
+    Returns an identifier shared by exceptions of the same type raised
+    from the same place in the code, regardless of their message.
+    """
+    frames = traceback.extract_tb(exception.__traceback__)
+    parts = [type(exception).__qualname__] + [
+        f"{frame.filename}:{frame.lineno}:{frame.name}" for frame in frames
+    ]
+
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def truncate_traceback(trace: List[str], limit: int) -> str:
+    """
+    Joins a formatted traceback, removing the oldest entries (while keeping
+    the header) until it fits in `limit` characters.
+    """
+    if sum(map(len, trace)) <= limit:
+        return "".join(trace)
+
+    kept: List[str] = []
+    remaining = limit - len(trace[0])
+
+    for entry in reversed(trace[1:]):
+        remaining -= len(entry)
+
+        if remaining < 0:
+            break
+
+        kept.append(entry)
+
+    kept.reverse()
+
+    return trace[0] + "...\n" + "".join(kept)
+
+
+@dataclass
+class _ErrorOccurrences:
+    """Tracks occurrences of errors sharing a fingerprint."""
+
+    name: str
+    message: str
+    repeats: int = 0
+
+
+class ErrorReporter:
+    """
+    Reports unhandled command errors to the bot owner in DMs.
+
+    Errors are queued, and sent from a background task so that they don't
+    delay handling of the failing command. The first occurrence of an error
+    is reported in full, while its repeats (and any errors over the
+    ``ERROR_REPORT_LIMIT``) are summarized in a digest sent every
+    ``ERROR_DIGEST_INTERVAL`` seconds.
+    """
+
+    def __init__(
+        self,
+        bot: "DangoBot",
+        paste_backend: Optional[PasteBackend],
+        digest_interval: float,
+        report_limit: int,
+        queue_size: int = 1000,
+    ) -> None:
+        if digest_interval <= 0:
+            raise ValueError(
+                "The error digest interval must be positive, "
+                f"got {digest_interval}"
+            )
+
+        self.bot = bot
+        self.paste_backend = paste_backend
+        self.digest_interval = digest_interval
+        self.report_limit = report_limit
+
+        self.dropped = 0
+
+        self._queue: asyncio.Queue[BaseException] = asyncio.Queue(queue_size)
+        self._errors: Dict[str, _ErrorOccurrences] = {}
+        self._reports_sent = 0
+        self._dm_channel: Optional[DMChannel] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def start(self) -> None:
+        """Starts the background task sending the reports."""
+        self._task = asyncio.create_task(self._run(), name="error-reporter")
+
+    async def close(self) -> None:
+        """
+        Stops the background task, reporting the errors still in the queue,
+        and sending any pending digest.
+        """
+        if self._task is None:
+            return
+
+        # wait_for can swallow the cancellation if an error is dequeued at
+        # the same time, the flag stops the loop then
+        self._closing = True
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._task = None
+
+        # the errors queued right before shutting down are often the ones
+        # which caused it, over the report limit they end up in the digest
+        while not self._queue.empty():
+            try:
+                await self._process(self._queue.get_nowait())
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to report an error to the owner")
+
+        try:
+            await self._send_digest()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to send the error digest")
+
+    def report(self, exception: BaseException) -> None:
+        """Queues an error to be reported, without waiting for it."""
+        try:
+            self._queue.put_nowait(exception)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self) -> None:
+        next_digest = time.monotonic() + self.digest_interval
+
+        while not self._closing:
+            timeout = max(next_digest - time.monotonic(), 0)
+
+            try:
+                exception = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                exception = None
+
+            try:
+                if exception is not None:
+                    await self._process(exception)
+
+                if time.monotonic() >= next_digest:
+                    next_digest = time.monotonic() + self.digest_interval
+                    await self._send_digest()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to report an error to the owner")
+
+    async def _process(self, exception: BaseException) -> None:
+        fingerprint = get_fingerprint(exception)
+
+        if (occurrences := self._errors.get(fingerprint)) is not None:
+            occurrences.repeats += 1
+            return
+
+        self._errors[fingerprint] = occurrences = _ErrorOccurrences(
+            name=self.get_exception_name(exception), message=str(exception)
+        )
+
+        if self._reports_sent >= self.report_limit:
+            occurrences.repeats += 1
+            return
+
+        self._reports_sent += 1
+
+        await self.send(await self.format_traceback(exception))
+
+    async def _send_digest(self) -> None:
+        repeated = [
+            occurrences
+            for occurrences in self._errors.values()
+            if occurrences.repeats > 0
+        ]
+
+        self._errors.clear()
+        self._reports_sent = 0
+
+        if not repeated and not self.dropped:
+            return
+
+        lines = [
+            f"**{occurrences.repeats}x** `{occurrences.name}`: "
+            f"{occurrences.message[:100]}"
+            for occurrences in sorted(
+                repeated, key=lambda occurrences: -occurrences.repeats
+            )
+        ]
+
+        if self.dropped:
+            lines.append(f"**{self.dropped}x** dropped, the queue was full")
+            self.dropped = 0
+
+        description = "\n".join(lines)
+
+        if len(description) > 4000:
+            description = description[:4000] + "\n..."
+
+        await self.send(
+            ErrorEmbedFormatter().format(
+                title="Errors repeated since the last report",
+                description=description,
+            )
+        )
+
+    async def send(self, embed: Embed) -> None:
+        """Sends an embed to the bot owner."""
+        if self._dm_channel is None:
+            owner_id = int(settings.OWNER_ID)
+            owner = self.bot.get_user(owner_id) or await self.bot.fetch_user(
+                owner_id
+            )
+
+            self._dm_channel = owner.dm_channel or await owner.create_dm()
+
+        await self._dm_channel.send(embed=embed)
+
+    @staticmethod
+    def get_exception_name(exception: BaseException) -> str:
+        """Returns the fully qualified class name of an exception."""
+        return (
+            exception.__class__.__module__
+            + "."
+            + exception.__class__.__qualname__
+        )
+
+    async def format_traceback(self, exception: BaseException) -> Embed:
+        """
+        Format a traceback ready to be posted as a
+        Discord embed given an exception.
+        """
+        trace = traceback.format_exception(
+            exception.__class__, exception, exception.__traceback__
+        )
+
+        # remove oldest traces until we're under the embed length cap,
+        # which is 1000, minus 6 characters for codeblock start and end,
+        # 4 for a 3 character ellipsis (...) and a newline character
+        truncated = truncate_traceback(trace, 990)
+
+        embed = (
+            ErrorEmbedFormatter()
+            .format(title="An error has occured!")
+            .add_field(
+                name=self.get_exception_name(exception),
+                value=f"```{truncated}```",
+                inline=False,
+            )
+        )
+
+        if self.paste_backend is not None:
+            # upload full, unedited traceback to a pastebin
+            try:
+                trace_url = await self.paste_backend.upload("".join(trace))
+            except (aiohttp.ClientError, OSError):
+                logger.warning("Failed to upload a traceback", exc_info=True)
+                trace_url = "Failed to upload the traceback."
+
+            embed.add_field(name="Full traceback:", value=trace_url)
+
+        return embed
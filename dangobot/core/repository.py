@@ -1,8 +1,21 @@
 from __future__ import annotations
 
+import inspect
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Type, Dict, List, Optional
+from functools import lru_cache
+from typing import (
+    Any,
+    Type,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 from asyncpg.pool import Pool
 from asyncpg.connection import Connection
@@ -13,16 +26,131 @@ from discord import Guild
 from django.conf import settings
 from django.db.models.base import Model
 
+from .cache import LRUCache
+from .invalidation import Invalidation
 from .models import Guild as DBGuild
-from . import database
+from . import database, media
 
 
-def _get_query_string(args: Dict[str, Any]) -> str:
+def _get_query_string(columns: Tuple[str, ...], offset: int = 0) -> str:
     return " AND ".join(
-        [f"{field[0]} = ${i + 1}" for i, field in enumerate(args.items())]
+        [f"{column} = ${i + offset + 1}" for i, column in enumerate(columns)]
     )
 
 
+@lru_cache(maxsize=512)
+def _build_query(
+    table: str,
+    operation: str,
+    columns: Tuple[str, ...],
+    where: Tuple[str, ...] = (),
+) -> str:
+    """
+    Generates the SQL for a given operation on a table. The results are
+    memoized, so that the queries made by repositories aren't rebuilt on
+    every call.
+
+    Parameters
+    -----------
+    table: `str`
+        The table name.
+    operation: `str`
+        One of ``select``, ``select_any``, ``delete``, ``delete_any``,
+        ``insert``, ``insert_returning``, ``upsert``, ``update`` or
+        ``update_returning``.
+    columns: Tuple[`str`, ...]
+        The columns used as query constraints for ``select`` and ``delete``,
+        the inserted columns for ``insert`` and ``upsert``, or the updated
+        columns for ``update``. The ``_any`` variants take a single column,
+        compared against an array parameter.
+    where: Tuple[`str`, ...]
+        The columns used as query constraints for ``update``, whose parameters
+        follow the ones of the updated columns, or the conflict target for
+        ``upsert``.
+    """
+    if operation == "select":
+        return f"SELECT * FROM {table} WHERE {_get_query_string(columns)}"
+
+    if operation == "select_any":
+        return f"SELECT * FROM {table} WHERE {columns[0]} = ANY($1)"
+
+    if operation == "delete":
+        return f"DELETE FROM {table} WHERE {_get_query_string(columns)}"
+
+    if operation == "delete_any":
+        return f"DELETE FROM {table} WHERE {columns[0]} = ANY($1)"
+
+    if operation == "upsert":
+        keys = ", ".join(columns)
+        values = ", ".join([f"${i + 1}" for i in range(len(columns))])
+        updated = ", ".join(
+            [
+                f"{column} = EXCLUDED.{column}"
+                for column in columns
+                if column not in where
+            ]
+        )
+        action = f"DO UPDATE SET {updated}" if updated else "DO NOTHING"
+
+        return (
+            f"INSERT INTO {table} ({keys}) VALUES ({values}) "
+            f"ON CONFLICT ({', '.join(where)}) {action}"
+        )
+
+    if operation in ("insert", "insert_returning"):
+        keys = ", ".join(columns)
+        values = ", ".join([f"${i + 1}" for i in range(len(columns))])
+        query = f"INSERT INTO {table} ({keys}) VALUES ({values})"
+
+    elif operation in ("update", "update_returning"):
+        values = ", ".join(
+            [f"{column} = ${i + 1}" for i, column in enumerate(columns)]
+        )
+        constraints = _get_query_string(where, offset=len(columns))
+        query = f"UPDATE {table} SET {values} WHERE {constraints}"
+
+    else:
+        raise ValueError(f"Unknown operation {operation}")
+
+    if operation.endswith("_returning"):
+        query += " RETURNING *"
+
+    return query
+
+
+def _get_columns(records: Sequence[Dict[str, Any]]) -> Tuple[str, ...]:
+    """
+    Returns the fields of the given records, ensuring that they're the same
+    (and in the same order) for every record.
+    """
+    columns = tuple(records[0])
+
+    for record in records:
+        if tuple(record) != columns:
+            raise ValueError("All records must contain the same fields")
+
+    return columns
+
+
+def _get_guild_ids(records: Sequence[Dict[str, Any]]) -> Optional[Set[int]]:
+    """
+    Returns the IDs of the guilds of the given records, or `None` if any of
+    them doesn't specify its guild.
+    """
+    if not all("guild_id" in record for record in records):
+        return None
+
+    return {record["guild_id"] for record in records}
+
+
+def _get_affected_rows(status: str) -> int:
+    """
+    Returns the amount of rows affected by a query, given its command status
+    (such as ``UPDATE 1`` or ``INSERT 0 1``).
+    """
+    return int(status.rpartition(" ")[2])
+
+
 class RepositoryABCSingleton(
     ABCMeta
 ):  # pylint: disable=missing-class-docstring
@@ -64,13 +192,73 @@ class Repository(metaclass=RepositoryABCSingleton):
         """Returns the primary key for this repository's table."""
         return self.model._meta.pk.name  # type: ignore
 
+    def acquire(self, operation: str) -> database.PoolConnectionContext:
+        """
+        Returns an async context manager acquiring a database connection
+        for this repository's queries.
+
+        The time the connection is held for is recorded in the query duration
+        metrics, labeled with the table name and the `operation`.
+        """
+        return database.acquire(self.db_pool, (self.table_name, operation))
+
+    def get_caches(self) -> Dict[str, LRUCache]:
+        """
+        Returns the caches kept by this repository, keyed by their names used
+        in metrics and reports.
+        """
+        return {}
+
+    def evict_guild(self, guild_id: int):
+        """
+        Removes all cached data of a given guild, once it's no longer
+        handled by this process.
+        """
+
+    def apply_invalidation(self, invalidation: Invalidation):
+        """
+        Drops the cached data affected by a change made to this repository's
+        table, possibly by another process.
+
+        The invalidations are received from the database, after the change
+        is committed, including the changes made by this process itself.
+        """
+
+    def invalidate_guilds(self, guild_ids: Optional[Set[int]]):
+        """
+        Drops the cached data of guilds whose records were written to through
+        the write methods of this repository, or of all guilds if `guild_ids`
+        is `None`, as the affected guilds aren't known.
+
+        Called by all of the write methods below, so that repositories
+        keeping a cache derived from their table only have to override this.
+        """
+
+    def get_hot_queries(self) -> List[str]:
+        """
+        Returns the queries executed often enough to be worth preparing on
+        every database connection up front.
+        """
+        return []
+
+    def get_query(
+        self,
+        operation: str,
+        columns: Tuple[str, ...],
+        where: Tuple[str, ...] = (),
+    ) -> str:
+        """
+        Returns the (memoized) SQL for a given operation on this repository's
+        table. See :func:`_build_query` for the available operations.
+        """
+        return _build_query(self.table_name, operation, columns, where)
+
     async def find_by_id(self, _id: int) -> Record:
         """Finds the object by its ID."""
         conn: Connection
-        async with self.db_pool.acquire() as conn:
+        async with self.acquire("find_by_id") as conn:
             return await conn.fetchrow(
-                f"SELECT * FROM {self.table_name} WHERE {self.primary_key}=$1",
-                _id,
+                self.get_query("select", (self.primary_key,)), _id
             )
 
     async def destroy_by_id(self, _id: int) -> bool:
@@ -81,12 +269,14 @@ class Repository(metaclass=RepositoryABCSingleton):
         (for instance, when there was no record with a given ID).
         """
         conn: Connection
-        async with self.db_pool.acquire() as conn:
+        async with self.acquire("destroy_by_id") as conn:
             result = await conn.execute(
-                f"DELETE FROM {self.table_name} WHERE id=$1", _id
+                self.get_query("delete", (self.primary_key,)), _id
             )
 
-            return int(result.split()[1]) == 1
+        self.invalidate_guilds(None)
+
+        return _get_affected_rows(result) == 1
 
     async def find_by(self, args: Dict[str, Any]) -> List[Record]:
         """
@@ -104,13 +294,10 @@ class Repository(metaclass=RepositoryABCSingleton):
         List[`Record`]
             A list of the fetched records.
         """
-        query_string = _get_query_string(args)
-
         conn: Connection
-        async with self.db_pool.acquire() as conn:
+        async with self.acquire("find_by") as conn:
             return await conn.fetch(
-                f"SELECT * FROM {self.table_name} WHERE {query_string}",
-                *args.values(),
+                self.get_query("select", tuple(args)), *args.values()
             )
 
     async def find_one_by(self, args: Dict[str, Any]) -> Optional[Record]:
@@ -128,13 +315,10 @@ class Repository(metaclass=RepositoryABCSingleton):
         Optional[`Record`]
             The record fetched from the database, or `None` if there was none.
         """
-        query_string = _get_query_string(args)
-
         conn: Connection
-        async with self.db_pool.acquire() as conn:
+        async with self.acquire("find_one_by") as conn:
             return await conn.fetchrow(
-                f"SELECT * FROM {self.table_name} WHERE {query_string}",
-                *args.values(),
+                self.get_query("select", tuple(args)), *args.values()
             )
 
     async def destroy_by(self, args: Dict[str, Any]) -> int:
@@ -154,16 +338,15 @@ class Repository(metaclass=RepositoryABCSingleton):
         `int`
             The amount of records deleted by the query.
         """
-        query_string = _get_query_string(args)
-
         conn: Connection
-        async with self.db_pool.acquire() as conn:
+        async with self.acquire("destroy_by") as conn:
             result = await conn.execute(
-                f"DELETE FROM {self.table_name} WHERE {query_string}",
-                *args.values(),
+                self.get_query("delete", tuple(args)), *args.values()
             )
 
-            return int(result.split()[1])
+        self.invalidate_guilds(_get_guild_ids([args]))
+
+        return _get_affected_rows(result)
 
     async def insert(self, args: Dict[str, Any]):
         """
@@ -177,17 +360,222 @@ class Repository(metaclass=RepositoryABCSingleton):
             A dictionary containing the table fields and their respective
             values.
         """
-        keys = ", ".join(args.keys())
-        values = ", ".join([f"${i + 1}" for i in range(len(args))])
-
         conn: Connection
-        async with self.db_pool.acquire() as conn:
+        async with self.acquire("insert") as conn:
             await conn.execute(
-                f"INSERT INTO {self.table_name} "
-                f"({keys}) VALUES ({values})",
+                self.get_query("insert", tuple(args)), *args.values()
+            )
+
+        self.invalidate_guilds(_get_guild_ids([args]))
+
+    async def insert_returning(self, args: Dict[str, Any]) -> Record:
+        """
+        Analogic to :meth:`insert`, but returns the inserted record, including
+        the values filled in by the database.
+
+        Parameters
+        -----------
+        args: Dict[`str`, `any`]
+            A dictionary containing the table fields and their respective
+            values.
+
+        Returns
+        --------
+        `Record`
+            The inserted record.
+        """
+        conn: Connection
+        async with self.acquire("insert_returning") as conn:
+            record = await conn.fetchrow(
+                self.get_query("insert_returning", tuple(args)),
                 *args.values(),
             )
 
+        self.invalidate_guilds(_get_guild_ids([args]))
+
+        return record
+
+    async def update_by(
+        self, args: Dict[str, Any], values: Dict[str, Any]
+    ) -> int:
+        """
+        Updates records in the table constrained by an arbitrary set of
+        fields.
+
+        The values are sanitized before being sent to the database.
+
+        Parameters
+        -----------
+        args: Dict[`str`, `any`]
+            A dictionary containing the query constraints.
+        values: Dict[`str`, `any`]
+            A dictionary containing the updated fields and their new values.
+
+        Returns
+        --------
+        `int`
+            The amount of records updated by the query.
+        """
+        conn: Connection
+        async with self.acquire("update_by") as conn:
+            result = await conn.execute(
+                self.get_query("update", tuple(values), tuple(args)),
+                *values.values(),
+                *args.values(),
+            )
+
+        self.invalidate_guilds(self._get_updated_guild_ids(args, values))
+
+        return _get_affected_rows(result)
+
+    async def update_returning(
+        self, args: Dict[str, Any], values: Dict[str, Any]
+    ) -> Optional[Record]:
+        """
+        Analogic to :meth:`update_by`, but returns the updated record, meant
+        for queries constrained to a single row.
+
+        Returns
+        --------
+        Optional[`Record`]
+            The updated record, or `None` if no record was updated.
+        """
+        conn: Connection
+        async with self.acquire("update_returning") as conn:
+            record = await conn.fetchrow(
+                self.get_query("update_returning", tuple(values), tuple(args)),
+                *values.values(),
+                *args.values(),
+            )
+
+        self.invalidate_guilds(self._get_updated_guild_ids(args, values))
+
+        return record
+
+    @staticmethod
+    def _get_updated_guild_ids(
+        args: Dict[str, Any], values: Dict[str, Any]
+    ) -> Optional[Set[int]]:
+        # records moved to another guild affect both of them
+        guild_ids = _get_guild_ids([args])
+
+        if guild_ids is not None and "guild_id" in values:
+            guild_ids.add(values["guild_id"])
+
+        return guild_ids
+
+    async def find_by_ids(self, ids: Sequence[int]) -> List[Record]:
+        """
+        Finds all records with the given IDs using a single query.
+
+        Parameters
+        -----------
+        ids: Sequence[`int`]
+            The IDs of the records.
+
+        Returns
+        --------
+        List[`Record`]
+            A list of the fetched records, in no particular order.
+        """
+        if not ids:
+            return []
+
+        conn: Connection
+        async with self.acquire("find_by_ids") as conn:
+            return await conn.fetch(
+                self.get_query("select_any", (self.primary_key,)), list(ids)
+            )
+
+    async def destroy_many(self, ids: Sequence[int]) -> int:
+        """
+        Removes all records with the given IDs using a single query.
+
+        Returns
+        --------
+        `int`
+            The amount of records deleted by the query.
+        """
+        if not ids:
+            return 0
+
+        conn: Connection
+        async with self.acquire("destroy_many") as conn:
+            result = await conn.execute(
+                self.get_query("delete_any", (self.primary_key,)), list(ids)
+            )
+
+        self.invalidate_guilds(None)
+
+        return _get_affected_rows(result)
+
+    async def insert_many(self, records: Sequence[Dict[str, Any]]) -> int:
+        """
+        Inserts multiple records into the database at once, using the
+        ``COPY`` protocol.
+
+        All records have to contain the same set of fields.
+
+        Parameters
+        -----------
+        records: Sequence[Dict[`str`, `any`]]
+            A sequence of dictionaries containing the table fields and their
+            respective values.
+
+        Returns
+        --------
+        `int`
+            The amount of inserted records.
+        """
+        if not records:
+            return 0
+
+        columns = _get_columns(records)
+
+        conn: Connection
+        async with self.acquire("insert_many") as conn:
+            result = await conn.copy_records_to_table(
+                self.table_name,
+                records=[tuple(record.values()) for record in records],
+                columns=columns,
+            )
+
+        self.invalidate_guilds(_get_guild_ids(records))
+
+        return _get_affected_rows(result)
+
+    async def upsert_many(
+        self, records: Sequence[Dict[str, Any]], conflict: Tuple[str, ...]
+    ):
+        """
+        Inserts multiple records into the database at once, updating the
+        existing ones instead if they conflict with any of them.
+
+        All records have to contain the same set of fields.
+
+        Parameters
+        -----------
+        records: Sequence[Dict[`str`, `any`]]
+            A sequence of dictionaries containing the table fields and their
+            respective values.
+        conflict: Tuple[`str`, ...]
+            The fields of the unique constraint used to detect conflicting
+            records. The values of the remaining fields get updated.
+        """
+        if not records:
+            return
+
+        columns = _get_columns(records)
+
+        conn: Connection
+        async with self.acquire("upsert_many") as conn:
+            await conn.executemany(
+                self.get_query("upsert", columns, conflict),
+                [tuple(record.values()) for record in records],
+            )
+
+        self.invalidate_guilds(_get_guild_ids(records))
+
 
 @dataclass
 class CachedGuild:
@@ -196,20 +584,44 @@ class CachedGuild:
     prefix: Optional[str] = None
 
 
-class GuildCache(Dict[int, CachedGuild]):
-    """A dictionary caching data of guilds known to the bot."""
+class GuildCache(LRUCache[int, CachedGuild]):
+    """
+    A dictionary caching data of guilds known to the bot, optionally bounded
+    to a maximum amount of guilds.
+    """
 
     def __getitem__(self, k: int) -> CachedGuild:
         """
         Ensures a :class:`CachedGuild` is available when trying to access one.
+
+        As this is used to fill the cache as well, it isn't tracked in the
+        :attr:`hits` and :attr:`misses` counters, unlike :meth:`get_prefix`.
         """
         try:
-            guild: CachedGuild = super().__getitem__(k)
+            guild: CachedGuild = OrderedDict.__getitem__(self, k)
         except KeyError:
             self[k] = guild = CachedGuild()
+        else:
+            self.move_to_end(k)
 
         return guild
 
+    def get_prefix(self, k: int) -> Optional[str]:
+        """
+        Returns the cached command prefix of a guild, or `None` if it isn't
+        cached, counting the lookup as a hit or a miss.
+        """
+        guild: Optional[CachedGuild] = OrderedDict.get(self, k)
+
+        if guild is None or guild.prefix is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.move_to_end(k)
+
+        return guild.prefix
+
 
 class GuildRepository(Repository):  # pylint: disable=missing-class-docstring
     _cache: GuildCache
@@ -217,36 +629,91 @@ class GuildRepository(Repository):  # pylint: disable=missing-class-docstring
     def __init__(self, db_pool: Optional[Pool] = None) -> None:
         super().__init__(db_pool=db_pool)
 
-        self._cache = GuildCache()
+        self._cache = GuildCache(maxsize=settings.GUILD_CACHE_SIZE)
 
     @property
     def model(self) -> Type[Model]:
         return DBGuild
 
-    async def create_from_gateway_response(self, guild: Guild) -> Any:
+    def get_caches(self) -> Dict[str, LRUCache]:
+        return {"guilds": self._cache}
+
+    def get_hot_queries(self) -> List[str]:
+        return [self.get_query("select_any", (self.primary_key,))]
+
+    async def upsert_from_gateway_response(self, guild: Guild) -> Record:
         """
         Inserts a guild into the database based on a response from
         the Discord gateway.
 
         If a guild with the given ID exists in the database already,
-        it is fetched and returned instead.
+        its name is updated instead, but only if it has changed, so that
+        an up to date row isn't rewritten. The stored guild record is
+        returned in all cases.
         """
-        existing_guild = await self.find_by_id(guild.id)
+        conn: Connection
+        async with self.acquire("upsert_from_gateway_response") as conn:
+            record = await conn.fetchrow(
+                f"INSERT INTO {self.table_name} (id, name, command_prefix) "
+                "VALUES ($1, $2, $3) "
+                "ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name "
+                f"WHERE {self.table_name}.name IS DISTINCT FROM "
+                "EXCLUDED.name "
+                "RETURNING *",
+                guild.id,
+                guild.name,
+                settings.COMMAND_PREFIX,
+            )
 
-        if existing_guild:
-            return existing_guild
+            if record is None:
+                # the row exists already, and its name is up to date
+                record = await conn.fetchrow(
+                    self.get_query("select", (self.primary_key,)), guild.id
+                )
 
-        await self.insert(
-            {
-                "id": guild.id,
-                "name": guild.name,
-                "command_prefix": settings.COMMAND_PREFIX,
-            }
-        )
+        self._cache[guild.id].prefix = record["command_prefix"]
+        database.call_on_rollback(lambda: self.evict_guild(guild.id))
+
+        return record
 
-        self._cache[guild.id].prefix = settings.COMMAND_PREFIX
+    async def sync_from_gateway(
+        self, guilds: Iterable[Guild], batch_size: int = 1000
+    ) -> int:
+        """
+        Reconciles the database with the guilds reported by the Discord
+        gateway, inserting the guilds that the bot has joined while it was
+        offline, and updating names of the ones that changed.
 
-        return await self.find_by_id(guild.id)
+        The guilds are written in batches of `batch_size`, after which
+        their prefixes are loaded into the cache.
+
+        Returns
+        --------
+        `int`
+            The amount of guilds loaded into the cache.
+        """
+        guilds = list(guilds)
+
+        conn: Connection
+        async with self.acquire("sync_from_gateway") as conn:
+            for start in range(0, len(guilds), batch_size):
+                end = start + batch_size
+                batch = guilds[start:end]
+
+                await conn.execute(
+                    f"INSERT INTO {self.table_name} "
+                    "(id, name, command_prefix) "
+                    "SELECT id, name, $3 "
+                    "FROM unnest($1::bigint[], $2::text[]) AS g (id, name) "
+                    "ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name "
+                    f"WHERE {self.table_name}.name IS DISTINCT FROM "
+                    "EXCLUDED.name",
+                    [guild.id for guild in batch],
+                    [guild.name for guild in batch],
+                    settings.COMMAND_PREFIX,
+                )
+
+        return await self.warm_cache(guilds)
 
     async def update_from_gateway_response(self, guild: Guild) -> bool:
         """
@@ -255,14 +722,9 @@ class GuildRepository(Repository):  # pylint: disable=missing-class-docstring
 
         Returns `true` if the update was successful, or `false` when it wasn't.
         """
-        async with self.db_pool.acquire() as conn:
-            result = await conn.execute(
-                f"UPDATE {self.table_name} SET name = $1 WHERE id = $2",
-                guild.name,
-                guild.id,
-            )
+        updated = await self.update_by({"id": guild.id}, {"name": guild.name})
 
-            return int(result.split()[1]) == 1
+        return updated == 1
 
     async def get_command_prefix(self, guild: Guild) -> str:
         """
@@ -278,33 +740,89 @@ class GuildRepository(Repository):  # pylint: disable=missing-class-docstring
         `str`
             The command prefix.
         """
-        if (prefix := self._cache[guild.id].prefix) is None:
+        if (prefix := self._cache.get_prefix(guild.id)) is None:
+            # guilds are created only once, so there's no point in writing to
+            # the database each time a prefix drops out of the cache
             db_guild = await self.find_by_id(guild.id)
 
             if db_guild is None:
-                await self.create_from_gateway_response(guild)
-                db_guild = await self.find_by_id(guild.id)
+                db_guild = await self.upsert_from_gateway_response(guild)
 
             self._cache[guild.id].prefix = prefix = db_guild["command_prefix"]
 
         return prefix
 
+    async def warm_cache(self, guilds: Iterable[Guild]) -> int:
+        """
+        Loads the command prefixes of the given guilds into the cache using
+        a single query.
+
+        Guilds missing from the database are skipped, and will be created
+        the first time their prefix is requested. Use
+        :meth:`sync_from_gateway` to create them beforehand instead.
+
+        Returns
+        --------
+        `int`
+            The amount of guilds loaded into the cache.
+        """
+        records = await self.find_by_ids([guild.id for guild in guilds])
+
+        for record in records:
+            self._cache[record["id"]].prefix = record["command_prefix"]
+
+        return len(records)
+
+    def evict_guild(self, guild_id: int):
+        """Removes a guild from the cache."""
+        self._cache.pop(guild_id, None)
+
+    def apply_invalidation(self, invalidation: Invalidation):
+        if invalidation.guild_id is None:
+            self._cache.clear()
+        else:
+            self.evict_guild(invalidation.guild_id)
+
     async def set_command_prefix(self, guild: Guild, prefix: str) -> bool:
         """Updates the command prefix for a given guild."""
 
-        async with self.db_pool.acquire() as conn:
-            result = await conn.execute(
-                f"UPDATE {self.table_name} "
-                "SET command_prefix = $1 "
-                "WHERE id = $2",
-                prefix,
-                guild.id,
-            )
+        updated = await self.update_by(
+            {"id": guild.id}, {"command_prefix": prefix}
+        )
+
+        if result := updated == 1:
+            self._cache[guild.id].prefix = prefix
+            database.call_on_rollback(lambda: self.evict_guild(guild.id))
+
+        return result
+
+
+def get_repositories() -> List[Repository]:
+    """Returns the instances of all currently imported repositories."""
+    repositories = []
+    classes: List[type] = [Repository]
+
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+
+        if not inspect.isabstract(cls):
+            repositories.append(cls())
+
+    return repositories
+
+
+def get_caches() -> Dict[str, LRUCache]:
+    """
+    Returns the caches of all currently imported repositories, along with
+    the cache of media files, by their metric names.
+    """
+    caches = media.get_caches()
 
-            if result := (int(result.split()[1]) == 1) is True:
-                self._cache[guild.id].prefix = prefix
+    for repository in get_repositories():
+        caches.update(repository.get_caches())
 
-            return result
+    return caches
 
 
-__all__ = ["Repository", "GuildRepository"]
+__all__ = ["Repository", "GuildRepository", "get_caches", "get_repositories"]
@@ -42,6 +42,45 @@ DATABASES = {
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Connection pool used by the bot, see
+# https://magicstack.github.io/asyncpg/current/api/index.html#connection-pools
+
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "10"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+DATABASE_POOL_MAX_QUERIES = int(
+    os.getenv("DATABASE_POOL_MAX_QUERIES", "50000")
+)
+DATABASE_POOL_MAX_INACTIVE_CONNECTION_LIFETIME = float(
+    os.getenv("DATABASE_POOL_MAX_INACTIVE_CONNECTION_LIFETIME", "300")
+)
+# set to 0 when connecting through pgbouncer in transaction mode
+DATABASE_STATEMENT_CACHE_SIZE = int(
+    os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "100")
+)
+# client-side timeout of a single query, in seconds
+DATABASE_COMMAND_TIMEOUT = (
+    float(os.environ["DATABASE_COMMAND_TIMEOUT"])
+    if os.getenv("DATABASE_COMMAND_TIMEOUT")
+    else None
+)
+# server-side timeout of a single query, in milliseconds
+DATABASE_STATEMENT_TIMEOUT = (
+    int(os.environ["DATABASE_STATEMENT_TIMEOUT"])
+    if os.getenv("DATABASE_STATEMENT_TIMEOUT")
+    else None
+)
+DATABASE_APPLICATION_NAME = os.getenv("DATABASE_APPLICATION_NAME", "dangobot")
+
+# How the database queries made while handling a single message (the prefix
+# lookup, the command handlers and the command itself) are grouped:
+# - "connection" - they share a single connection,
+# - "transaction" - they share a single connection, and are wrapped in
+#   a transaction, rolled back if the command or any of the queries fails,
+# - "none" - every query acquires its own connection.
+# The unit of work ends once the command responds, so the connection isn't
+# held while waiting on Discord or downloads.
+DATABASE_UNIT_OF_WORK = os.getenv("DATABASE_UNIT_OF_WORK", "connection")
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.0/topics/i18n/
 
@@ -64,11 +103,174 @@ BOT_TOKEN = os.environ["BOT_TOKEN"]
 
 OWNER_ID = os.getenv("OWNER_ID", None)
 
+# The total amount of gateway shards, and the IDs of the ones connected by this
+# process, as a comma separated list of IDs and ranges (such as 0-3,8).
+# Leave both unset to connect all shards, using the amount recommended by
+# Discord. SHARD_IDS requires SHARD_COUNT to be set.
+SHARD_COUNT = (
+    int(os.environ["SHARD_COUNT"]) if os.getenv("SHARD_COUNT") else None
+)
+SHARD_IDS = os.getenv("SHARD_IDS") or None
+
+# Set CLUSTER_PROCESSES to run the bot in that many worker processes, each
+# connecting a contiguous range of the shards. Can be overridden with the
+# --processes option of startbot, or --cluster for one process per CPU.
+CLUSTER_PROCESSES = (
+    int(os.environ["CLUSTER_PROCESSES"])
+    if os.getenv("CLUSTER_PROCESSES")
+    else None
+)
+
+# The gateway intents are those needed by the installed apps (see their
+# apps.py), EXTRA_INTENTS adds more of them, as a comma separated list of
+# discord.Intents names, for instance "members" for MEMBER_CACHE_FLAGS=joined
+# or CHUNK_GUILDS_AT_STARTUP.
+EXTRA_INTENTS = [
+    intent.strip()
+    for intent in os.getenv("EXTRA_INTENTS", "").split(",")
+    if intent.strip()
+]
+
+# discord.py's own caches, none of which are needed by the built-in plugins:
+# - MAX_MESSAGES - the amount of recent messages kept in memory, 0 disables
+#   the message cache,
+# - MEMBER_CACHE_FLAGS - a comma separated list of discord.MemberCacheFlags
+#   names deciding which members are kept in memory ("voice", "joined"),
+#   members not in the cache are still created from events, but not kept;
+#   "voice" requires the voice_states intent (enabled by the roles app),
+#   "joined" requires the members intent,
+# - CHUNK_GUILDS_AT_STARTUP - whether to request the full member lists of all
+#   guilds at startup (requires the members intent).
+# Use the !memory command to see how much memory each cache uses.
+MAX_MESSAGES = int(os.getenv("MAX_MESSAGES", "0")) or None
+MEMBER_CACHE_FLAGS = [
+    flag.strip()
+    for flag in os.getenv("MEMBER_CACHE_FLAGS", "").split(",")
+    if flag.strip()
+]
+CHUNK_GUILDS_AT_STARTUP = bool(
+    strtobool(os.getenv("CHUNK_GUILDS_AT_STARTUP", "False"))
+)
+
+# Run the bot on uvloop, and decode gateway payloads with orjson, as long as
+# they're installed (pip install uvloop orjson). Can be overridden with the
+# --speedups/--no-speedups options of startbot.
+SPEEDUPS = bool(strtobool(os.getenv("SPEEDUPS", "True")))
+
+# The maximum amount of guilds whose settings are kept in memory. Leave unset
+# to cache every guild the bot is in.
+GUILD_CACHE_SIZE = (
+    int(os.environ["GUILD_CACHE_SIZE"])
+    if os.getenv("GUILD_CACHE_SIZE")
+    else None
+)
+
+# The maximum amount of custom command records kept in memory across all
+# guilds. Command triggers themselves are always cached in full.
+COMMAND_CACHE_SIZE = int(os.getenv("COMMAND_CACHE_SIZE", "1024"))
+
+# The maximum size of files attached to custom commands, in bytes, and how
+# many of them can be downloaded at the same time.
+MAX_ATTACHMENT_SIZE = int(os.getenv("MAX_ATTACHMENT_SIZE", str(25 * 2**20)))
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+
+# Set REUSE_ATTACHMENT_URLS to send the attachments of custom commands by
+# posting the Discord CDN link of their previous upload (refreshed once it
+# expires), instead of uploading them every time. The links of at most
+# ATTACHMENT_URL_CACHE_SIZE uploads are remembered.
+REUSE_ATTACHMENT_URLS = bool(
+    strtobool(os.getenv("REUSE_ATTACHMENT_URLS", "False"))
+)
+ATTACHMENT_URL_CACHE_SIZE = int(os.getenv("ATTACHMENT_URL_CACHE_SIZE", "1024"))
+
+# Attachments of custom commands are stored once per unique content. Files no
+# longer used by any command are removed every MEDIA_GC_INTERVAL seconds (0
+# disables this), once they've been unused for MEDIA_GC_GRACE_PERIOD seconds.
+MEDIA_GC_INTERVAL = float(os.getenv("MEDIA_GC_INTERVAL", "3600"))
+MEDIA_GC_GRACE_PERIOD = float(os.getenv("MEDIA_GC_GRACE_PERIOD", "86400"))
+
+# Attachments of custom commands are read from MEDIA_ROOT in a worker thread.
+# The most recently sent ones are kept in memory, up to MEDIA_CACHE_SIZE bytes
+# in total, skipping files larger than MEDIA_CACHE_MAX_FILE_SIZE bytes. Set
+# MEDIA_CACHE_SIZE to 0 to read every file from the disk.
+MEDIA_CACHE_SIZE = int(os.getenv("MEDIA_CACHE_SIZE", str(64 * 2**20)))
+MEDIA_CACHE_MAX_FILE_SIZE = int(
+    os.getenv("MEDIA_CACHE_MAX_FILE_SIZE", str(8 * 2**20))
+)
+
+# Keeps the caches of guild settings, custom commands and role links in sync
+# with changes made by other bot processes, by listening for notifications
+# sent by database triggers on a dedicated connection. Can be disabled when
+# running a single process, which is the only one writing to the database.
+CACHE_INVALIDATION = bool(strtobool(os.getenv("CACHE_INVALIDATION", "True")))
+
 # Set this to True and set the your user ID above
 # to get notified in DMs about any exceptions that
 # occur.
 SEND_ERRORS = bool(strtobool(os.getenv("SEND_ERRORS", "True")))
 
+# Only the first occurrence of an error is sent in full, its repeats are
+# summarized in a digest sent at most every ERROR_DIGEST_INTERVAL seconds,
+# along with any errors over the ERROR_REPORT_LIMIT in that interval.
+# The interval has to be positive.
+ERROR_DIGEST_INTERVAL = float(os.getenv("ERROR_DIGEST_INTERVAL", "300"))
+ERROR_REPORT_LIMIT = int(os.getenv("ERROR_REPORT_LIMIT", "5"))
+
+# Where the full tracebacks of reported errors are stored:
+# - "dpaste" - uploaded to dpaste.com,
+# - "http" - uploaded to a pastebin under ERROR_PASTE_URL, accepting
+#   a form-encoded POST request with a "content" field,
+# - "file" - saved in ERROR_PASTE_DIRECTORY,
+# - "none" - not stored.
+ERROR_PASTE_BACKEND = os.getenv("ERROR_PASTE_BACKEND", "dpaste")
+ERROR_PASTE_URL = os.getenv("ERROR_PASTE_URL", "http://dpaste.com/api/v2/")
+ERROR_PASTE_DIRECTORY = os.getenv(
+    "ERROR_PASTE_DIRECTORY", os.path.join(BASE_DIR, "logs", "tracebacks")
+)
+
+# Command invocations taking longer than SLOW_COMMAND_THRESHOLD seconds are
+# logged with the time spent in each of their phases. Set it to an empty
+# value to disable this.
+SLOW_COMMAND_THRESHOLD = (
+    float(os.getenv("SLOW_COMMAND_THRESHOLD", "1.0"))
+    if os.getenv("SLOW_COMMAND_THRESHOLD", "1.0")
+    else None
+)
+
+# The format of the console and file logs: "text", or "json" for one JSON
+# object per line, including the guild, channel, user and command being
+# handled when the record was logged, along with the time elapsed since the
+# message was received (latency_ms).
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# The fractions of INFO and DEBUG records kept for given loggers (and their
+# children), as a comma separated list such as
+# "dangobot.commands=0.1,discord.gateway=0.5", for high volume loggers.
+# Warnings and errors are always logged.
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (
+        item.partition("=")
+        for item in os.getenv("LOG_SAMPLE_RATES", "").split(",")
+        if item.strip()
+    )
+}
+
+# Set TRACE_EXPORT_FILE to append the phase timings of every command
+# invocation to that file, in the OTLP/JSON format read by the OpenTelemetry
+# Collector.
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE") or None
+
+# Set METRICS_PORT to serve Prometheus metrics under /metrics on that port.
+# Can be overridden with the --metrics-port option of startbot.
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = (
+    int(os.environ["METRICS_PORT"]) if os.getenv("METRICS_PORT") else None
+)
+# how often the memory used by the caches is estimated for the metrics,
+# in seconds, as measuring them takes a while with a large state
+MEMORY_ESTIMATE_INTERVAL = float(os.getenv("MEMORY_ESTIMATE_INTERVAL", "300"))
+
 # Used by the !about command, changing them manually will cause the
 # version/date reported there to change
 BUILD_VERSION = os.getenv("BUILD_VERSION", None)
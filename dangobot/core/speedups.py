@@ -0,0 +1,82 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict
+
+import discord.utils
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _stdlib_to_json(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=True)
+
+
+def _orjson_to_json(obj: Any) -> str:
+    return orjson.dumps(obj).decode("utf-8")
+
+
+def install_event_loop(use_uvloop: bool = True) -> str:
+    """
+    Makes event loops created afterwards (such as the one started by
+    :meth:`discord.Client.run`) use uvloop, if it's installed, or the stock
+    asyncio loop otherwise.
+
+    Returns the name of the event loop in use.
+    """
+    if use_uvloop and uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return "uvloop"
+
+    asyncio.set_event_loop_policy(None)
+    return "asyncio"
+
+
+def install_json(use_orjson: bool = True) -> str:
+    """
+    Makes discord.py encode and decode gateway and HTTP payloads with orjson,
+    if it's installed, or the standard library's json module otherwise.
+
+    Returns the name of the JSON library in use.
+    """
+    # pylint: disable=protected-access
+    if use_orjson and orjson is not None:
+        discord.utils._from_json = orjson.loads
+        discord.utils._to_json = _orjson_to_json
+        return "orjson"
+
+    discord.utils._from_json = json.loads
+    discord.utils._to_json = _stdlib_to_json
+    return "json"
+
+
+def install(enabled: bool = True) -> Dict[str, str]:
+    """
+    Switches the event loop and the JSON library to the faster ones, where
+    they're installed, or back to the standard library ones if `enabled` is
+    `False`. Needs to be called before the event loop is started.
+
+    Returns the names of the implementations in use.
+    """
+    installed = {
+        "event_loop": install_event_loop(enabled),
+        "json": install_json(enabled),
+    }
+
+    logger.info(
+        "Using the %s event loop and %s for JSON",
+        installed["event_loop"],
+        installed["json"],
+    )
+
+    return installed
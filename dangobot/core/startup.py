@@ -0,0 +1,102 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Awaitable, Iterator, List, Optional, TypeVar
+
+_T = TypeVar("_T")
+
+
+@dataclass
+class Phase:
+    """
+    A timed step of starting the bot.
+
+    Attributes
+    ----------
+    name: `str`
+        The name of the phase.
+    start: `float`
+        The time since the timer was created when the phase started, in
+        seconds.
+    duration: Optional[`float`]
+        How long the phase took in seconds, or `None` if it's a point in
+        time rather than a step.
+    thread: `str`
+        The name of the thread the phase ran in.
+    """
+
+    name: str
+    start: float
+    duration: Optional[float]
+    thread: str
+
+
+class StartupTimer:
+    """
+    Records how long each phase of starting the bot takes. Phases can run
+    concurrently, in different tasks or threads.
+    """
+
+    def __init__(self) -> None:
+        self.created = time.perf_counter()
+        self.phases: List[Phase] = []
+
+    def elapsed(self) -> float:
+        """Returns the time since the timer was created, in seconds."""
+        return time.perf_counter() - self.created
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Times the ``with`` block as a phase of the startup."""
+        start = self.elapsed()
+
+        try:
+            yield
+        finally:
+            self.phases.append(
+                Phase(
+                    name,
+                    start,
+                    self.elapsed() - start,
+                    threading.current_thread().name,
+                )
+            )
+
+    async def measure(self, name: str, awaitable: Awaitable[_T]) -> _T:
+        """Awaits `awaitable`, timing it as a phase of the startup."""
+        with self.phase(name):
+            return await awaitable
+
+    def mark(self, name: str) -> None:
+        """Records a point in time, such as the bot becoming ready."""
+        self.phases.append(
+            Phase(name, self.elapsed(), None, threading.current_thread().name)
+        )
+
+    def format_report(self) -> str:
+        """Formats the recorded phases as a table, in the order they began."""
+        phases = sorted(self.phases, key=lambda phase: phase.start)
+        width = max((len(phase.name) for phase in phases), default=5)
+
+        lines = [
+            f"{'phase':<{width}}  {'start':>10}  {'duration':>10}  thread"
+        ]
+
+        for phase in phases:
+            duration = (
+                f"{phase.duration * 1000:7.1f} ms"
+                if phase.duration is not None
+                else ""
+            )
+            lines.append(
+                f"{phase.name:<{width}}  {phase.start * 1000:7.1f} ms  "
+                f"{duration:>10}  {phase.thread}"
+            )
+
+        return "\n".join(lines)
+
+
+# the timer of the current process' startup, created once it's imported by
+# the startbot command
+timer = StartupTimer()
@@ -0,0 +1,374 @@
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """
+    A timed phase of handling a message.
+
+    Attributes
+    ----------
+    name: `str`
+        The name of the phase.
+    span_id: `str`
+        A random, hex-encoded 8 byte identifier.
+    parent: Optional[:class:`Span`]
+        The span which was active when this one has started.
+    start: `int`
+        The value of :func:`time.perf_counter_ns` when the span started.
+    end: Optional[`int`]
+        The value of :func:`time.perf_counter_ns` when the span ended, or
+        `None` if it's still running.
+    attributes: Dict[`str`, Any]
+        Additional information about the phase.
+    """
+
+    __slots__ = (
+        "name",
+        "span_id",
+        "parent",
+        "start",
+        "end",
+        "attributes",
+        "_token",
+    )
+
+    name: str
+    span_id: str
+    parent: Optional["Span"]
+    start: int
+    end: Optional[int]
+    attributes: Dict[str, Any]
+
+    def __init__(
+        self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]
+    ) -> None:
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent = parent
+        self.start = time.perf_counter_ns()
+        self.end = None
+        self.attributes = attributes
+
+        self._token: Optional[Token] = None
+
+    @property
+    def duration(self) -> float:
+        """The duration of the span in seconds, so far if it's running."""
+        end = self.end if self.end is not None else time.perf_counter_ns()
+        return (end - self.start) / 1e9
+
+    def activate(self) -> None:
+        """Makes this the parent of spans started in the current context."""
+        self._token = current_span.set(self)
+
+    def finish(self) -> None:
+        """Ends the span, restoring the previously active span."""
+        self.end = time.perf_counter_ns()
+
+        if self._token is not None:
+            try:
+                current_span.reset(self._token)
+            except ValueError:
+                # finished in a different context than it was started in
+                pass
+
+            self._token = None
+
+
+class Trace:
+    """
+    The spans collected while handling a single message.
+
+    Attributes
+    ----------
+    name: `str`
+        The name of the trace, set to the invoked command's name by
+        :func:`record_trace`.
+    trace_id: `str`
+        A random, hex-encoded 16 byte identifier.
+    root: :class:`Span`
+        The span covering the whole trace.
+    spans: List[:class:`Span`]
+        All spans of the trace, in the order they were started.
+    recorded: `bool`
+        Whether the trace should be logged and exported once it's finished.
+    finished: `bool`
+        Whether the root span has ended, after which no new spans are added.
+    epoch: `int`
+        The difference between the Unix time and :func:`time.perf_counter_ns`
+        when the trace started, in nanoseconds.
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "root",
+        "spans",
+        "recorded",
+        "finished",
+        "epoch",
+    )
+
+    name: str
+    trace_id: str
+    root: Span
+    spans: List[Span]
+    recorded: bool
+    finished: bool
+    epoch: int
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.epoch = time.time_ns() - time.perf_counter_ns()
+        self.root = Span(name, None, {})
+        self.spans = [self.root]
+        self.recorded = False
+        self.finished = False
+
+    def format_breakdown(self) -> str:
+        """Formats the spans of the trace as an indented tree of timings."""
+        children: Dict[Optional[Span], List[Span]] = {}
+
+        for child in self.spans[1:]:
+            children.setdefault(child.parent, []).append(child)
+
+        lines: List[str] = []
+
+        def add(node: Span, depth: int) -> None:
+            details = "".join(
+                f" {key}={value}" for key, value in node.attributes.items()
+            )
+            lines.append(
+                f"{'  ' * depth}{node.name} "
+                f"{node.duration * 1000:.1f} ms{details}"
+            )
+
+            for child in children.get(node, ()):
+                add(child, depth + 1)
+
+        add(self.root, 0)
+
+        return "\n".join(lines)
+
+
+class SpanExporter(metaclass=ABCMeta):
+    """Receives finished traces, for instance to store them."""
+
+    @abstractmethod
+    def export(self, finished: Trace) -> None:
+        """Exports a finished trace. Must not block the event loop."""
+
+    def close(self) -> None:
+        """Flushes any pending traces."""
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+
+    if isinstance(value, float):
+        return {"doubleValue": value}
+
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"key": key, "value": _otlp_value(value)}
+        for key, value in attributes.items()
+    ]
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Appends traces to a file in the OTLP/JSON format, one
+    ``ExportTraceServiceRequest`` per line, as written by the file exporter
+    of the OpenTelemetry Collector (and read by its ``otlpjsonfile``
+    receiver).
+
+    The file is written from a background thread.
+    """
+
+    def __init__(self, path: str, service_name: str = "dangobot") -> None:
+        self.path = path
+        self.resource = {
+            "attributes": _otlp_attributes({"service.name": service_name})
+        }
+
+        self._queue: queue.SimpleQueue[Optional[str]] = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._write, name="trace-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def export(self, finished: Trace) -> None:
+        spans = []
+
+        for exported in finished.spans:
+            end = exported.end if exported.end is not None else exported.start
+            encoded = {
+                "traceId": finished.trace_id,
+                "spanId": exported.span_id,
+                "name": exported.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(finished.epoch + exported.start),
+                "endTimeUnixNano": str(finished.epoch + end),
+                "attributes": _otlp_attributes(exported.attributes),
+            }
+
+            if exported.parent is not None:
+                encoded["parentSpanId"] = exported.parent.span_id
+
+            spans.append(encoded)
+
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": self.resource,
+                    "scopeSpans": [
+                        {"scope": {"name": __name__}, "spans": spans}
+                    ],
+                }
+            ]
+        }
+
+        self._queue.put(json.dumps(request, separators=(",", ":")))
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            while (line := self._queue.get()) is not None:
+                file.write(line + "\n")
+
+                if self._queue.empty():
+                    file.flush()
+
+
+# the exporter receiving recorded traces, set up by the bot
+exporter: Optional[SpanExporter] = None
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar(
+    "current_trace", default=None
+)
+current_span: ContextVar[Optional[Span]] = ContextVar(
+    "current_span", default=None
+)
+
+
+@contextmanager
+def trace(
+    name: str, slow_threshold: Optional[float] = None
+) -> Iterator[Optional[Trace]]:
+    """
+    Collects spans started in the ``with`` block into a new :class:`Trace`.
+
+    Once the block exits, the trace is logged if it took longer than
+    `slow_threshold` seconds, and passed to the :data:`exporter`, as long as
+    it was marked with :func:`record_trace`.
+
+    If there is nothing to do with finished traces, no trace is created.
+    """
+    if slow_threshold is None and exporter is None:
+        yield None
+        return
+
+    new_trace = Trace(name)
+    trace_token = current_trace.set(new_trace)
+    span_token = current_span.set(new_trace.root)
+
+    try:
+        yield new_trace
+    finally:
+        current_span.reset(span_token)
+        current_trace.reset(trace_token)
+
+        new_trace.root.end = time.perf_counter_ns()
+        new_trace.finished = True
+
+        if new_trace.recorded:
+            _finish(new_trace, slow_threshold)
+
+
+def _finish(finished: Trace, slow_threshold: Optional[float]) -> None:
+    duration = finished.root.duration
+
+    if slow_threshold is not None and duration >= slow_threshold:
+        logger.warning(
+            "Slow command %s took %.1f ms:\n%s",
+            finished.name,
+            duration * 1000,
+            finished.format_breakdown(),
+        )
+
+    if exporter is not None:
+        try:
+            exporter.export(finished)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to export a trace")
+
+
+def record_trace(name: str, **attributes: Any) -> None:
+    """
+    Marks the current trace to be logged and exported under a given name,
+    with the attributes added to its root span.
+    """
+    current = current_trace.get()
+
+    if current is not None:
+        current.name = current.root.name = name
+        current.root.attributes.update(attributes)
+        current.recorded = True
+
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """
+    Starts a span in the current trace, which becomes the parent of spans
+    started until it ends. Returns `None` if there is no trace.
+
+    Prefer using :func:`span` where possible.
+    """
+    current = current_trace.get()
+
+    if current is None or current.finished:
+        return None
+
+    new_span = Span(name, current_span.get(), attributes)
+    new_span.activate()
+    current.spans.append(new_span)
+
+    return new_span
+
+
+def end_span(ended: Optional[Span]) -> None:
+    """Ends a span returned by :func:`start_span`."""
+    if ended is not None:
+        ended.finish()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Times the ``with`` block as a span of the current trace."""
+    started = start_span(name, **attributes)
+
+    try:
+        yield started
+    finally:
+        end_span(started)
@@ -0,0 +1,9 @@
+from discord import Intents
+from django.apps import AppConfig
+
+
+class RolesConfig(AppConfig):
+    """Gives members roles linked to the voice channel they're in."""
+
+    name = "dangobot.roles"
+    intents = Intents(voice_states=True)
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_invalidation_triggers'),
+        ('roles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            CREATE TRIGGER roles_roleforvoicechannel_invalidation
+            AFTER INSERT OR UPDATE OR DELETE ON roles_roleforvoicechannel
+            FOR EACH ROW
+            EXECUTE FUNCTION dangobot_notify_invalidation('guild_id');
+            """,
+            """
+            DROP TRIGGER roles_roleforvoicechannel_invalidation
+            ON roles_roleforvoicechannel;
+            """,
+        ),
+    ]
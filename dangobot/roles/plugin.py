@@ -28,7 +28,7 @@ class Roles(Cog):
 
         async def get_role(channel: VoiceChannel) -> Optional[Role]:
             role_record = await RoleForVCRepository().find_by_voice_channel(
-                voice_channel_id=channel.id
+                voice_channel_id=channel.id, guild_id=channel.guild.id
             )
 
             if role_record is None:
@@ -102,7 +102,11 @@ class Roles(Cog):
     ):
         """Unlinks a role and a voice channel."""
         amount = await RoleForVCRepository().destroy_by(
-            {"role_id": role.id, "voice_channel_id": voice_channel.id}
+            {
+                "guild_id": voice_channel.guild.id,
+                "role_id": role.id,
+                "voice_channel_id": voice_channel.id,
+            }
         )
 
         if amount > 0:
@@ -1,20 +1,101 @@
-from typing import List, Type
+from typing import Dict, List, Optional, Set, Type
 from asyncpg import Record
+from asyncpg.pool import Pool
+from django.conf import settings
 from django.db.models.base import Model
 from dangobot.roles.models import RoleForVoiceChannel
+from dangobot.core import database
+from dangobot.core.cache import LRUCache
+from dangobot.core.invalidation import Invalidation
 from dangobot.core.repository import Repository
 
 
-class RoleForVCRepository(
-    Repository
-):  # pylint: disable=missing-class-docstring
+class RoleForVCRepository(Repository):
+    """
+    Stores the links between roles and voice channels, along with an
+    in-memory copy of the links of every guild, so that voice state updates
+    can be handled without querying the database.
+    """
+
+    _links: LRUCache[int, Dict[int, Record]]
+    _generations: Dict[int, int]
+
+    def __init__(self, db_pool: Optional[Pool] = None) -> None:
+        super().__init__(db_pool=db_pool)
+
+        self._links = LRUCache(maxsize=settings.GUILD_CACHE_SIZE)
+        self._generations = {}
+
     @property
     def model(self) -> Type[Model]:
         return RoleForVoiceChannel
 
-    async def find_by_voice_channel(self, voice_channel_id: int) -> Record:
+    def get_caches(self) -> Dict[str, LRUCache]:
+        return {"role_links": self._links}
+
+    def get_hot_queries(self) -> List[str]:
+        return [self.get_query("select", ("guild_id",))]
+
+    def invalidate(self, guild_id: Optional[int] = None):
+        """
+        Drops the cached links of a given guild, or of all guilds if it's not
+        specified.
+        """
+        if guild_id is None:
+            self._links.clear()
+            self._generations = {
+                key: value + 1 for key, value in self._generations.items()
+            }
+            return
+
+        self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+        self._links.pop(guild_id, None)
+
+        database.call_on_rollback(lambda: self._links.pop(guild_id, None))
+
+    def evict_guild(self, guild_id: int):
+        self._links.pop(guild_id, None)
+        self._generations.pop(guild_id, None)
+
+    def apply_invalidation(self, invalidation: Invalidation):
+        self.invalidate(invalidation.guild_id)
+
+    async def get_links(self, guild_id: int) -> Dict[int, Record]:
+        """
+        Returns the links of a given guild, keyed by the voice channel ID.
+
+        The links are loaded from the database on first use, and dropped
+        whenever they're written to through this repository.
+        """
+        if (links := self._links.get(guild_id)) is not None:
+            return links
+
+        generation = self._generations.get(guild_id, 0)
+        links = {}
+
+        for record in await self.find_by_guild(guild_id):
+            links.setdefault(record["voice_channel_id"], record)
+
+        # don't store the links if they were written while we were waiting
+        # for the query, as they might not contain that change
+        if self._generations.get(guild_id, 0) == generation:
+            self._links[guild_id] = links
+
+        return links
+
+    def invalidate_guilds(self, guild_ids: Optional[Set[int]]):
+        if guild_ids is None:
+            self.invalidate()
+            return
+
+        for guild_id in guild_ids:
+            self.invalidate(guild_id)
+
+    async def find_by_voice_channel(
+        self, voice_channel_id: int, guild_id: int
+    ) -> Optional[Record]:
         """Returns the role for a given voice channel."""
-        return await self.find_one_by({"voice_channel_id": voice_channel_id})
+        return (await self.get_links(guild_id)).get(voice_channel_id)
 
     async def find_by_guild(self, guild_id: int) -> List[Record]:
         """Returns all role/voice channel links for a given guild."""